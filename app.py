@@ -1,22 +1,27 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_file
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_file, Response, stream_with_context
 import os
+import re
+import glob
+import time
+import uuid
+import shutil
 import tempfile
 from werkzeug.utils import secure_filename
 from datetime import datetime
 import json
 
 # 導入原有的模組功能
-from module.mod_number import process_menu_codes
 from module.mod_sql import DatabaseUploader
 from module.mod_difference import MenuDifferenceCalculator
 from module.mod_clean import clean_excel_file as clean_excel_file_original
 from module.mod_calendar import clean_excel_file as clean_excel_file_calendar_func
 from module.mod_search import search_menu_codes
-from module.mod_sql_function import DatabaseFunction
 from module.mod_dif_restairamt import RestaurantDifferenceCalculator
 from module.mod2_compare import compare_menu_codes
 from module.mod2_utf8 import convert_csv_to_unicode_txt
 from module.mod4_new_menu_restaurant import export_new_menus, export_new_restaurants
+from module.mod_schema import run_migrations
+from module.mod_pool import get_pool
 
 app = Flask(__name__)
 app.secret_key = 'mediatek_menu_card_secret_key_2024'
@@ -26,10 +31,23 @@ app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB max file size
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['ALLOWED_EXTENSIONS'] = {'xlsx', 'xls', 'csv'}
 
+# 批次產生菜牌編號的ZIP未下載時保留的秒數
+MENU_CODES_ZIP_TTL = 60 * 60
+
 # 確保上傳資料夾存在
 if not os.path.exists(app.config['UPLOAD_FOLDER']):
     os.makedirs(app.config['UPLOAD_FOLDER'])
 
+def apply_migrations():
+    """啟動時套用資料庫結構遷移，資料庫無法連線時仍可使用檔案處理功能"""
+    try:
+        run_migrations()
+    except Exception as e:
+        print(f"資料庫遷移失敗：{str(e)}")
+
+# 建立應用程式時即套用遷移，以 WSGI 伺服器啟動時也會執行
+apply_migrations()
+
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
@@ -78,53 +96,84 @@ def clean_excel():
 
 @app.route('/generate_menu_codes', methods=['GET', 'POST'])
 def generate_menu_codes():
-    """菜牌編號產生功能"""
+    """菜牌編號產生功能，多個檔案以多個程序平行處理，結果打包成一個ZIP下載"""
     if request.method == 'POST':
         files = request.files.getlist('files')
         if not files or files[0].filename == '':
             flash('沒有選擇檔案', 'error')
             return redirect(request.url)
         
-        success_files = []
-        error_files = []
-        result_files = []
+        remove_expired_menu_codes_zips()
+
+        # 每批上傳使用獨立的暫存目錄，以序號命名避免中文檔名經 secure_filename 後重複
+        batch_id = uuid.uuid4().hex
+        batch_dir = tempfile.mkdtemp(prefix='menu_codes_', dir=app.config['UPLOAD_FOLDER'])
+        uploads = []
+        skipped_files = []
+        try:
+            for index, file in enumerate(files):
+                if file and allowed_file(file.filename):
+                    extension = os.path.splitext(file.filename)[1].lower()
+                    file_path = os.path.join(batch_dir, f"{index:03d}{extension}")
+                    file.save(file_path)
+                    uploads.append((file_path, os.path.basename(file.filename)))
+                elif file and file.filename:
+                    skipped_files.append(f"{file.filename}: 不支援的檔案格式")
+            
+            if not uploads:
+                flash('處理失敗：' + '; '.join(skipped_files), 'error')
+                return redirect(request.url)
+            
+            from module.web_functions import generate_menu_codes_web
+            results, total_seconds = generate_menu_codes_web(uploads, menu_codes_zip_path(batch_id))
+        except Exception as e:
+            flash(f'處理過程中發生錯誤：{str(e)}', 'error')
+            return redirect(request.url)
+        finally:
+            # 清理上傳的檔案
+            shutil.rmtree(batch_dir, ignore_errors=True)
         
-        for file in files:
-            if file and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                file.save(file_path)
-                
-                try:
-                    new_file_path, error = process_menu_codes(file_path)
-                    
-                    if error:
-                        error_files.append(f"{filename}: {error}")
-                    else:
-                        success_files.append(new_file_path)
-                        result_files.append({
-                            'original': filename,
-                            'processed': os.path.basename(new_file_path),
-                            'path': new_file_path
-                        })
-                except Exception as e:
-                    error_files.append(f"{filename}: {str(e)}")
-                finally:
-                    # 清理上傳的檔案
-                    if os.path.exists(file_path):
-                        os.remove(file_path)
+        success_count = sum(1 for result in results if not result['error'])
+        error_files = skipped_files + [f"{result['original']}: {result['error']}" for result in results if result['error']]
+        if error_files:
+            flash('處理失敗：' + '; '.join(error_files), 'error')
+        if not success_count:
+            flash('沒有成功處理任何檔案', 'error')
+            return render_template('generate_menu_codes.html')
         
-        if success_files:
-            flash(f'成功處理 {len(success_files)} 個檔案', 'success')
-            return render_template('generate_menu_codes.html', result_files=result_files)
-        else:
-            if error_files:
-                flash('處理失敗：' + '; '.join(error_files), 'error')
-            else:
-                flash('沒有成功處理任何檔案', 'error')
+        flash(f'成功處理 {success_count} 個檔案', 'success')
+        return render_template('generate_menu_codes.html', result_files=results, batch_id=batch_id,
+                               total_seconds=total_seconds)
     
     return render_template('generate_menu_codes.html')
 
+def menu_codes_zip_path(batch_id):
+    """批次產生菜牌編號的ZIP檔案路徑"""
+    return os.path.join(app.config['UPLOAD_FOLDER'], f"menu_codes_{batch_id}.zip")
+
+def remove_expired_menu_codes_zips():
+    """刪除超過保留時間仍未下載的ZIP"""
+    expire_before = time.time() - MENU_CODES_ZIP_TTL
+    for zip_path in glob.glob(menu_codes_zip_path('*')):
+        try:
+            if os.path.getmtime(zip_path) < expire_before:
+                os.remove(zip_path)
+        except OSError:
+            pass
+
+@app.route('/download_menu_codes/<batch_id>')
+def download_menu_codes(batch_id):
+    """下載批次產生菜牌編號的ZIP"""
+    zip_path = menu_codes_zip_path(batch_id)
+    if not re.fullmatch(r'[0-9a-f]{32}', batch_id) or not os.path.exists(zip_path):
+        flash('找不到處理結果，請重新上傳檔案', 'error')
+        return redirect(url_for('generate_menu_codes'))
+    
+    current_time = datetime.now().strftime("%Y%m%d_%H%M%S")
+    # ZIP保留到超過 MENU_CODES_ZIP_TTL 後才由下一批上傳刪除，中斷或續傳的下載可以重新取得
+    return send_file(os.path.abspath(zip_path), as_attachment=True,
+                     download_name=f"menu_codes_{current_time}.zip", mimetype='application/zip')
+
 @app.route('/upload_database', methods=['GET', 'POST'])
 def upload_database():
     """上傳資料庫功能"""
@@ -162,16 +211,34 @@ def upload_database():
     
     return render_template('upload_database.html')
 
+def csv_stream_response(filename, content):
+    """
+    以 stream_query 返回的 ClosingStream 建立CSV下載回應
+    HEAD 請求或中途斷線時串流不會讀完，回應關閉時由 content.close() 歸還連線
+    """
+    response = Response(
+        stream_with_context(content),
+        mimetype='text/csv; charset=utf-8',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+    response.call_on_close(content.close)
+    return response
+
 @app.route('/download_no_english')
 def download_no_english():
-    """下載無英文菜單"""
+    """下載無英文菜單，?mode=delta 只下載上次匯出後新增的資料"""
+    delta = request.args.get('mode') == 'delta'
     try:
         from module.web_functions import download_no_english_menus_web
-        file_path = download_no_english_menus_web()
-        if file_path:
-            return send_file(file_path, as_attachment=True)
+        result = download_no_english_menus_web(delta=delta)
+        if result:
+            filename, content = result
+            return csv_stream_response(filename, content)
         else:
-            flash('下載失敗', 'error')
+            if delta:
+                flash('上次匯出後沒有新增無英文名稱的菜單資料', 'info')
+            else:
+                flash('資料庫中沒有找到無英文名稱的菜單資料', 'info')
     except Exception as e:
         flash(f'下載過程中發生錯誤：{str(e)}', 'error')
     
@@ -213,6 +280,102 @@ def upload_english():
     
     return render_template('upload_english.html')
 
+def read_menu_code_list():
+    """
+    從表單文字框、上傳檔案或JSON取得要查詢的菜牌編號
+    JSON 不是 {"menu_codes": 清單或文字} 時引發 ValueError
+    """
+    from module.web_functions import parse_menu_code_list
+    from module.mod_csv import read_text_auto
+
+    menu_codes = []
+    if request.is_json:
+        payload = request.get_json(silent=True) or {}
+        codes = payload.get('menu_codes', []) if isinstance(payload, dict) else None
+        if isinstance(codes, str):
+            codes = parse_menu_code_list(codes)
+        if not isinstance(codes, list):
+            raise ValueError('JSON 格式應為 {"menu_codes": ["菜牌編號", ...]} 或 {"menu_codes": "以逗號或換行分隔的菜牌編號"}')
+        menu_codes.extend(str(code) for code in codes)
+    else:
+        menu_codes.extend(parse_menu_code_list(request.form.get('menu_codes', '')))
+        file = request.files.get('file')
+        if file and file.filename:
+            data = file.read()
+            try:
+                content = read_text_auto(data)
+            except UnicodeDecodeError:
+                content = data.decode('utf-8', errors='replace')
+            menu_codes.extend(parse_menu_code_list(content))
+    return menu_codes
+
+@app.route('/search_menu_codes', methods=['GET', 'POST'])
+def menu_code_search():
+    """批次查詢菜牌編號，結果以CSV串流下載"""
+    if request.method == 'POST':
+        try:
+            menu_codes = read_menu_code_list()
+        except ValueError as e:
+            flash(str(e), 'error')
+            return redirect(request.url)
+        if not menu_codes:
+            flash('請輸入或上傳菜牌編號', 'error')
+            return redirect(request.url)
+
+        from module.web_functions import iter_menu_code_search_csv
+        filename = f"menu_search_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+        return Response(
+            stream_with_context(iter_menu_code_search_csv(menu_codes)),
+            mimetype='text/csv',
+            headers={'Content-Disposition': f'attachment; filename={filename}'}
+        )
+
+    return render_template('search_menu_codes.html')
+
+@app.route('/api/search_menu_codes', methods=['POST'])
+def api_search_menu_codes():
+    """菜牌編號查詢 API，JSON 或 CSV（format=csv）串流輸出"""
+    try:
+        menu_codes = read_menu_code_list()
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    if not menu_codes:
+        return jsonify({'success': False, 'message': '請提供菜牌編號'}), 400
+
+    from module.web_functions import iter_menu_code_search_csv, iter_menu_code_search_json
+    if request.args.get('format') == 'csv':
+        return Response(stream_with_context(iter_menu_code_search_csv(menu_codes)), mimetype='text/csv')
+    return Response(stream_with_context(iter_menu_code_search_json(menu_codes)), mimetype='application/json')
+
+@app.route('/api/menu_codes', methods=['GET', 'POST'])
+def api_menu_codes():
+    """
+    菜牌編號 API：已登記的名稱直接查表，沒見過的名稱即時計算
+    GET ?restaurant=餐廳名稱&menu=餐點名稱，或 POST JSON {"items": [{"restaurant": ..., "menu": ...}]}
+    """
+    if request.method == 'POST':
+        payload = request.get_json(silent=True)
+        items = payload.get('items') if isinstance(payload, dict) else None
+    else:
+        items = [{'restaurant': request.args.get('restaurant'), 'menu': request.args.get('menu')}]
+
+    from module.web_functions import lookup_menu_codes_web, MENU_CODE_API_MAX_ITEMS
+    if not isinstance(items, list) or not items:
+        return jsonify({'success': False, 'message': '請提供餐廳名稱與餐點名稱'}), 400
+    if len(items) > MENU_CODE_API_MAX_ITEMS:
+        return jsonify({'success': False, 'message': f'每次最多查詢 {MENU_CODE_API_MAX_ITEMS} 筆'}), 400
+
+    pairs = []
+    for item in items:
+        if not isinstance(item, dict) or not item.get('restaurant') or not item.get('menu'):
+            return jsonify({'success': False, 'message': '每個項目都需要 restaurant 與 menu'}), 400
+        pairs.append((str(item['restaurant']), str(item['menu'])))
+
+    try:
+        return jsonify({'success': True, 'codes': lookup_menu_codes_web(pairs)})
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'查詢過程中發生錯誤：{str(e)}'}), 500
+
 @app.route('/database_functions')
 def database_functions():
     """資料庫功能頁面"""
@@ -220,25 +383,53 @@ def database_functions():
 
 @app.route('/remove_duplicates', methods=['POST'])
 def remove_duplicates():
-    """刪除重複菜牌編號"""
+    """
+    刪除重複菜牌編號
+    JSON 參數 dry_run 為 true 時只返回各資料表的預覽，否則分批刪除並以 NDJSON 串流回報進度
+    """
+    payload = request.get_json(silent=True) or {}
     try:
-        db_function = DatabaseFunction()
-        result = db_function.remove_duplicates()
-        db_function.db.close_connection()
-        return jsonify({'success': True, 'message': '重複資料刪除完成'})
+        from module.web_functions import preview_duplicates_web, iter_remove_duplicates_web
+        if payload.get('dry_run'):
+            preview = preview_duplicates_web()
+            return jsonify({
+                'success': True,
+                'preview': preview,
+                'total_rows': sum(counts['rows'] for counts in preview.values())
+            })
+        return Response(stream_with_context(iter_remove_duplicates_web()), mimetype='application/x-ndjson')
     except Exception as e:
         return jsonify({'success': False, 'message': f'刪除過程中發生錯誤：{str(e)}'})
 
+@app.route('/duplicate_report')
+def duplicate_report():
+    """下載跨資料表重複菜牌編號報表（CSV串流）"""
+    try:
+        from module.web_functions import download_duplicate_report_web
+        result = download_duplicate_report_web()
+        if result:
+            filename, content = result
+            return csv_stream_response(filename, content)
+        flash('所有資料表中都沒有重複的菜牌編號', 'info')
+    except Exception as e:
+        flash(f'產生重複報表時發生錯誤：{str(e)}', 'error')
+    
+    return redirect(url_for('database_functions'))
+
 @app.route('/download_all')
 def download_all():
-    """下載所有菜牌"""
+    """下載所有菜牌，?format=xlsx（預設）、csv 或 gz"""
+    fmt = request.args.get('format', 'xlsx')
     try:
         from module.web_functions import download_all_web
-        file_path = download_all_web()
-        if file_path:
-            return send_file(file_path, as_attachment=True)
-        else:
-            flash('下載失敗', 'error')
+        filename, content, mimetype = download_all_web(fmt)
+        if fmt == 'xlsx':
+            return send_file(content, as_attachment=True, download_name=filename, mimetype=mimetype)
+        return Response(
+            stream_with_context(content),
+            mimetype=mimetype,
+            headers={'Content-Disposition': f'attachment; filename={filename}'}
+        )
     except Exception as e:
         flash(f'下載過程中發生錯誤：{str(e)}', 'error')
     
@@ -258,18 +449,27 @@ def new_menu_restaurant():
         try:
             if action == 'new_menu':
                 from module.web_functions import export_new_menus_web
-                file_path = export_new_menus_web(date_range)
-                if file_path:
-                    return send_file(file_path, as_attachment=True)
-                else:
-                    flash('新菜牌導出失敗', 'error')
+                result = export_new_menus_web(date_range)
+                label = '新菜牌'
             elif action == 'new_restaurant':
                 from module.web_functions import export_new_restaurants_web
-                file_path = export_new_restaurants_web(date_range)
-                if file_path:
-                    return send_file(file_path, as_attachment=True)
-                else:
-                    flash('新餐廳導出失敗', 'error')
+                result = export_new_restaurants_web(date_range)
+                label = '新餐廳'
+            else:
+                flash('未知的導出類型', 'error')
+                return redirect(request.url)
+            
+            if result:
+                filename, output, counts = result
+                return send_file(
+                    output,
+                    as_attachment=True,
+                    download_name=filename,
+                    mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+                )
+            flash(f'在指定日期 {date_range} 範圍內沒有找到{label}數據', 'info')
+        except ValueError as e:
+            flash(str(e), 'error')
         except Exception as e:
             flash(f'導出過程中發生錯誤：{str(e)}', 'error')
     
@@ -311,6 +511,11 @@ def convert_csv():
     
     return render_template('convert_csv.html')
 
+@app.route('/api/db_pool_stats')
+def db_pool_stats():
+    """資料庫連線池統計"""
+    return jsonify(get_pool().stats())
+
 @app.route('/download_file/<path:filename>')
 def download_file(filename):
     """下載生成的檔案"""
@@ -327,7 +532,7 @@ def clean_excel_file_web(file_path):
         # 這裡需要改寫原有的 clean_excel_file 函數以適應 web 版本
         # 目前先返回一個基本實現
         import pandas as pd
-        from module.mod_number import generate_menu_code, convert_to_code
+        from module.mod_menu_code import generate_menu_code, convert_to_code
         
         # 讀取Excel文件
         df = pd.read_excel(file_path)
@@ -1,6 +1,7 @@
 """
 菜牌管理系統 - Flask Web 版本啟動點
 """
+# 匯入 app 時即套用資料庫結構遷移
 from app import app
 import webbrowser
 import threading
@@ -10,3 +10,10 @@ DB_CONFIG = {
     'database': 'db_mediatek_menu',
     'charset': 'utf8mb4'
 }
+
+# 连接池参数
+POOL_CONFIG = {
+    'max_size': 10,            # 最大连接数
+    'max_idle_seconds': 300,   # 闲置超过此秒数的连接会被关闭
+    'checkout_timeout': 30     # 连接池已满时等待可用连接的秒数
+}
@@ -1,8 +1,8 @@
 import pandas as pd
 import os
 from tkinter import filedialog, messagebox
-from module.config_sql import DB_CONFIG
-import pymysql
+from module.mod_pool import get_pool
+from module.mod_catalog import get_catalog
 
 class MenuCodeComparator:
     def __init__(self):
@@ -10,36 +10,32 @@ class MenuCodeComparator:
         self.cursor = None
         
     def connect_database(self):
-        """连接到数据库"""
+        """从连接池借用数据库连接"""
         try:
-            self.connection = pymysql.connect(**DB_CONFIG)
+            self.connection = get_pool().acquire()
             self.cursor = self.connection.cursor()
         except Exception as e:
             messagebox.showerror("錯誤", f"資料庫連接失敗：\n{str(e)}")
             raise e
 
     def close_connection(self):
-        """关闭数据库连接"""
+        """关闭游标并归还数据库连接"""
         try:
-            if hasattr(self, 'cursor') and self.cursor:
+            if self.cursor:
                 self.cursor.close()
-            if hasattr(self, 'connection') and self.connection:
-                self.connection.close()
+                self.cursor = None
+            if self.connection:
+                connection = self.connection
+                self.connection = None
+                get_pool().release(connection)
         except Exception as e:
             print(f"關閉連接時發生錯誤：{str(e)}")
 
     def get_existing_menu_codes(self):
         """从数据库获取所有已存在的菜牌编号"""
         try:
-            # 确保已连接到数据库
-            if not hasattr(self, 'connection') or self.connection is None:
-                self.connect_database()
-            # 检查连接是否有效，不再检查open属性
-            try:
-                # 简单执行一个查询来测试连接是否有效
-                self.cursor.execute("SELECT 1")
-            except:
-                # 如果连接无效，重新连接
+            # 确保已连接到数据库（连接池借出时已做健康检查）
+            if self.connection is None:
                 self.connect_database()
             
             # 需要搜尋的表格清單
@@ -49,15 +45,8 @@ class MenuCodeComparator:
             
             # 從每個表格中獲取菜牌編號
             for table in tables:
-                # 檢查表格是否存在
-                check_table_sql = f"""
-                SELECT COUNT(*) 
-                FROM information_schema.tables 
-                WHERE table_schema = DATABASE() 
-                AND table_name = '{table}'
-                """
-                self.cursor.execute(check_table_sql)
-                if self.cursor.fetchone()[0] == 0:
+                # 檢查表格是否存在（由資料表結構快取回答）
+                if not get_catalog().table_exists(table):
                     continue  # 表格不存在，跳過
                 
                 # 從該表格中獲取菜牌編號
@@ -1,5 +1,7 @@
 import os
+import io
 import csv
+from .mod_csv import read_text_auto
 
 # 定義函數來轉換 CSV 文件為 Unicode 文本文件
 def convert_csv_to_unicode_txt(file_paths):
@@ -9,10 +11,10 @@ def convert_csv_to_unicode_txt(file_paths):
         output_file = f"{base_name}.txt"
         
         # 讀取 CSV 並寫入到 TXT
-        with open(file_path, 'r', encoding='utf-8-sig') as csv_file:
-            reader = csv.reader(csv_file)
-            with open(output_file, 'w', encoding='utf-8') as txt_file:
-                for row in reader:
-                    txt_file.write(' '.join(row) + '\n')
+        # 自動判斷原始編碼（UTF-8、Big5 等）
+        reader = csv.reader(io.StringIO(read_text_auto(file_path)))
+        with open(output_file, 'w', encoding='utf-8') as txt_file:
+            for row in reader:
+                txt_file.write(' '.join(row) + '\n')
 
         print(f"已轉換: {output_file}")
@@ -1,8 +1,135 @@
-import pandas as pd
-import pymysql
+import os
 from tkinter import messagebox, filedialog
 from datetime import datetime
-from .config_sql import DB_CONFIG
+from .mod_pool import get_pool
+from .mod_catalog import get_catalog
+from .mod_export import QueryStream, write_csv
+
+# 需要查詢的資料表
+NO_ENGLISH_TABLES = ['med_sun', 'med_tpr', 'med_tpx']
+
+# 輸出CSV的欄位
+NO_ENGLISH_COLUMNS = ["序號", "餐廳編號", "餐廳名稱", "據點", "餐點編號", "菜牌編號",
+                      "餐點名稱", "英文名稱", "建檔日期", "資料表"]
+
+# 匯出位置記錄（export_watermark）中的匯出名稱
+WATERMARK_NAME = 'no_english'
+
+def get_export_ranges(connection, delta=False):
+    """
+    決定本次匯出每個資料表的序號範圍：{資料表: (起始序號(不含), 結束序號, 最後建檔日期)}
+    結束序號為目前最大序號；delta 為 True 時從上次匯出的序號之後開始，否則從頭開始
+    """
+    tables = get_catalog().existing_tables(NO_ENGLISH_TABLES)
+    if not tables:
+        return {}
+
+    with connection.cursor() as cursor:
+        cursor.execute(" UNION ALL ".join(
+            f"SELECT '{table}', COALESCE(MAX(序號), 0), MAX(建檔日期) FROM {table}"
+            for table in tables
+        ))
+        latest = {table: (max_id, max_date) for table, max_id, max_date in cursor.fetchall()}
+
+        exported = {}
+        if delta:
+            cursor.execute(
+                "SELECT 資料表, 最後序號 FROM export_watermark WHERE 匯出名稱 = %s",
+                (WATERMARK_NAME,)
+            )
+            exported = dict(cursor.fetchall())
+
+    return {
+        table: (exported.get(table, 0), latest[table][0], latest[table][1])
+        for table in tables
+    }
+
+def save_export_ranges(connection, ranges):
+    """匯出完成後記錄每個資料表已匯出到的序號與建檔日期"""
+    if not ranges:
+        return
+    now = datetime.now()
+    with connection.cursor() as cursor:
+        cursor.executemany("""
+        INSERT INTO export_watermark (匯出名稱, 資料表, 最後序號, 最後建檔日期, 更新日期)
+        VALUES (%s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE 最後序號 = VALUES(最後序號),
+                                最後建檔日期 = VALUES(最後建檔日期),
+                                更新日期 = VALUES(更新日期)
+        """, [
+            (WATERMARK_NAME, table, last_id, last_date, now)
+            for table, (_, last_id, last_date) in ranges.items()
+        ])
+    connection.commit()
+
+def build_no_english_sql(ranges):
+    """
+    產生無英文菜單的查詢，返回 (SQL, 參數)
+    只查詢每個資料表序號範圍內的資料；每個資料表內以 ROW_NUMBER 依據點與餐點編號去重
+    （保留菜牌編號最小的一筆），並以 COUNT(*) OVER () 附上該資料表去重前的筆數，
+    所有資料表以 UNION ALL 合併（視窗函數需要 MySQL 8.0 以上）
+    """
+    selects = []
+    params = []
+    for table, (after_id, last_id, _) in ranges.items():
+        selects.append(f"""
+        SELECT 序號, 餐廳編號, 餐廳名稱, 據點, 餐點編號, 菜牌編號, 餐點名稱, 英文名稱, 建檔日期,
+               '{table}' AS 資料表,
+               ROW_NUMBER() OVER (PARTITION BY 據點, 餐點編號 ORDER BY 菜牌編號, 序號) AS 據點內順序,
+               COUNT(*) OVER () AS 原始筆數
+        FROM {table}
+        WHERE (英文名稱 IS NULL OR 英文名稱 = '')
+        AND 序號 > %s AND 序號 <= %s
+        """)
+        params.extend([after_id, last_id])
+
+    sql = f"""
+    SELECT {', '.join(NO_ENGLISH_COLUMNS)}, 原始筆數
+    FROM ({"UNION ALL".join(selects)}) no_english
+    WHERE 據點內順序 = 1
+    ORDER BY 菜牌編號
+    """
+    return sql, params
+
+def iter_no_english_rows(connection, counts, ranges):
+    """
+    以單一查詢逐筆產生序號範圍內的無英文菜單資料（欄位同 NO_ENGLISH_COLUMNS），
+    讀取過程中將各資料表的筆數累計至 counts：{資料表: {'raw': 去重前, 'unique': 去重後}}
+    """
+    for table in ranges:
+        counts[table] = {'raw': 0, 'unique': 0}
+    if not ranges:
+        return
+
+    table_index = NO_ENGLISH_COLUMNS.index("資料表")
+    sql, params = build_no_english_sql(ranges)
+    # 產生器被提前關閉時也會關閉游標
+    with QueryStream(connection, sql, params) as stream:
+        for row in stream:
+            table_counts = counts[row[table_index]]
+            table_counts['raw'] = row[-1]
+            table_counts['unique'] += 1
+            yield row[:-1]
+
+def write_no_english_csv(connection, file_path, delta=False):
+    """
+    將無英文菜單資料直接由游標寫入CSV
+    delta 為 True 時只匯出上次匯出後新增的資料，完成後更新匯出位置；完整匯出不移動匯出位置
+    返回各資料表的筆數：{資料表: {'raw': 去重前, 'unique': 去重後}}
+    """
+    counts = {}
+    ranges = get_export_ranges(connection, delta)
+    write_csv(file_path, NO_ENGLISH_COLUMNS, iter_no_english_rows(connection, counts, ranges))
+    if delta:
+        save_export_ranges(connection, ranges)
+    return counts
+
+def format_no_english_counts(counts):
+    """各資料表去重前後筆數的說明文字"""
+    return "\n".join([
+        f"{table}: {c['raw']} 筆 (原始) → {c['unique']} 筆 (據點內去重) [減少 {c['raw'] - c['unique']} 筆]"
+        for table, c in counts.items()
+    ])
 
 def download_no_english_menus():
     """
@@ -10,9 +137,8 @@ def download_no_english_menus():
     包括med_sun, med_tpr, med_tpx三個資料表的資料
     """
     try:
-        # 連接到MySQL資料庫
-        connection = pymysql.connect(**DB_CONFIG)
-        cursor = connection.cursor()
+        # 從連線池借用資料庫連線
+        connection = get_pool().acquire()
         
         # 取得當前日期時間作為檔名
         current_time = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -28,106 +154,25 @@ def download_no_english_menus():
         if not file_path:
             return
         
-        # 需要查詢的資料表
-        tables = ['med_sun', 'med_tpr', 'med_tpx']
+        # 單一查詢完成據點內去重與筆數統計，結果直接寫入CSV
+        counts = write_no_english_csv(connection, file_path)
+        total = sum(c['unique'] for c in counts.values())
         
-        all_results = []
-        table_raw_counts = {}  # 紀錄每個表格的原始資料數量
-        table_unique_counts = {}  # 紀錄每個表格去重後的資料數量
-        
-        # 從每個資料表中獲取沒有英文名稱的菜單資料
-        for table in tables:
-            # 檢查表格是否存在
-            check_table_sql = f"""
-            SELECT COUNT(*) 
-            FROM information_schema.tables 
-            WHERE table_schema = DATABASE() 
-            AND table_name = '{table}'
-            """
-            cursor.execute(check_table_sql)
-            if cursor.fetchone()[0] == 0:
-                continue  # 表格不存在，跳過
-            
-            # 首先獲取原始資料數量
-            raw_count_query = f"""
-            SELECT COUNT(*)
-            FROM {table}
-            WHERE 英文名稱 IS NULL OR 英文名稱 = ''
-            """
-            cursor.execute(raw_count_query)
-            table_raw_counts[table] = cursor.fetchone()[0]
-            
-            # 從該表格中查詢沒有英文名稱的資料
-            query = f"""
-            SELECT 序號, 餐廳編號, 餐廳名稱, 據點, 餐點編號, 菜牌編號, 餐點名稱, 英文名稱, 建檔日期
-            FROM {table}
-            WHERE 英文名稱 IS NULL OR 英文名稱 = ''
-            ORDER BY 菜牌編號
-            """
-            
-            cursor.execute(query)
-            results = cursor.fetchall()
-            
-            # 將結果轉換為DataFrame進行據點內去重
-            columns = ["序號", "餐廳編號", "餐廳名稱", "據點", "餐點編號", "菜牌編號", 
-                     "餐點名稱", "英文名稱", "建檔日期"]
-            table_df = pd.DataFrame(results, columns=columns)
-            
-            # 記錄去重前的資料筆數
-            before_dedup = len(table_df)
-            
-            # 按據點和餐點編號去重，保留第一筆出現的資料
-            table_df = table_df.drop_duplicates(subset=['據點', '餐點編號'], keep='first')
-            
-            # 記錄去重後的資料筆數
-            after_dedup = len(table_df)
-            table_unique_counts[table] = after_dedup
-            
-            # 將表格名稱添加到每一行結果中
-            for _, row in table_df.iterrows():
-                # 將Series轉換為列表
-                row_list = row.tolist()
-                # 添加表格名稱
-                row_list.append(table)
-                # 將列表轉換為元組，並添加到結果列表中
-                all_results.append(tuple(row_list))
-        
-        if not all_results:
+        if total == 0:
+            if os.path.exists(file_path):
+                os.remove(file_path)
             messagebox.showinfo("提示", "資料庫中沒有找到無英文名稱的菜單資料")
             return
         
-        # 轉換為DataFrame
-        columns = ["序號", "餐廳編號", "餐廳名稱", "據點", "餐點編號", "菜牌編號", 
-                  "餐點名稱", "英文名稱", "建檔日期", "資料表"]
-        df = pd.DataFrame(all_results, columns=columns)
-        
-        # 按照菜牌編號排序
-        df = df.sort_values(by='菜牌編號')
-        
-        # 儲存為CSV，設定編碼為UTF-8以支援中文
-        df.to_csv(file_path, index=False, encoding='utf-8-sig')
-        
-        # 創建每個表格資料筆數的訊息
-        table_count_msg = "\n".join([
-            f"{table}: {raw} 筆 (原始) → {unique} 筆 (據點內去重) [減少 {raw-unique} 筆]" 
-            for table, raw, unique in zip(
-                table_raw_counts.keys(), 
-                table_raw_counts.values(), 
-                table_unique_counts.values()
-            )
-        ])
-        
         messagebox.showinfo("成功", 
                            f"無英文菜單資料已成功下載至：\n{file_path}\n\n"
-                           f"各表格資料筆數：\n{table_count_msg}\n\n"
-                           f"總計：{len(df)} 筆資料\n"
+                           f"各表格資料筆數：\n{format_no_english_counts(counts)}\n\n"
+                           f"總計：{total} 筆資料\n"
                            f"每個據點內的重複餐點編號已去除")
 
     except Exception as e:
         messagebox.showerror("錯誤", f"下載無英文菜單資料時發生錯誤：\n{str(e)}")
     finally:
-        # 關閉資料庫連接
-        if 'cursor' in locals() and cursor:
-            cursor.close()
+        # 歸還資料庫連線
         if 'connection' in locals() and connection:
-            connection.close()
+            get_pool().release(connection)
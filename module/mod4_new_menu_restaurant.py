@@ -1,20 +1,18 @@
 import os
 import re
-import csv
 import pymysql
 import datetime
 from tkinter import messagebox, filedialog
 from pathlib import Path
-from .config_sql import DB_CONFIG
+from .mod_pool import get_pool
+from .mod_catalog import get_catalog
+from .mod_export import QueryStream, write_csv, write_xlsx
 
 class MenuRestaurantExporter:
     def __init__(self):
-        # 导出目录
+        # 导出目录（桌面版导出 CSV 时才建立）
         self.export_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'export')
         
-        # 确保导出目录存在
-        os.makedirs(self.export_dir, exist_ok=True)
-        
         # 要导出的表名
         self.tables = ['med_sun', 'med_tpr', 'med_tpx']
     
@@ -37,150 +35,132 @@ class MenuRestaurantExporter:
         except Exception as e:
             raise ValueError(f"日期格式錯誤：{date_range_str}，請使用 YYYYMMDD-YYYYMMDD 格式或單一日期 YYYYMMDD。詳細錯誤：{str(e)}")
     
-    def export_new_menus(self, date_range_str):
-        """导出指定日期区间内的所有新菜牌"""
-        try:
-            start_date, end_date = self.parse_date_range(date_range_str)
-            
-            # 连接到 MySQL 数据库
-            try:
-                connection = pymysql.connect(**DB_CONFIG)
-                cursor = connection.cursor()
-            except pymysql.Error as e:
-                messagebox.showerror("數據庫連接錯誤", f"無法連接到數據庫：{str(e)}")
-                return False
-            
-            # 转换日期为 MySQL 可用的格式
-            start_date_str = start_date.strftime('%Y-%m-%d')
-            end_date_str = end_date.strftime('%Y-%m-%d')
+    def new_menus_query(self, table_name, start_date_str, end_date_str):
+        """
+        查询日期区间内第一次出现的菜牌
+        依 menu_first_seen 的日期索引做范围扫描，再以序号取回原始记录，返回 (SQL, 参数)
+        """
+        query = f"""
+        SELECT t.* FROM menu_first_seen f
+        JOIN {table_name} t ON t.序號 = f.序號
+        WHERE f.資料表 = %s
+        AND f.建檔日期 BETWEEN %s AND %s
+        ORDER BY t.序號
+        """
+        return query, (table_name, start_date_str, end_date_str)
+    
+    def new_restaurants_query(self, table_name, start_date_str, end_date_str):
+        """
+        查询日期区间内第一次出现的餐厅-据点组合
+        依 restaurant_first_seen 的日期索引做范围扫描，再以序号取回原始记录，返回 (SQL, 参数)
+        """
+        query = f"""
+        SELECT t.* FROM restaurant_first_seen f
+        JOIN {table_name} t ON t.序號 = f.序號
+        WHERE f.資料表 = %s
+        AND f.建檔日期 BETWEEN %s AND %s
+        ORDER BY t.序號
+        """
+        return query, (table_name, start_date_str, end_date_str)
+    
+    def _date_range_params(self, date_range_str):
+        """解析日期区间并转换为 MySQL 可用的格式"""
+        start_date, end_date = self.parse_date_range(date_range_str)
+        return start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')
+    
+    def _new_record_streams(self, connection, build_query, required_columns, start_date_str, end_date_str):
+        """
+        依序产生每个表的 (表名, 列名, 新记录)
+        服务器端只返回新记录，以不缓冲游标逐笔读取，列名取自查询结果
+        """
+        for table_name in self.tables:
+            # 检查表是否存在并验证表结构（由数据表结构缓存回答）
+            column_names = get_catalog().columns(table_name)
+            if not column_names:
+                print(f"表 {table_name} 不存在，跳过处理")
+                continue  # 表不存在，跳过
             
-            export_count = 0
-            export_files = []
+            missing_columns = [col for col in required_columns if col not in column_names]
+            if missing_columns:
+                print(f"警告: 表 {table_name} 中没有 {', '.join(missing_columns)} 列")
+                continue
             
-            # 从每个表中导出数据
-            for table_name in self.tables:
-                try:
-                    # 检查表是否存在
-                    check_table_sql = f"""
-                    SELECT COUNT(*) 
-                    FROM information_schema.tables 
-                    WHERE table_schema = DATABASE() 
-                    AND table_name = '{table_name}'
-                    """
-                    cursor.execute(check_table_sql)
-                    if cursor.fetchone()[0] == 0:
-                        continue  # 表不存在，跳过
-                    
-                    # 验证表结构
-                    try:
-                        columns_query = f"SHOW COLUMNS FROM {table_name}"
-                        cursor.execute(columns_query)
-                        column_names = [column[0] for column in cursor.fetchall()]
-                        print(f"表 {table_name} 的列: {', '.join(column_names)}")
-                        
-                        if '菜牌編號' not in column_names:
-                            print(f"警告: 表 {table_name} 中没有'菜牌編號'列")
-                            continue
-                        
-                        if '建檔日期' not in column_names:
-                            print(f"警告: 表 {table_name} 中没有'建檔日期'列")
-                            continue
-                    except pymysql.Error as e:
-                        print(f"获取表 {table_name} 结构时出错: {str(e)}")
-                        continue
-                    
-                    # 第一步：获取该表中开始日期之前的所有菜牌编号
-                    existing_menu_codes = set()
-                    query = f"""
-                    SELECT DISTINCT 菜牌編號 FROM {table_name}
-                    WHERE 建檔日期 < %s 
-                    AND 菜牌編號 IS NOT NULL 
-                    AND 菜牌編號 != ''
-                    """
-                    cursor.execute(query, (start_date_str,))
-                    for row in cursor.fetchall():
-                        if row[0]:  # 确保菜牌编号不为空
-                            existing_menu_codes.add(row[0])
-                    
-                    print(f"表 {table_name} 中历史菜牌编号总数: {len(existing_menu_codes)}")
-                    
-                    # 第二步：查询该日期区间内的数据
-                    query = f"""
-                    SELECT * FROM {table_name}
-                    WHERE 建檔日期 BETWEEN %s AND %s
-                    """
-                    cursor.execute(query, (start_date_str, end_date_str))
-                    results = cursor.fetchall()
-                    
-                    if results:
-                        # 获取列名
-                        columns_query = f"SHOW COLUMNS FROM {table_name}"
-                        cursor.execute(columns_query)
-                        column_names = [column[0] for column in cursor.fetchall()]
-                        
-                        # 查找菜牌编号列的索引
-                        menu_code_index = column_names.index('菜牌編號') if '菜牌編號' in column_names else None
-                        
-                        if menu_code_index is not None:
-                            # 筛选出新菜牌（不在现有菜牌编号集合中的）
-                            new_menu_records = []
-                            table_new_menus = set()  # 记录当前表中找到的新菜牌
-                            
-                            # 统计符合日期条件但是菜牌编号为空的记录
-                            empty_code_count = 0
-                            
-                            for record in results:
-                                menu_code = record[menu_code_index]
-                                
-                                if not menu_code or menu_code.strip() == '':
-                                    empty_code_count += 1
-                                    continue
-                                    
-                                if menu_code not in existing_menu_codes:
-                                    new_menu_records.append(record)
-                                    existing_menu_codes.add(menu_code)  # 添加到已处理集合，避免同一表中重复
-                                    table_new_menus.add(menu_code)  # 记录新找到的菜牌
-                            
-                            print(f"表 {table_name} 中找到 {len(table_new_menus)} 个新菜牌编号")
-                            if empty_code_count > 0:
-                                print(f"表 {table_name} 中有 {empty_code_count} 条记录的菜牌编号为空")
-                            
-                            if len(results) - empty_code_count - len(new_menu_records) > 0:
-                                print(f"表 {table_name} 中有 {len(results) - empty_code_count - len(new_menu_records)} 条记录的菜牌编号已存在")
-                            
-                            if new_menu_records:
-                                # 构建 CSV 文件名
-                                timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
-                                file_name = f"new_menus_{table_name}_{timestamp}.csv"
-                                file_path = os.path.join(self.export_dir, file_name)
-                                
-                                # 导出为 CSV
-                                with open(file_path, 'w', newline='', encoding='utf-8-sig') as csv_file:
-                                    csv_writer = csv.writer(csv_file)
-                                    csv_writer.writerow(column_names)
-                                    csv_writer.writerows(new_menu_records)
-                                
-                                export_count += len(new_menu_records)
-                                export_files.append(file_path)
-                                
-                                print(f"已导出 {len(new_menu_records)} 条新菜牌数据到 {file_path}")
-                            else:
-                                print(f"表 {table_name} 没有需要导出的新菜牌数据")
-                        else:
-                            print(f"表 {table_name} 中找不到菜牌编号列")
-                    else:
-                        print(f"表 {table_name} 在日期区间内没有记录")
+            query, params = build_query(table_name, start_date_str, end_date_str)
+            stream = QueryStream(connection, query, params)
+            yield table_name, stream.columns, stream
+    
+    def _export_new_records(self, date_range_str, build_query, required_columns, file_prefix, label):
+        """
+        依 build_query 产生的查询，将每个表的新记录导出为一个 CSV 文件
+        返回 (导出笔数, 文件列表)
+        """
+        start_date_str, end_date_str = self._date_range_params(date_range_str)
+        
+        # 确保导出目录存在
+        os.makedirs(self.export_dir, exist_ok=True)
+        
+        # 从连接池借用数据库连接
+        connection = get_pool().acquire()
+        
+        export_count = 0
+        export_files = []
+        try:
+            streams = self._new_record_streams(connection, build_query, required_columns, start_date_str, end_date_str)
+            for table_name, columns, rows in streams:
+                # 构建 CSV 文件名
+                timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+                file_name = f"{file_prefix}_{table_name}_{timestamp}.csv"
+                file_path = os.path.join(self.export_dir, file_name)
                 
-                except pymysql.Error as e:
-                    print(f"處理表 {table_name} 時出錯: {str(e)}")
-                    continue
-                except Exception as e:
-                    print(f"處理表 {table_name} 時發生未知錯誤: {str(e)}")
-                    continue
-            
-            # 关闭数据库连接
-            cursor.close()
-            connection.close()
+                new_count = write_csv(file_path, columns, rows)
+                
+                if new_count:
+                    export_count += new_count
+                    export_files.append(file_path)
+                    print(f"已导出 {new_count} 条{label}数据到 {file_path}")
+                else:
+                    os.remove(file_path)
+                    print(f"表 {table_name} 没有需要导出的{label}数据")
+        finally:
+            # 归还数据库连接
+            get_pool().release(connection)
+        
+        return export_count, export_files
+    
+    def _write_new_records_workbook(self, date_range_str, build_query, required_columns, output):
+        """
+        将每个表的新记录写入同一个 Excel 工作簿（每个表一个工作表），output 为文件路径或文件对象
+        以 write-only 模式边读边写，返回各表的导出笔数
+        """
+        start_date_str, end_date_str = self._date_range_params(date_range_str)
+        
+        # 从连接池借用数据库连接
+        connection = get_pool().acquire()
+        try:
+            streams = self._new_record_streams(connection, build_query, required_columns, start_date_str, end_date_str)
+            return write_xlsx(output, streams)
+        finally:
+            # 归还数据库连接
+            get_pool().release(connection)
+    
+    def export_new_menus_workbook(self, date_range_str, output):
+        """将日期区间内的新菜牌导出为一个工作簿，返回各表的导出笔数"""
+        return self._write_new_records_workbook(
+            date_range_str, self.new_menus_query, ['菜牌編號', '建檔日期'], output
+        )
+    
+    def export_new_restaurants_workbook(self, date_range_str, output):
+        """将日期区间内的新餐厅导出为一个工作簿，返回各表的导出笔数"""
+        return self._write_new_records_workbook(
+            date_range_str, self.new_restaurants_query, ['餐廳名稱', '據點', '建檔日期'], output
+        )
+    
+    def export_new_menus(self, date_range_str):
+        """导出指定日期区间内的所有新菜牌"""
+        try:
+            export_count, export_files = self._export_new_records(
+                date_range_str, self.new_menus_query, ['菜牌編號', '建檔日期'], 'new_menus', '新菜牌'
+            )
             
             if export_count > 0:
                 messagebox.showinfo("導出完成", f"成功導出 {export_count} 條新菜牌數據，共 {len(export_files)} 個文件，保存在 {self.export_dir} 目錄下。")
@@ -192,6 +172,9 @@ class MenuRestaurantExporter:
         except ValueError as e:
             messagebox.showerror("值錯誤", str(e))
             return False
+        except pymysql.Error as e:
+            messagebox.showerror("數據庫連接錯誤", f"無法連接到數據庫：{str(e)}")
+            return False
         except Exception as e:
             messagebox.showerror("錯誤", f"導出新菜牌失敗：{str(e)}")
             return False
@@ -199,163 +182,9 @@ class MenuRestaurantExporter:
     def export_new_restaurants(self, date_range_str):
         """导出指定日期区间内的新餐厅（不包括已存在的餐厅）"""
         try:
-            start_date, end_date = self.parse_date_range(date_range_str)
-            
-            # 连接到 MySQL 数据库
-            try:
-                connection = pymysql.connect(**DB_CONFIG)
-                cursor = connection.cursor()
-            except pymysql.Error as e:
-                messagebox.showerror("數據庫連接錯誤", f"無法連接到數據庫：{str(e)}")
-                return False
-            
-            # 转换日期为 MySQL 可用的格式
-            start_date_str = start_date.strftime('%Y-%m-%d')
-            end_date_str = end_date.strftime('%Y-%m-%d')
-            
-            export_count = 0
-            export_files = []
-            
-            # 分别处理每个表中的新餐厅
-            for table_name in self.tables:
-                try:
-                    # 检查表是否存在
-                    check_table_sql = f"""
-                    SELECT COUNT(*) 
-                    FROM information_schema.tables 
-                    WHERE table_schema = DATABASE() 
-                    AND table_name = '{table_name}'
-                    """
-                    cursor.execute(check_table_sql)
-                    if cursor.fetchone()[0] == 0:
-                        print(f"表 {table_name} 不存在，跳过处理")
-                        continue  # 表不存在，跳过
-                    
-                    # 验证表结构
-                    try:
-                        columns_query = f"SHOW COLUMNS FROM {table_name}"
-                        cursor.execute(columns_query)
-                        column_names = [column[0] for column in cursor.fetchall()]
-                        print(f"表 {table_name} 的列: {', '.join(column_names)}")
-                        
-                        if '餐廳名稱' not in column_names:
-                            print(f"警告: 表 {table_name} 中没有'餐廳名稱'列")
-                            continue
-                        
-                        if '據點' not in column_names:
-                            print(f"警告: 表 {table_name} 中没有'據點'列")
-                            continue
-                        
-                        if '建檔日期' not in column_names:
-                            print(f"警告: 表 {table_name} 中没有'建檔日期'列")
-                            continue
-                    except pymysql.Error as e:
-                        print(f"获取表 {table_name} 结构时出错: {str(e)}")
-                        continue
-                    
-                    # 第一步：获取该表中开始日期之前的所有餐厅和据点组合
-                    existing_restaurants = set()
-                    query = f"""
-                    SELECT DISTINCT 餐廳名稱, 據點 FROM {table_name}
-                    WHERE 建檔日期 < %s 
-                    AND 餐廳名稱 IS NOT NULL 
-                    AND 餐廳名稱 != ''
-                    AND 據點 IS NOT NULL
-                    AND 據點 != ''
-                    """
-                    cursor.execute(query, (start_date_str,))
-                    for row in cursor.fetchall():
-                        if row[0] and row[1]:  # 确保餐厅名称和据点都不为空
-                            existing_restaurants.add((row[0], row[1]))
-                    
-                    print(f"表 {table_name} 中历史餐厅-据点组合总数: {len(existing_restaurants)}")
-                    
-                    # 第二步：查询该日期区间内的数据
-                    query = f"""
-                    SELECT * FROM {table_name}
-                    WHERE 建檔日期 BETWEEN %s AND %s
-                    """
-                    cursor.execute(query, (start_date_str, end_date_str))
-                    results = cursor.fetchall()
-                    
-                    if results:
-                        # 获取列名
-                        columns_query = f"SHOW COLUMNS FROM {table_name}"
-                        cursor.execute(columns_query)
-                        column_names = [column[0] for column in cursor.fetchall()]
-                        
-                        # 查找餐厅名称和据点列的索引
-                        restaurant_index = column_names.index('餐廳名稱') if '餐廳名稱' in column_names else None
-                        location_index = column_names.index('據點') if '據點' in column_names else None
-                        
-                        if restaurant_index is not None and location_index is not None:
-                            # 筛选出新餐厅（不在现有餐厅集合中的）
-                            new_restaurant_records = []
-                            table_new_restaurants = set()  # 记录当前表中找到的新餐厅
-                            
-                            # 统计符合日期条件但是餐厅名称或据点为空的记录
-                            empty_name_count = 0
-                            empty_location_count = 0
-                            
-                            for record in results:
-                                restaurant_name = record[restaurant_index]
-                                location = record[location_index]
-                                
-                                if not restaurant_name or restaurant_name.strip() == '':
-                                    empty_name_count += 1
-                                    continue
-                                    
-                                if not location or location.strip() == '':
-                                    empty_location_count += 1
-                                    continue
-                                    
-                                if (restaurant_name, location) not in existing_restaurants:
-                                    new_restaurant_records.append(record)
-                                    existing_restaurants.add((restaurant_name, location))  # 添加到已处理集合，避免同一表中重复
-                                    table_new_restaurants.add((restaurant_name, location))  # 记录新找到的餐厅
-                            
-                            print(f"表 {table_name} 中找到 {len(table_new_restaurants)} 个新餐厅-据点组合")
-                            if empty_name_count > 0:
-                                print(f"表 {table_name} 中有 {empty_name_count} 条记录的餐厅名称为空")
-                            if empty_location_count > 0:
-                                print(f"表 {table_name} 中有 {empty_location_count} 条记录的据点为空")
-                            
-                            if len(results) - empty_name_count - empty_location_count - len(new_restaurant_records) > 0:
-                                print(f"表 {table_name} 中有 {len(results) - empty_name_count - empty_location_count - len(new_restaurant_records)} 条记录的餐厅-据点组合已存在")
-                            
-                            if new_restaurant_records:
-                                # 构建 CSV 文件名
-                                timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
-                                file_name = f"new_restaurants_{table_name}_{timestamp}.csv"
-                                file_path = os.path.join(self.export_dir, file_name)
-                                
-                                # 导出为 CSV
-                                with open(file_path, 'w', newline='', encoding='utf-8-sig') as csv_file:
-                                    csv_writer = csv.writer(csv_file)
-                                    csv_writer.writerow(column_names)
-                                    csv_writer.writerows(new_restaurant_records)
-                                
-                                export_count += len(new_restaurant_records)
-                                export_files.append(file_path)
-                                
-                                print(f"已导出 {len(new_restaurant_records)} 条新餐厅数据到 {file_path}")
-                            else:
-                                print(f"表 {table_name} 没有需要导出的新餐厅数据")
-                        else:
-                            print(f"表 {table_name} 中找不到餐厅名称列或据点列")
-                    else:
-                        print(f"表 {table_name} 在日期区间内没有记录")
-                
-                except pymysql.Error as e:
-                    print(f"處理表 {table_name} 時出錯: {str(e)}")
-                    continue
-                except Exception as e:
-                    print(f"處理表 {table_name} 時發生未知錯誤: {str(e)}")
-                    continue
-            
-            # 关闭数据库连接
-            cursor.close()
-            connection.close()
+            export_count, export_files = self._export_new_records(
+                date_range_str, self.new_restaurants_query, ['餐廳名稱', '據點', '建檔日期'], 'new_restaurants', '新餐厅'
+            )
             
             if export_count > 0:
                 messagebox.showinfo("導出完成", f"成功導出 {export_count} 條新餐廳數據，共 {len(export_files)} 個文件，保存在 {self.export_dir} 目錄下。")
@@ -367,6 +196,9 @@ class MenuRestaurantExporter:
         except ValueError as e:
             messagebox.showerror("值錯誤", str(e))
             return False
+        except pymysql.Error as e:
+            messagebox.showerror("數據庫連接錯誤", f"無法連接到數據庫：{str(e)}")
+            return False
         except Exception as e:
             messagebox.showerror("錯誤", f"導出新餐廳失敗：{str(e)}")
             return False
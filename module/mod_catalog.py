@@ -0,0 +1,60 @@
+"""
+資料表結構快取
+整個程序共用一份，第一次使用時以單一 information_schema 查詢載入所有資料表與欄位，
+之後直接由記憶體回答；只有遷移建立或修改資料表後才需要 invalidate()
+"""
+import threading
+from module.mod_pool import get_pool
+
+class SchemaCatalog:
+    def __init__(self):
+        self._tables = None  # 資料表名稱 -> 欄位清單（依欄位順序）
+        self._lock = threading.Lock()
+
+    def _load(self):
+        query = """
+        SELECT table_name, column_name
+        FROM information_schema.columns
+        WHERE table_schema = DATABASE()
+        ORDER BY table_name, ordinal_position
+        """
+        tables = {}
+        with get_pool().connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(query)
+                for table_name, column_name in cursor.fetchall():
+                    tables.setdefault(table_name, []).append(column_name)
+        return tables
+
+    def _get_tables(self):
+        tables = self._tables
+        if tables is None:
+            with self._lock:
+                if self._tables is None:
+                    self._tables = self._load()
+                tables = self._tables
+        return tables
+
+    def table_exists(self, table_name):
+        """資料表是否存在"""
+        return table_name in self._get_tables()
+
+    def existing_tables(self, table_names):
+        """依原順序返回存在的資料表"""
+        tables = self._get_tables()
+        return [name for name in table_names if name in tables]
+
+    def columns(self, table_name):
+        """資料表的欄位清單，資料表不存在時返回空清單"""
+        return list(self._get_tables().get(table_name, []))
+
+    def invalidate(self):
+        """清除快取，下次查詢時重新載入"""
+        with self._lock:
+            self._tables = None
+
+_catalog = SchemaCatalog()
+
+def get_catalog():
+    """取得全域共用的資料表結構快取"""
+    return _catalog
@@ -0,0 +1,226 @@
+"""
+菜牌編號索引與編號登記表
+CodeRegistry 以字典記錄每個菜牌編號被哪些來源（正規化後的餐廳名稱與餐點名稱）使用，
+資料庫中的編號在第一次用到時批次查詢載入，之後每個編號的檢查都只是一次字典查詢；
+code_registry 資料表以計算編號用的名稱（code_key）記錄已使用的編號，產生編號時先查詢登記表
+（經由程序內快取），只有沒見過的名稱才重新計算
+"""
+import threading
+from collections import OrderedDict
+from module.mod_pool import get_pool
+from module.mod_catalog import get_catalog
+from module.mod_lookup import MenuCodeLookup, SEARCH_COLUMNS
+
+CODE_INDEX = SEARCH_COLUMNS.index("菜牌編號")
+RESTAURANT_INDEX = SEARCH_COLUMNS.index("餐廳名稱")
+MENU_NAME_INDEX = SEARCH_COLUMNS.index("餐點名稱")
+
+# 程序內快取的登記表筆數
+REGISTRY_CACHE_SIZE = 100_000
+
+# 每次查詢登記表的名稱數量
+REGISTRY_LOOKUP_CHUNK_SIZE = 500
+
+# 回填與上傳時每頁讀取的資料筆數
+REGISTER_PAGE_SIZE = 5000
+
+# 名稱已有登記時保留原本的編號
+REGISTER_SQL = """
+INSERT IGNORE INTO code_registry (餐廳名稱, 餐點名稱, 餐廳編號, 餐點編號, 菜牌編號)
+VALUES (%s, %s, %s, %s, %s)
+"""
+
+def build_registry_lookup_sql(source_count):
+    """依 (餐廳名稱, 餐點名稱) 主鍵批次查詢登記表"""
+    placeholders = ','.join(['(%s, %s)'] * source_count)
+    return f"""
+    SELECT 餐廳名稱, 餐點名稱, 餐廳編號, 餐點編號, 菜牌編號
+    FROM code_registry
+    WHERE (餐廳名稱, 餐點名稱) IN ({placeholders})
+    """
+
+def register_codes(cursor, table_name, make_key, after_id=0, page_size=REGISTER_PAGE_SIZE):
+    """
+    將資料表中序號大於 after_id 的編號寫入登記表，make_key(餐廳名稱, 餐點名稱) 為登記表的鍵（code_key），
+    同一個鍵以序號最小（最早建檔）的編號為準
+    after_id 為 0 時處理整個資料表（用於回填），返回新登記的名稱數
+    """
+    select_sql = f"""
+    SELECT 序號, 餐廳名稱, 餐點名稱, 餐廳編號, 餐點編號, 菜牌編號
+    FROM {table_name}
+    WHERE 序號 > %s
+    AND 菜牌編號 != ''
+    ORDER BY 序號
+    LIMIT %s
+    """
+    registered = 0
+    last_id = after_id
+    while True:
+        cursor.execute(select_sql, (last_id, page_size))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+
+        entries = {}
+        for _, restaurant_name, menu_name, restaurant_code, menu_code, code in rows:
+            entries.setdefault(make_key(restaurant_name, menu_name), (restaurant_code, menu_code, code))
+        registered += cursor.executemany(REGISTER_SQL, [key + codes for key, codes in entries.items()])
+
+        if len(rows) < page_size:
+            break
+        last_id = rows[-1][0]
+    return registered
+
+def refresh_registered_codes(cursor, table_names, make_key, deleted_rows):
+    """
+    刪除資料後重新登記：deleted_rows 為被刪除資料的 (餐廳名稱, 餐點名稱, 菜牌編號)
+    先刪除編號來自這些資料的登記，再依 table_names 的順序由剩下同名的資料重新登記（同一個鍵以最早的為準）；
+    已沒有資料的名稱不再登記，下次使用時重新計算編號
+    返回重新登記的名稱數
+    """
+    deleted = {
+        make_key(restaurant_name, menu_name) + (code,)
+        for restaurant_name, menu_name, code in deleted_rows
+    }
+    if not deleted:
+        return 0
+    cursor.execute(
+        f"DELETE FROM code_registry WHERE (餐廳名稱, 餐點名稱, 菜牌編號) IN ({','.join(['(%s, %s, %s)'] * len(deleted))})",
+        [value for entry in deleted for value in entry]
+    )
+
+    keys = {entry[:2] for entry in deleted}
+    names = list({(restaurant_name, menu_name) for restaurant_name, menu_name, _ in deleted_rows})
+    placeholders = ','.join(['(%s, %s)'] * len(names))
+    params = [value for name in names for value in name]
+    entries = {}
+    for table_name in table_names:
+        cursor.execute(f"""
+        SELECT 餐廳名稱, 餐點名稱, 餐廳編號, 餐點編號, 菜牌編號
+        FROM {table_name}
+        WHERE (餐廳名稱, 餐點名稱) IN ({placeholders})
+        AND 菜牌編號 != ''
+        ORDER BY 序號
+        """, params)
+        for restaurant_name, menu_name, restaurant_code, menu_code, code in cursor.fetchall():
+            key = make_key(restaurant_name, menu_name)
+            if key in keys:
+                entries.setdefault(key, (restaurant_code, menu_code, code))
+    if not entries:
+        return 0
+    return cursor.executemany(REGISTER_SQL, [key + codes for key, codes in entries.items()])
+
+class RegistryCache:
+    """
+    登記表的程序內快取（LRU），跨請求與執行緒共用，只快取查到的名稱
+    登記只在刪除重複資料時變更（refresh_registered_codes），之後需呼叫 clear()
+    """
+    def __init__(self, maxsize=REGISTRY_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        """返回快取中有的 {名稱: (餐廳編號, 餐點編號, 菜牌編號)}"""
+        found = {}
+        with self._lock:
+            for key in keys:
+                codes = self._entries.get(key)
+                if codes is not None:
+                    self._entries.move_to_end(key)
+                    found[key] = codes
+        return found
+
+    def put_many(self, entries):
+        with self._lock:
+            for key, codes in entries.items():
+                self._entries[key] = codes
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+_registry_cache = RegistryCache()
+
+def get_registry_cache():
+    """取得程序內共用的登記表快取"""
+    return _registry_cache
+
+class CodeRegistry:
+    """
+    菜牌編號 -> {(正規化餐廳名稱, 正規化餐點名稱)}
+    normalize(餐廳名稱, 餐點名稱) 將資料庫中的名稱轉為與產生編號時相同的來源格式
+    """
+    def __init__(self, normalize, use_database=True):
+        self.normalize = normalize
+        self.use_database = use_database
+        self.owners = {}
+        # 已向資料庫查詢過的編號
+        self.loaded = set()
+
+    def load(self, codes):
+        """向資料庫批次查詢尚未查過的編號，將已存在的編號與來源加入索引"""
+        codes = [code for code in dict.fromkeys(codes) if code not in self.loaded]
+        if not codes or not self.use_database:
+            return
+
+        try:
+            for row in MenuCodeLookup(codes).rows():
+                source = self.normalize(row[RESTAURANT_INDEX] or '', row[MENU_NAME_INDEX] or '')
+                self.register(row[CODE_INDEX], source)
+        except Exception as e:
+            # 無法連線資料庫時只檢查本批資料內的衝突
+            print(f"無法查詢資料庫中的菜牌編號，只檢查本批資料：{str(e)}")
+            self.use_database = False
+            return
+        self.loaded.update(codes)
+
+    def registered(self, keys):
+        """
+        查詢名稱（code_key）已登記的編號，先查程序內快取，沒有的再向 code_registry 批次查詢
+        返回 {名稱: (餐廳編號, 餐點編號, 菜牌編號)}
+        """
+        keys = list(dict.fromkeys(keys))
+        cache = get_registry_cache()
+        found = cache.get_many(keys)
+        missing = [key for key in keys if key not in found]
+        if not missing or not self.use_database:
+            return found
+
+        fetched = {}
+        try:
+            if not get_catalog().table_exists('code_registry'):
+                return found
+            with get_pool().connection() as connection:
+                with connection.cursor() as cursor:
+                    for i in range(0, len(missing), REGISTRY_LOOKUP_CHUNK_SIZE):
+                        chunk = missing[i:i + REGISTRY_LOOKUP_CHUNK_SIZE]
+                        cursor.execute(build_registry_lookup_sql(len(chunk)),
+                                       [name for key in chunk for name in key])
+                        for restaurant, menu, restaurant_code, menu_code, code in cursor.fetchall():
+                            fetched[(restaurant, menu)] = (restaurant_code, menu_code, code)
+        except Exception as e:
+            print(f"無法查詢菜牌編號登記表，所有編號重新計算：{str(e)}")
+            self.use_database = False
+            return found
+
+        cache.put_many(fetched)
+        found.update(fetched)
+        return found
+
+    def is_free(self, code, source):
+        """編號尚未被使用，或只被同一來源使用"""
+        owners = self.owners.get(code)
+        return not owners or source in owners
+
+    def owner(self, code):
+        """使用該編號的來源（多個時取排序後的第一個）"""
+        owners = self.owners.get(code)
+        return min(owners) if owners else None
+
+    def register(self, code, source):
+        """記錄來源使用該編號"""
+        self.owners.setdefault(code, set()).add(source)
@@ -0,0 +1,84 @@
+"""
+CSV 讀取共用元件
+先由 BOM 與檔案開頭的有限位元組判斷編碼，再只解析一次；
+只有樣本之後的內容無法以該編碼解碼時，才改用下一個候選編碼
+"""
+import codecs
+import io
+import pandas as pd
+
+# 依序嘗試的編碼（big5 在 cp950 之前，與舊版讀取順序相同）
+CANDIDATE_ENCODINGS = ['utf-8', 'big5', 'cp950', 'gbk']
+
+# 判斷編碼時讀取的位元組數
+SAMPLE_SIZE = 64 * 1024
+
+BOM_ENCODINGS = [
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+def _read_bytes(source, size=-1):
+    """讀取檔案路徑或 bytes 的內容，size 為 -1 時讀取全部"""
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source) if size < 0 else bytes(source[:size])
+    with open(source, 'rb') as f:
+        return f.read(size)
+
+def detect_encoding(source, sample_size=SAMPLE_SIZE):
+    """
+    判斷檔案路徑或 bytes 的編碼
+    有 BOM 時直接採用，否則以漸進式解碼器逐一嘗試候選編碼解碼樣本
+    無法判斷時返回 None
+    """
+    sample = _read_bytes(source, sample_size)
+    for bom, encoding in BOM_ENCODINGS:
+        if sample.startswith(bom):
+            return encoding
+
+    # 樣本可能在多位元組字元中間截斷，未讀完整個檔案時不要求最後一個字元完整
+    complete = len(sample) < sample_size
+    for encoding in CANDIDATE_ENCODINGS:
+        decoder = codecs.getincrementaldecoder(encoding)()
+        try:
+            decoder.decode(sample, final=complete)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return None
+
+def _fallback_encodings(encoding):
+    """偵測到的編碼排第一，其餘候選編碼依序排在後面"""
+    if encoding is None:
+        return list(CANDIDATE_ENCODINGS)
+    return [encoding] + [e for e in CANDIDATE_ENCODINGS if e != encoding.replace('-sig', '')]
+
+def read_csv_auto(source, **kwargs):
+    """
+    自動判斷編碼並讀取 CSV，source 可以是檔案路徑或 bytes
+    返回 DataFrame，所有候選編碼都無法解碼時拋出 UnicodeDecodeError
+    """
+    last_error = None
+    for encoding in _fallback_encodings(detect_encoding(source)):
+        data = io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+        try:
+            return pd.read_csv(data, encoding=encoding, **kwargs)
+        except UnicodeDecodeError as e:
+            print(f"使用 {encoding} 編碼讀取失敗，改用其他編碼: {str(e)}")
+            last_error = e
+    raise last_error
+
+def read_text_auto(source):
+    """
+    自動判斷編碼並讀取整個文字檔，source 可以是檔案路徑或 bytes
+    返回去除 BOM 的字串，所有候選編碼都無法解碼時拋出 UnicodeDecodeError
+    """
+    content = _read_bytes(source)
+    last_error = None
+    for encoding in _fallback_encodings(detect_encoding(content)):
+        try:
+            return content.decode(encoding).lstrip('\ufeff')
+        except UnicodeDecodeError as e:
+            last_error = e
+    raise last_error
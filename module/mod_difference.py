@@ -5,6 +5,7 @@ from tkinter import ttk
 from datetime import datetime
 import csv
 from .mod_sql import DatabaseUploader
+from .mod_export import QueryStream, write_tsv
 
 class MenuDifferenceCalculator:
     def __init__(self):
@@ -181,20 +182,9 @@ class DatabaseExporter:
                 FROM menu_items
                 ORDER BY 序號
                 """
-                db.cursor.execute(query)
-                results = db.cursor.fetchall()
-                
-                # 寫入文件
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    # 寫入標題列
-                    headers = ["序號", "餐廳編號", "餐廳名稱", "餐點編號", "菜牌編號", "餐點名稱", "英文名稱"]
-                    f.write('\t'.join(headers) + '\n')
-                    
-                    # 寫入資料列
-                    for row in results:
-                        # 將所有欄位轉換為字串並去除空白
-                        formatted_row = [str(item).strip() if item is not None else '' for item in row]
-                        f.write('\t'.join(formatted_row) + '\n')
+                # 以不緩衝游標逐批寫入文件
+                stream = QueryStream(db.connection, query)
+                write_tsv(file_path, stream.columns, stream)
                 
                 messagebox.showinfo("成功", f"資料已成功匯出至：\n{file_path}")
                 return True
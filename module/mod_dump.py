@@ -0,0 +1,55 @@
+"""
+下載所有菜牌資料
+涵蓋所有據點資料表，依序號分頁讀取，可輸出為CSV、gzip壓縮的CSV或Excel（每個資料表一個工作表）
+"""
+from module.mod_catalog import get_catalog
+from module.mod_export import iter_keyset_rows, iter_csv, iter_gzip, write_csv, write_xlsx
+
+# 需要下載的資料表
+DUMP_TABLES = ['med_tpr', 'med_tpx', 'med_sun', 'menu_items']
+
+# 每個資料表讀取的欄位
+TABLE_COLUMNS = ["序號", "餐廳編號", "餐廳名稱", "餐點編號", "菜牌編號", "餐點名稱", "英文名稱", "據點", "建檔日期"]
+
+# 合併為單一CSV時的欄位，第一欄為資料表名稱
+DUMP_COLUMNS = ["資料表"] + TABLE_COLUMNS
+
+# 支援的輸出格式：格式 -> (副檔名, MIME 類型)
+DUMP_FORMATS = {
+    'csv': ('csv', 'text/csv; charset=utf-8'),
+    'gz': ('csv.gz', 'application/gzip'),
+    'xlsx': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+}
+
+def iter_table_rows(connection, table_name):
+    """依序號分頁逐筆產生單一資料表的資料"""
+    return iter_keyset_rows(connection, table_name, TABLE_COLUMNS)
+
+def iter_dump_rows(connection):
+    """逐筆產生所有資料表的資料，第一欄為資料表名稱"""
+    for table_name in get_catalog().existing_tables(DUMP_TABLES):
+        for row in iter_table_rows(connection, table_name):
+            yield (table_name,) + tuple(row)
+
+def iter_dump_csv(connection):
+    """產生所有資料的CSV文字片段"""
+    return iter_csv(DUMP_COLUMNS, iter_dump_rows(connection))
+
+def iter_dump_csv_gzip(connection):
+    """產生所有資料的gzip壓縮CSV位元組片段"""
+    return iter_gzip(iter_dump_csv(connection))
+
+def write_dump_csv(connection, file_path):
+    """將所有資料寫入單一CSV檔案，返回寫入筆數"""
+    return write_csv(file_path, DUMP_COLUMNS, iter_dump_rows(connection))
+
+def write_dump_xlsx(connection, output):
+    """
+    將所有資料寫入Excel，每個資料表一個工作表，output 為檔案路徑或檔案物件
+    返回各資料表寫入的筆數
+    """
+    sheets = (
+        (table_name, TABLE_COLUMNS, iter_table_rows(connection, table_name))
+        for table_name in get_catalog().existing_tables(DUMP_TABLES)
+    )
+    return write_xlsx(output, sheets)
@@ -0,0 +1,171 @@
+"""
+重複菜牌編號檢查與刪除
+跨資料表報表以單一 UNION ALL 查詢依菜牌編號分組，一次找出表內重複、跨表重複與餐點名稱不一致；
+刪除時同一資料表內菜牌編號重複的記錄保留序號最小（最早建檔）的一筆，
+以自我連接找出要刪除的序號，每批在獨立的短交易中刪除，避免長時間鎖住整個資料表；
+同一交易內重新計算被刪除資料的首次出現記錄與編號登記，不留下指向已刪除資料的記錄
+"""
+from module.mod_catalog import get_catalog
+from module.mod_export import QueryStream
+from module.mod_first_seen import refresh_first_seen
+from module.mod_code_registry import refresh_registered_codes, get_registry_cache
+from module.mod_menu_code import code_key
+from module.mod_schema import MENU_TABLES
+
+# 需要檢查的資料表
+DUPLICATE_TABLES = ['menu_items', 'med_tpr', 'med_tpx', 'med_sun']
+
+# 每批刪除的筆數
+DELETE_BATCH_SIZE = 1000
+
+# 跨資料表重複報表的欄位
+DUPLICATE_REPORT_COLUMNS = ["菜牌編號", "總筆數", "資料表數", "資料表", "表內重複", "跨表重複",
+                            "名稱不一致", "餐點名稱"]
+
+def build_duplicate_report_sql(tables):
+    """
+    跨資料表重複報表：所有資料表的菜牌編號合併後分組，只返回出現超過一次的編號
+    表內重複：筆數多於出現的資料表數；跨表重複：出現在兩個以上的資料表；名稱不一致：餐點名稱不只一種
+    """
+    selects = [
+        f"""
+        SELECT '{table}' AS 資料表, 菜牌編號, 餐點名稱
+        FROM {table}
+        WHERE 菜牌編號 != ''
+        """
+        for table in tables
+    ]
+    return f"""
+    SELECT 菜牌編號,
+           COUNT(*) AS 總筆數,
+           COUNT(DISTINCT 資料表) AS 資料表數,
+           GROUP_CONCAT(DISTINCT 資料表 ORDER BY 資料表 SEPARATOR ', ') AS 資料表,
+           IF(COUNT(*) > COUNT(DISTINCT 資料表), '是', '') AS 表內重複,
+           IF(COUNT(DISTINCT 資料表) > 1, '是', '') AS 跨表重複,
+           IF(COUNT(DISTINCT 餐點名稱) > 1, '是', '') AS 名稱不一致,
+           GROUP_CONCAT(DISTINCT 餐點名稱 ORDER BY 餐點名稱 SEPARATOR ' / ') AS 餐點名稱
+    FROM ({"UNION ALL".join(selects)}) all_codes
+    GROUP BY 菜牌編號
+    HAVING COUNT(*) > 1
+    ORDER BY 菜牌編號
+    """
+
+def iter_duplicate_report(connection):
+    """逐筆產生跨資料表重複報表（欄位同 DUPLICATE_REPORT_COLUMNS）"""
+    tables = get_catalog().existing_tables(DUPLICATE_TABLES)
+    if not tables:
+        return
+    with QueryStream(connection, build_duplicate_report_sql(tables)) as stream:
+        yield from stream
+
+def build_duplicate_preview_sql(tables):
+    """各資料表重複的菜牌編號數與將被刪除的筆數，以單一 UNION ALL 查詢取得"""
+    selects = [
+        f"""
+        SELECT '{table}' AS 資料表, COUNT(*) AS 重複編號數, COALESCE(SUM(筆數 - 1), 0) AS 待刪除筆數
+        FROM (
+            SELECT 菜牌編號, COUNT(*) AS 筆數
+            FROM {table}
+            GROUP BY 菜牌編號
+            HAVING COUNT(*) > 1
+        ) duplicates
+        """
+        for table in tables
+    ]
+    return "UNION ALL".join(selects)
+
+def build_duplicate_batch_sql(table_name):
+    """
+    取得一批要刪除的資料：同一菜牌編號存在序號更小的記錄
+    返回 (序號, 菜牌編號, 餐廳名稱, 據點, 餐點名稱)，後四欄用於重新計算首次出現記錄與編號登記
+    注意：只有 uq_menu_code 尚未建立時才會有重複，此時 菜牌編號 沒有可用的索引，
+    自我連接由 MySQL 8.0.18 以上的 hash join 執行，每批各完整掃描資料表一次
+    """
+    return f"""
+    SELECT DISTINCT d.序號, d.菜牌編號, d.餐廳名稱, d.據點, d.餐點名稱
+    FROM {table_name} d
+    JOIN {table_name} k
+      ON k.菜牌編號 = d.菜牌編號
+     AND k.序號 < d.序號
+    ORDER BY d.序號
+    LIMIT %s
+    """
+
+def preview_duplicates(connection):
+    """
+    預覽（不刪除任何資料）
+    返回 {資料表: {'codes': 重複的菜牌編號數, 'rows': 將被刪除的筆數}}
+    """
+    tables = get_catalog().existing_tables(DUPLICATE_TABLES)
+    if not tables:
+        return {}
+
+    with connection.cursor() as cursor:
+        cursor.execute(build_duplicate_preview_sql(tables))
+        return {
+            table: {'codes': int(codes), 'rows': int(rows)}
+            for table, codes, rows in cursor.fetchall()
+        }
+
+def iter_remove_duplicates(connection, batch_size=DELETE_BATCH_SIZE):
+    """
+    分批刪除所有資料表中重複的菜牌編號，每批提交一次
+    每刪除一批產生一次進度：{'table', 'deleted', 'total'}
+    menu_first_seen、restaurant_first_seen 與 code_registry 存在時，在同一交易內重新計算被刪除資料的記錄
+    """
+    preview = preview_duplicates(connection)
+    catalog = get_catalog()
+    refresh_first_seen_tables = catalog.table_exists('menu_first_seen') and catalog.table_exists('restaurant_first_seen')
+    # 依回填登記表時的資料表順序重新登記
+    registry_tables = catalog.existing_tables(MENU_TABLES) if catalog.table_exists('code_registry') else []
+    with connection.cursor() as cursor:
+        for table_name, counts in preview.items():
+            if not counts['rows']:
+                continue
+
+            deleted = 0
+            batch_sql = build_duplicate_batch_sql(table_name)
+            while True:
+                cursor.execute(batch_sql, (batch_size,))
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                ids = [row[0] for row in rows]
+
+                try:
+                    connection.begin()
+                    deleted += cursor.execute(
+                        f"DELETE FROM {table_name} WHERE 序號 IN ({','.join(['%s'] * len(ids))})",
+                        ids
+                    )
+                    if refresh_first_seen_tables:
+                        refresh_first_seen(
+                            cursor, table_name,
+                            {row[1] for row in rows if row[1]},
+                            {(row[2], row[3]) for row in rows if row[2] and row[3]}
+                        )
+                    if registry_tables:
+                        refresh_registered_codes(
+                            cursor, registry_tables, code_key,
+                            [(row[2], row[4], row[1]) for row in rows if row[1]]
+                        )
+                    connection.commit()
+                except Exception:
+                    connection.rollback()
+                    raise
+                if registry_tables:
+                    get_registry_cache().clear()
+
+                yield {'table': table_name, 'deleted': deleted, 'total': counts['rows']}
+
+def remove_duplicates(connection, batch_size=DELETE_BATCH_SIZE, progress=print):
+    """
+    刪除所有資料表中重複的菜牌編號，progress 接收每批的進度文字
+    返回 {資料表: 刪除筆數}
+    """
+    deleted = {}
+    for step in iter_remove_duplicates(connection, batch_size):
+        deleted[step['table']] = step['deleted']
+        if progress:
+            progress(f"{step['table']}: 已刪除 {step['deleted']} / {step['total']} 筆")
+    return deleted
@@ -0,0 +1,147 @@
+"""
+菜單英文名稱批量更新
+CSV 資料先整批寫入暫存資料表，再對每個據點資料表執行一次 UPDATE ... JOIN，
+比對、更新與找不到的筆數都在同一個交易內由伺服器計算
+"""
+import time
+
+# 可以更新英文名稱的資料表
+ENGLISH_TABLES = ['med_sun', 'med_tpr', 'med_tpx']
+
+STAGING_TABLE = 'tmp_english_names'
+
+STAGING_TABLE_SQL = f"""
+CREATE TEMPORARY TABLE {STAGING_TABLE} (
+    資料表 VARCHAR(20) NOT NULL,
+    菜牌編號 VARCHAR(20) NOT NULL,
+    英文名稱 VARCHAR(100) NOT NULL,
+    PRIMARY KEY (資料表, 菜牌編號)
+) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci
+"""
+
+def dedupe_english_rows(df):
+    """
+    處理重複的 (菜牌編號, 資料表)，保留第一筆有英文名稱的記錄，都沒有時保留第一筆
+    英文名稱需已將 NaN 轉為空字串
+    以一次穩定排序加 drop_duplicates 完成，返回 (去重後的DataFrame, 移除筆數)
+    """
+    ordered = df.assign(_has_name=df['英文名稱'].str.len() > 0)
+    ordered = ordered.sort_values('_has_name', ascending=False, kind='stable')
+    deduped = (
+        ordered.drop_duplicates(subset=['菜牌編號', '資料表'], keep='first')
+        .drop(columns='_has_name')
+        .sort_index()
+    )
+    return deduped, len(df) - len(deduped)
+
+def update_english_names(connection, df):
+    """
+    將 DataFrame（菜牌編號、英文名稱、資料表）的英文名稱更新至資料庫
+    英文名稱為空或資料表名稱無效的資料不會寫入
+    返回各資料表的統計：{資料表: {'total', 'matched', 'updated', 'not_found', 'empty'}}
+    """
+    valid_df = df[df['資料表'].isin(ENGLISH_TABLES)]
+    staged_df = valid_df[valid_df['英文名稱'] != '']
+
+    stats = {}
+    for table_name, group_df in valid_df.groupby('資料表'):
+        stats[table_name] = {
+            'total': len(group_df),
+            'matched': 0,
+            'updated': 0,
+            'not_found': 0,
+            'empty': int((group_df['英文名稱'] == '').sum())
+        }
+
+    if staged_df.empty:
+        return stats
+
+    rows = list(zip(
+        staged_df['資料表'].astype(str),
+        staged_df['菜牌編號'].astype(str).str.strip(),
+        staged_df['英文名稱'].astype(str)
+    ))
+
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS {STAGING_TABLE}")
+        cursor.execute(STAGING_TABLE_SQL)
+        cursor.executemany(f"""
+        INSERT INTO {STAGING_TABLE} (資料表, 菜牌編號, 英文名稱)
+        VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE 英文名稱 = VALUES(英文名稱)
+        """, rows)
+
+        for table_name in stats:
+            # 暫存筆數與其中可以在資料表找到的菜牌編號數
+            cursor.execute(f"""
+            SELECT COUNT(*),
+                   COALESCE(SUM(EXISTS (SELECT 1 FROM {table_name} t WHERE t.菜牌編號 = s.菜牌編號)), 0)
+            FROM {STAGING_TABLE} s
+            WHERE s.資料表 = %s
+            """, (table_name,))
+            staged_count, matched = cursor.fetchone()
+            if staged_count == 0:
+                continue
+
+            updated = cursor.execute(f"""
+            UPDATE {table_name} t
+            JOIN {STAGING_TABLE} s
+              ON s.菜牌編號 = t.菜牌編號
+             AND s.資料表 = %s
+            SET t.英文名稱 = s.英文名稱
+            """, (table_name,))
+
+            stats[table_name]['matched'] = int(matched)
+            stats[table_name]['updated'] = updated
+            stats[table_name]['not_found'] = int(staged_count - matched)
+
+        connection.commit()
+        return stats
+
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS {STAGING_TABLE}")
+        cursor.close()
+
+def benchmark_dedupe(row_count=100_000, duplicate_ratio=0.3, repeat=3):
+    """
+    以模擬的翻譯檔比較逐組迴圈與向量化去重的耗時
+    """
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(0)
+    unique_count = max(int(row_count * (1 - duplicate_ratio)), 1)
+    codes = rng.integers(0, unique_count, row_count)
+    df = pd.DataFrame({
+        '菜牌編號': [f"BENCH-{code:08d}" for code in codes],
+        '資料表': rng.choice(ENGLISH_TABLES, row_count),
+        '英文名稱': np.where(rng.random(row_count) < 0.5, 'Dish name', '')
+    })
+
+    def dedupe_by_group(df):
+        # 原本的逐組迴圈做法，僅供比較
+        rows = []
+        for _, group in df.groupby(['菜牌編號', '資料表']):
+            if len(group) > 1:
+                group = group.sort_values(by='英文名稱', key=lambda x: x.str.len() > 0, ascending=False)
+            rows.append(group.iloc[0])
+        return pd.DataFrame(rows)
+
+    results = {}
+    for name, func in [('groupby 迴圈', dedupe_by_group), ('向量化', lambda d: dedupe_english_rows(d)[0])]:
+        timings = []
+        for _ in range(repeat):
+            start_time = time.perf_counter()
+            output = func(df)
+            timings.append(time.perf_counter() - start_time)
+        results[name] = (min(timings), len(output))
+        print(f"{name}: {row_count} 筆 → {len(output)} 筆，最佳耗時 {min(timings):.3f} 秒")
+    return results
+
+if __name__ == "__main__":
+    # python -m module.mod_english 執行去重效能測試
+    benchmark_dedupe()
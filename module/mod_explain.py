@@ -0,0 +1,141 @@
+"""
+查詢計畫檢查
+對各模組實際使用的查詢執行 EXPLAIN，列出每個查詢使用的索引，並標示全表掃描（type = ALL）
+用法：python -m module.mod_explain [--strict]
+--strict 時只要有全表掃描就以非零狀態結束，可用於部署前檢查
+"""
+import sys
+from datetime import datetime, timedelta
+from module.mod_pool import get_pool
+from module.mod_catalog import get_catalog
+from module.mod_lookup import SEARCH_TABLES, build_lookup_sql
+from module.mod3_no_english import NO_ENGLISH_TABLES, build_no_english_sql
+from module.mod4_new_menu_restaurant import MenuRestaurantExporter
+from module.mod_first_seen import MENU_FIRST_SEEN_SQL, RESTAURANT_FIRST_SEEN_SQL, NEW_ROWS_CONDITION
+from module.mod_duplicates import (DUPLICATE_TABLES, build_duplicate_report_sql, build_duplicate_preview_sql,
+                                  build_duplicate_batch_sql)
+from module.mod_dump import DUMP_TABLES, TABLE_COLUMNS
+from module.mod_code_registry import build_registry_lookup_sql
+
+# EXPLAIN 使用的範例參數，只影響查詢計畫，不會實際執行查詢
+SAMPLE_MENU_CODES = ['TPR00001AB', 'SUN00002CD', 'TPX00003EF']
+SAMPLE_DAYS = 30
+SAMPLE_MAX_ID = 2 ** 31 - 1
+
+def collect_queries():
+    """
+    收集各模組的查詢，返回 [(名稱, SQL, 參數)]
+    只包含目前資料庫中存在的資料表
+    """
+    catalog = get_catalog()
+    end_date = datetime.now()
+    start_date = end_date - timedelta(days=SAMPLE_DAYS)
+    start_date_str = start_date.strftime('%Y-%m-%d')
+    end_date_str = end_date.strftime('%Y-%m-%d')
+
+    queries = []
+
+    # 菜牌編號批次查詢（mod_lookup）
+    tables = catalog.existing_tables(SEARCH_TABLES)
+    if tables:
+        codes = list(SAMPLE_MENU_CODES)
+        queries.append(("菜牌編號查詢", build_lookup_sql(tables, len(codes)), codes * len(tables)))
+
+    # 無英文菜單匯出（mod3_no_english），分別檢查完整匯出與增量匯出
+    tables = catalog.existing_tables(NO_ENGLISH_TABLES)
+    if tables:
+        full_ranges = {table: (0, SAMPLE_MAX_ID, None) for table in tables}
+        queries.append(("無英文菜單（完整）", *build_no_english_sql(full_ranges)))
+        delta_ranges = {table: (SAMPLE_MAX_ID - 1000, SAMPLE_MAX_ID, None) for table in tables}
+        queries.append(("無英文菜單（增量）", *build_no_english_sql(delta_ranges)))
+
+    # 新菜牌與新餐廳（mod4_new_menu_restaurant）
+    exporter = MenuRestaurantExporter()
+    for table_name in catalog.existing_tables(exporter.tables):
+        queries.append((f"新菜牌 {table_name}",
+                        *exporter.new_menus_query(table_name, start_date_str, end_date_str)))
+        queries.append((f"新餐廳 {table_name}",
+                        *exporter.new_restaurants_query(table_name, start_date_str, end_date_str)))
+
+    # 上傳後更新首次出現記錄（mod_first_seen），只處理新寫入的序號範圍
+    for table_name in catalog.existing_tables(SEARCH_TABLES):
+        queries.append((f"首次出現菜牌 {table_name}",
+                        MENU_FIRST_SEEN_SQL.format(table_name=table_name, condition=NEW_ROWS_CONDITION),
+                        (table_name, SAMPLE_MAX_ID - 1000)))
+        queries.append((f"首次出現餐廳 {table_name}",
+                        RESTAURANT_FIRST_SEEN_SQL.format(table_name=table_name, condition=NEW_ROWS_CONDITION),
+                        (table_name, SAMPLE_MAX_ID - 1000)))
+
+    # 重複菜牌編號預覽與分批刪除（mod_duplicates）
+    tables = catalog.existing_tables(DUPLICATE_TABLES)
+    if tables:
+        queries.append(("跨表重複報表", build_duplicate_report_sql(tables), None))
+        queries.append(("重複菜牌預覽", build_duplicate_preview_sql(tables), None))
+    for table_name in tables:
+        queries.append((f"重複菜牌刪除批次 {table_name}", build_duplicate_batch_sql(table_name), (1000,)))
+
+    # 下載所有菜牌（mod_dump），依序號分頁讀取
+    for table_name in catalog.existing_tables(DUMP_TABLES):
+        queries.append((f"下載所有菜牌 {table_name}",
+                        f"SELECT {', '.join(TABLE_COLUMNS)} FROM {table_name} WHERE 序號 > %s ORDER BY 序號 LIMIT %s",
+                        (SAMPLE_MAX_ID - 1000, 5000)))
+
+    # 菜牌編號登記表查詢（mod_code_registry）
+    if catalog.table_exists('code_registry'):
+        queries.append(("菜牌編號登記表查詢", build_registry_lookup_sql(2), ['好吃店', '牛肉麵', 'ABC', 'Salad']))
+
+    return queries
+
+def explain_query(cursor, sql, params=None):
+    """執行 EXPLAIN，返回查詢計畫的每一列（欄位名稱 -> 值）"""
+    cursor.execute("EXPLAIN " + sql, params)
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+def is_full_scan(plan_row):
+    """
+    實體資料表的全表掃描
+    衍生表（<derived2>、<union1,2> 等）的掃描與 INSERT 的寫入目標不算
+    """
+    table = plan_row.get('table') or ''
+    return (plan_row.get('type') == 'ALL'
+            and plan_row.get('select_type') != 'INSERT'
+            and not table.startswith('<'))
+
+def run_explain():
+    """
+    對所有查詢執行 EXPLAIN 並輸出結果
+    返回有全表掃描的 [(查詢名稱, 資料表)]
+    """
+    full_scans = []
+    with get_pool().connection() as connection:
+        with connection.cursor() as cursor:
+            for name, sql, params in collect_queries():
+                print(f"\n== {name}")
+                try:
+                    plan = explain_query(cursor, sql, params)
+                except Exception as e:
+                    print(f"   無法執行 EXPLAIN：{str(e)}")
+                    continue
+
+                for row in plan:
+                    flag = "全表掃描" if is_full_scan(row) else ""
+                    print(f"   {row.get('table') or '-':<28} type={row.get('type') or '-':<8} "
+                          f"key={row.get('key') or '-':<30} rows={row.get('rows') or 0:<10} "
+                          f"{row.get('Extra') or ''} {flag}".rstrip())
+                    if flag:
+                        full_scans.append((name, row.get('table')))
+
+    print()
+    if full_scans:
+        print(f"共 {len(full_scans)} 處全表掃描：")
+        for name, table in full_scans:
+            print(f"  {name}：{table}")
+    else:
+        print("所有查詢都有使用索引")
+    return full_scans
+
+if __name__ == "__main__":
+    scans = run_explain()
+    if scans and '--strict' in sys.argv[1:]:
+        sys.exit(1)
@@ -0,0 +1,225 @@
+"""
+串流匯出共用元件
+查詢以不緩衝的 SSCursor 執行並以 fetchmany 逐批讀取，
+CSV、TSV、XLSX 都是邊讀邊寫，記憶體用量與資料表大小無關
+"""
+import csv
+import io
+import itertools
+import zlib
+import pymysql.cursors
+from openpyxl import Workbook
+
+# 每次向伺服器取得的資料筆數
+FETCH_SIZE = 1000
+
+# 串流下載時每累積多少筆資料送出一次
+STREAM_BATCH_ROWS = 500
+
+# 依主鍵分頁讀取時每頁的筆數
+KEYSET_PAGE_SIZE = 5000
+
+class QueryStream:
+    """
+    以不緩衝游標執行查詢
+    columns 為查詢結果的欄位名稱，迭代時逐批取得資料列，讀完或關閉時釋放游標
+    讀取完畢前同一連線不能執行其他查詢
+    """
+    def __init__(self, connection, sql, params=None, fetch_size=FETCH_SIZE):
+        self.fetch_size = fetch_size
+        self.cursor = connection.cursor(pymysql.cursors.SSCursor)
+        try:
+            self.cursor.execute(sql, params)
+        except Exception:
+            self.close()
+            raise
+        self.columns = [column[0] for column in self.cursor.description or []]
+
+    def __iter__(self):
+        try:
+            while self.cursor is not None:
+                rows = self.cursor.fetchmany(self.fetch_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            self.close()
+
+    def close(self):
+        """關閉游標，未讀完的資料會被丟棄"""
+        if self.cursor is not None:
+            self.cursor.close()
+            self.cursor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class ClosingStream:
+    """
+    串流下載的內容：迭代時產生 chunks 的片段，close() 時關閉 chunks 並執行 on_close（例如歸還連線）
+    回應結束時（送完、HEAD 請求、用戶中途斷線）由 response.call_on_close 呼叫 close()，
+    即使 chunks 從未開始迭代，借用的資源也會釋放；重複呼叫 close() 只執行一次
+    """
+    def __init__(self, chunks, on_close=None):
+        self.chunks = chunks
+        self.on_close = on_close
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self.chunks)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            if hasattr(self.chunks, 'close'):
+                self.chunks.close()
+        finally:
+            if self.on_close:
+                self.on_close()
+
+def stream_query(pool, produce, render, on_empty=None):
+    """
+    向連線池借用連線串流查詢結果，所有串流下載共用同一套借用與歸還流程
+    produce(connection) 返回逐筆資料的產生器，先讀取第一筆確認有資料：
+    沒有資料時執行 on_empty(connection)、關閉產生器並歸還連線，返回 None；
+    否則返回 ClosingStream，內容為 render(connection, rows) 產生的片段（rows 含第一筆），
+    close() 時先關閉產生器（丟棄未讀完的資料）再歸還連線
+    呼叫端需在回應結束時呼叫 ClosingStream.close()（response.call_on_close）
+    """
+    connection = pool.acquire()
+    rows = None
+
+    def close():
+        try:
+            if rows is not None:
+                rows.close()
+        finally:
+            pool.release(connection)
+
+    try:
+        rows = produce(connection)
+        first_row = next(rows, None)
+        if first_row is None and on_empty:
+            on_empty(connection)
+    except Exception:
+        close()
+        raise
+
+    if first_row is None:
+        close()
+        return None
+
+    return ClosingStream(render(connection, itertools.chain([first_row], rows)), close)
+
+def iter_keyset_rows(connection, table_name, columns, key='序號', page_size=KEYSET_PAGE_SIZE):
+    """
+    依主鍵分頁讀取整個資料表：每頁以 key > 上一頁最後一筆 的條件查詢，
+    每次只是一個走主鍵索引的短查詢，不需長時間占用游標或連線上的結果集
+    key 必須在 columns 之中
+    """
+    key_index = columns.index(key)
+    query = f"""
+    SELECT {', '.join(columns)}
+    FROM {table_name}
+    WHERE {key} > %s
+    ORDER BY {key}
+    LIMIT %s
+    """
+    last_key = 0
+    while True:
+        with connection.cursor() as cursor:
+            cursor.execute(query, (last_key, page_size))
+            rows = cursor.fetchall()
+        if not rows:
+            break
+        yield from rows
+        if len(rows) < page_size:
+            break
+        last_key = rows[-1][key_index]
+
+def write_csv(file_path, columns, rows, encoding='utf-8-sig'):
+    """逐筆寫入CSV檔案，返回寫入的資料筆數"""
+    count = 0
+    with open(file_path, 'w', newline='', encoding=encoding) as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+def write_tsv(file_path, columns, rows, encoding='utf-8'):
+    """逐筆寫入以 Tab 分隔的文字檔，欄位轉為字串並去除空白，返回寫入的資料筆數"""
+    count = 0
+    with open(file_path, 'w', encoding=encoding) as f:
+        f.write('\t'.join(columns) + '\n')
+        for row in rows:
+            formatted_row = [str(item).strip() if item is not None else '' for item in row]
+            f.write('\t'.join(formatted_row) + '\n')
+            count += 1
+    return count
+
+def write_xlsx(file_path, sheets):
+    """
+    以 write-only 模式逐列寫入Excel，sheets 為 (工作表名稱, 欄位, 資料列) 的序列
+    返回各工作表寫入的資料筆數
+    """
+    workbook = Workbook(write_only=True)
+    counts = {}
+    try:
+        for sheet_name, columns, rows in sheets:
+            sheet = workbook.create_sheet(title=sheet_name)
+            sheet.append(list(columns))
+            count = 0
+            for row in rows:
+                sheet.append(list(row))
+                count += 1
+            counts[sheet_name] = count
+        if not counts:
+            # 活頁簿至少需要一個工作表
+            workbook.create_sheet()
+        workbook.save(file_path)
+    finally:
+        workbook.close()
+    return counts
+
+def iter_csv(columns, rows, batch_rows=STREAM_BATCH_ROWS):
+    """
+    產生CSV文字片段（含BOM），供 Flask Response 串流下載
+    每累積 batch_rows 筆資料送出一次
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    # BOM 讓 Excel 正確辨識 UTF-8
+    buffer.write('\ufeff')
+    writer.writerow(columns)
+    pending = 0
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= batch_rows:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+            pending = 0
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def iter_gzip(chunks, encoding='utf-8'):
+    """將文字片段即時壓縮為 gzip 格式的位元組片段"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode(encoding))
+        if data:
+            yield data
+    yield compressor.flush()
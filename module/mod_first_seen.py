@@ -0,0 +1,82 @@
+"""
+菜牌與餐廳首次出現記錄
+menu_first_seen 記錄每個資料表中每個菜牌編號最早的建檔日期與序號，
+restaurant_first_seen 記錄每個 (餐廳名稱, 據點) 最早的建檔日期與序號，
+上傳時於同一交易內更新，新菜牌與新餐廳匯出只需依日期範圍查詢這兩個資料表；
+刪除重複資料時重新計算受影響的記錄，避免記錄指向已刪除的序號
+"""
+
+# 上傳後只處理序號大於指定值的新資料
+NEW_ROWS_CONDITION = "src.序號 > %s"
+
+# 將符合 condition 的資料寫入首次出現記錄；已有記錄時保留建檔日期較早（同日期時序號較小）的一筆
+# 注意：ON DUPLICATE KEY UPDATE 依序套用，序號必須在建檔日期之前更新；
+# 來源資料表也有同名欄位，目標欄位需加上資料表名稱
+MENU_FIRST_SEEN_SQL = """
+INSERT INTO menu_first_seen (資料表, 菜牌編號, 建檔日期, 序號)
+SELECT %s, src.菜牌編號, src.建檔日期, src.序號
+FROM {table_name} src
+WHERE {condition}
+AND src.菜牌編號 != ''
+ORDER BY src.建檔日期, src.序號
+ON DUPLICATE KEY UPDATE
+    menu_first_seen.序號 = IF(VALUES(建檔日期) < menu_first_seen.建檔日期, VALUES(序號), menu_first_seen.序號),
+    menu_first_seen.建檔日期 = LEAST(menu_first_seen.建檔日期, VALUES(建檔日期))
+"""
+
+RESTAURANT_FIRST_SEEN_SQL = """
+INSERT INTO restaurant_first_seen (資料表, 餐廳名稱, 據點, 建檔日期, 序號)
+SELECT %s, src.餐廳名稱, src.據點, src.建檔日期, src.序號
+FROM {table_name} src
+WHERE {condition}
+AND src.餐廳名稱 != ''
+AND src.據點 != ''
+ORDER BY src.建檔日期, src.序號
+ON DUPLICATE KEY UPDATE
+    restaurant_first_seen.序號 = IF(VALUES(建檔日期) < restaurant_first_seen.建檔日期, VALUES(序號), restaurant_first_seen.序號),
+    restaurant_first_seen.建檔日期 = LEAST(restaurant_first_seen.建檔日期, VALUES(建檔日期))
+"""
+
+def get_max_id(cursor, table_name):
+    """資料表目前最大的序號，寫入新資料前取得，之後只需處理序號更大的資料"""
+    cursor.execute(f"SELECT COALESCE(MAX(序號), 0) FROM {table_name}")
+    return cursor.fetchone()[0]
+
+def record_first_seen(cursor, table_name, after_id=0):
+    """
+    將資料表中序號大於 after_id 的菜牌與餐廳寫入首次出現記錄
+    after_id 為 0 時處理整個資料表（用於回填）
+    """
+    cursor.execute(MENU_FIRST_SEEN_SQL.format(table_name=table_name, condition=NEW_ROWS_CONDITION),
+                   (table_name, after_id))
+    cursor.execute(RESTAURANT_FIRST_SEEN_SQL.format(table_name=table_name, condition=NEW_ROWS_CONDITION),
+                   (table_name, after_id))
+
+def refresh_first_seen(cursor, table_name, menu_codes, restaurants):
+    """
+    刪除資料後重新計算首次出現記錄：menu_codes 為被刪除資料的菜牌編號，restaurants 為其 (餐廳名稱, 據點)
+    先刪除這些記錄（可能指向已刪除的序號或其建檔日期），再由資料表中剩下的資料重新寫入；
+    已沒有任何資料的菜牌或餐廳不再寫入
+    """
+    if menu_codes:
+        menu_codes = list(menu_codes)
+        placeholders = ','.join(['%s'] * len(menu_codes))
+        cursor.execute(
+            f"DELETE FROM menu_first_seen WHERE 資料表 = %s AND 菜牌編號 IN ({placeholders})",
+            [table_name] + menu_codes
+        )
+        condition = f"src.菜牌編號 IN ({placeholders})"
+        cursor.execute(MENU_FIRST_SEEN_SQL.format(table_name=table_name, condition=condition),
+                       [table_name] + menu_codes)
+
+    if restaurants:
+        restaurants = list(restaurants)
+        placeholders = ','.join(['(%s, %s)'] * len(restaurants))
+        params = [value for restaurant in restaurants for value in restaurant]
+        cursor.execute(
+            f"DELETE FROM restaurant_first_seen WHERE 資料表 = %s AND (餐廳名稱, 據點) IN ({placeholders})",
+            [table_name] + params
+        )
+        condition = f"(src.餐廳名稱, src.據點) IN ({placeholders})"
+        cursor.execute(RESTAURANT_FIRST_SEEN_SQL.format(table_name=table_name, condition=condition),
+                       [table_name] + params)
@@ -0,0 +1,102 @@
+"""
+菜牌編號批次查詢
+將編號切成固定大小的區塊，每個區塊以一個 UNION ALL 查詢搜尋所有存在的資料表，
+結果以產生器逐批返回，全部讀完後即可取得找不到的編號
+"""
+from concurrent.futures import ThreadPoolExecutor
+from module.mod_pool import get_pool
+from module.mod_catalog import get_catalog
+
+# 需要搜尋的表格清單
+SEARCH_TABLES = ['med_tpr', 'med_tpx', 'med_sun', 'menu_items']
+
+# 查詢結果欄位，第一欄為資料表名稱
+SEARCH_COLUMNS = ["資料表", "序號", "餐廳編號", "餐廳名稱", "餐點編號", "菜牌編號",
+                  "餐點名稱", "英文名稱", "據點", "建檔日期"]
+
+# 每個查詢區塊的編號數量
+DEFAULT_CHUNK_SIZE = 1000
+
+def build_lookup_sql(tables, code_count):
+    """產生單一區塊的 UNION ALL 查詢，參數為每個資料表重複一次的編號清單"""
+    placeholders = ','.join(['%s'] * code_count)
+    selects = [
+        f"""
+        SELECT '{table}' AS 資料表, 序號, 餐廳編號, 餐廳名稱, 餐點編號, 菜牌編號, 餐點名稱, 英文名稱, 據點, 建檔日期
+        FROM {table}
+        WHERE 菜牌編號 IN ({placeholders})
+        """
+        for table in tables
+    ]
+    return "UNION ALL".join(selects)
+
+class MenuCodeLookup:
+    def __init__(self, menu_codes, chunk_size=DEFAULT_CHUNK_SIZE, workers=1):
+        # 去除空白與重複的編號，保留輸入順序
+        self.menu_codes = list(dict.fromkeys(
+            str(code).strip() for code in menu_codes if code is not None and str(code).strip()
+        ))
+        self.chunk_size = max(int(chunk_size), 1)
+        self.workers = max(int(workers), 1)
+        self.found_codes = set()
+        self.row_count = 0
+
+    def chunks(self):
+        """將編號切成固定大小的區塊"""
+        for i in range(0, len(self.menu_codes), self.chunk_size):
+            yield self.menu_codes[i:i + self.chunk_size]
+
+    def _query_chunk(self, tables, chunk, connection=None):
+        """查詢單一區塊，未提供連線時向連線池借用"""
+        if connection is None:
+            with get_pool().connection() as pooled:
+                return self._query_chunk(tables, chunk, pooled)
+
+        with connection.cursor() as cursor:
+            cursor.execute(build_lookup_sql(tables, len(chunk)), chunk * len(tables))
+            return cursor.fetchall()
+
+    def _chunk_results(self, tables):
+        """依區塊順序產生每個區塊的查詢結果"""
+        if self.workers == 1:
+            with get_pool().connection() as connection:
+                for chunk in self.chunks():
+                    yield self._query_chunk(tables, chunk, connection)
+            return
+
+        # 平行查詢：每個工作執行緒各自借用連線，最多同時進行 workers 個區塊
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = []
+            for chunk in self.chunks():
+                pending.append(executor.submit(self._query_chunk, tables, chunk))
+                if len(pending) >= self.workers:
+                    yield pending.pop(0).result()
+            for future in pending:
+                yield future.result()
+
+    def rows(self):
+        """逐筆產生查詢結果，第一欄為資料表名稱"""
+        tables = get_catalog().existing_tables(SEARCH_TABLES)
+        if not tables or not self.menu_codes:
+            return
+
+        code_index = SEARCH_COLUMNS.index("菜牌編號")
+        for results in self._chunk_results(tables):
+            for row in results:
+                self.found_codes.add(row[code_index])
+                self.row_count += 1
+                yield row
+
+    @property
+    def missing_codes(self):
+        """找不到的編號（需在 rows() 讀取完畢後使用）"""
+        return [code for code in self.menu_codes if code not in self.found_codes]
+
+def lookup_menu_codes(menu_codes, chunk_size=DEFAULT_CHUNK_SIZE, workers=1):
+    """
+    查詢菜牌編號
+    返回 (查詢結果清單, 找不到的編號清單)
+    """
+    lookup = MenuCodeLookup(menu_codes, chunk_size=chunk_size, workers=workers)
+    results = list(lookup.rows())
+    return results, lookup.missing_codes
@@ -0,0 +1,134 @@
+"""
+菜牌編號的計算：名稱正規化、餐廳編號、餐點編號與衝突處理
+不依賴 pandas，資料庫遷移、上傳與 API 可直接使用；讀寫Excel的批次處理在 mod_number
+"""
+import re
+import hashlib
+from functools import lru_cache
+from module.mod_pinyin import pinyin_initials
+from module.mod_code_registry import CodeRegistry
+
+# 計算結果快取的名稱數，跨請求共用，超過時淘汰最久未使用的名稱
+# 只快取由名稱直接算出的編號；已登記的編號（含衝突後重新編碼的）由 mod_code_registry 的登記表快取提供
+CODE_CACHE_SIZE = 100_000
+
+_SYMBOLS = re.compile(r'[^\w\s\u4e00-\u9fff]')
+_CHINESE = re.compile(r'[\u4e00-\u9fff]')
+_SPACES = re.compile(r'\s+')
+
+def clean_name(name):
+    """移除所有符號，只保留字母、數字、空格與中文"""
+    return _SYMBOLS.sub('', name)
+
+def normalize_menu_name(text):
+    """餐點名稱只保留字母與數字（與產生餐點編號時相同）"""
+    return ''.join(e for e in text if e.isalnum())
+
+def normalize_restaurant_name(name):
+    """餐廳名稱移除符號與空格"""
+    return _SPACES.sub('', clean_name(name))
+
+def normalize_source(restaurant_name, menu_name):
+    """菜牌編號的來源：(正規化餐廳名稱, 正規化餐點名稱)"""
+    return normalize_restaurant_name(str(restaurant_name)), normalize_menu_name(str(menu_name))
+
+def code_key(restaurant_name, menu_name):
+    """
+    計算編號用的名稱：(移除符號的餐廳名稱, 只保留字母與數字的餐點名稱)
+    編號只由這兩個值決定，code_registry 與程序內快取以此為鍵
+    """
+    return clean_name(str(restaurant_name)), normalize_menu_name(str(menu_name))
+
+def convert_to_code(name):
+    # 移除所有符號和空格，只保留字母和數字
+    name = clean_name(name)
+    
+    # 檢查是否包含中文字符
+    if _CHINESE.search(name):
+        # 取得拼音首字母（查表，查不到時使用 pypinyin）
+        pinyin = pinyin_initials(name)
+    else:
+        # 如果是英文，移除所有空格
+        pinyin = _SPACES.sub('', name)
+    
+    # 轉換為大寫並取前5個字符
+    return pinyin.upper()[:5]
+
+def generate_menu_code(text, salt=0):
+    """
+    根據餐點名稱生成固定的編碼
+    格式：2位數字 + 6位英文字母
+    salt 大於 0 時為編號衝突後的重新編碼
+    """
+    # 移除所有空格和標點符號
+    text = normalize_menu_name(text)
+    if salt:
+        # 名稱已移除符號，加上 '#' 與序號不會和其他名稱相同
+        text = f"{text}#{salt}"
+    
+    # 使用 MD5 生成雜湊值
+    hash_obj = hashlib.md5(text.encode('utf-8'))
+    hash_value = hash_obj.hexdigest()
+    
+    # 使用前4個字符生成2位數字（00-99）
+    numbers = ''.join([
+        str(int(hash_value[i:i+2], 16) % 10)
+        for i in range(0, 4, 2)
+    ])[:2]
+    
+    # 使用剩餘的雜湊值生成6位英文字母（A-Z）
+    letters = ''.join([
+        chr(65 + int(hash_value[i:i+2], 16) % 26)
+        for i in range(4, 16, 2)
+    ])[:6]
+    
+    # 組合編碼：2位數字 + 6位英文字母
+    return numbers + letters
+
+@lru_cache(maxsize=CODE_CACHE_SIZE)
+def computed_codes(key):
+    """依 code_key 計算 (餐廳編號, 餐點編號)，重複上傳相同名稱時直接取用快取"""
+    restaurant_name, menu_name = key
+    return convert_to_code(restaurant_name), generate_menu_code(menu_name)
+
+def assign_codes(pairs, registry=None):
+    """
+    為 (餐廳名稱, 餐點名稱) 取得編號，不需要 pandas
+    先以 code_key 查編號登記表（程序內快取 → code_registry），只有沒登記過的名稱才重新計算；
+    新計算的編號若已被其他來源（normalize_source）使用（資料庫與本批資料），以 salt = 1, 2, ... 重新產生餐點編號，
+    直到編號未被使用或屬於同一來源。新名稱依 (編號, 名稱) 排序處理，結果與輸入順序無關
+    返回 {(餐廳名稱, 餐點名稱): (餐廳編號, 餐點編號, 菜牌編號, 衝突說明)}，沒有衝突時說明為空字串
+    """
+    if registry is None:
+        registry = CodeRegistry(normalize_source)
+
+    # 編號只由 code_key 決定，符號不同的寫法共用同一組編號
+    keys = {pair: code_key(*pair) for pair in set(pairs)}
+    unique_keys = set(keys.values())
+    known = registry.registered(unique_keys)
+    for key, (_, _, code) in known.items():
+        registry.register(code, normalize_source(*key))
+
+    fresh = {key: computed_codes(key) for key in unique_keys if key not in known}
+
+    registry.load(f"{restaurant_code}-{menu_code}" for restaurant_code, menu_code in fresh.values())
+    assigned = {key: codes + ('',) for key, codes in known.items()}
+    for key, (restaurant_code, menu_code) in sorted(fresh.items(), key=lambda item: (item[1], item[0])):
+        source = normalize_source(*key)
+        code = f"{restaurant_code}-{menu_code}"
+        note = ''
+        if not registry.is_free(code, source):
+            owner = registry.owner(code)
+            salt = 0
+            candidate = code
+            while not registry.is_free(candidate, source):
+                salt += 1
+                menu_code = generate_menu_code(key[1], salt)
+                candidate = f"{restaurant_code}-{menu_code}"
+                registry.load([candidate])
+            note = f"原編號 {code} 已被 {owner[0]} {owner[1]} 使用，改為 {candidate}"
+            code = candidate
+        registry.register(code, source)
+        assigned[key] = (restaurant_code, menu_code, code, note)
+
+    return {pair: assigned[key] for pair, key in keys.items()}
@@ -1,67 +1,63 @@
-from pypinyin import lazy_pinyin
-import re
-import hashlib
-
-def convert_to_code(name):
-    # 移除所有符號和空格，只保留字母和數字
-    name = re.sub(r'[^\w\s\u4e00-\u9fff]', '', name)
-    
-    # 檢查是否包含中文字符
-    if any('\u4e00' <= char <= '\u9fff' for char in name):
-        # 轉換中文為拼音，並取得首字母
-        pinyin = ''.join([word[0] for word in lazy_pinyin(name)])
-    else:
-        # 如果是英文，移除所有空格
-        pinyin = re.sub(r'\s+', '', name)
-    
-    # 轉換為大寫並取前5個字符
-    return pinyin.upper()[:5]
-
-def generate_menu_code(text):
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
+import multiprocessing
+import os
+import threading
+import time
+import numpy as np
+import pandas as pd
+from .mod_code_registry import CodeRegistry
+from .mod_menu_code import (clean_name, normalize_menu_name, normalize_restaurant_name, normalize_source,
+                            convert_to_code, generate_menu_code, assign_codes)
+
+# 少於這個數量的檔案直接在目前程序依序處理，啟動工作程序的時間比處理還久
+PARALLEL_MIN_FILES = 3
+
+# 跨請求共用的程序池大小，每批同時處理的檔案數由送出的工作數限制
+PROCESS_POOL_SIZE = os.cpu_count() or 1
+
+# 跨請求共用的程序池，第一次平行處理時才建立，只有損壞後才重新建立
+_executor = None
+_executor_lock = threading.Lock()
+
+def _factorize_pairs(left, right):
     """
-    根據餐點名稱生成固定的編碼
-    格式：2位數字 + 6位英文字母
+    將兩欄的組合編為整數
+    返回 (每列對應的組合索引, 不重複的 (左欄, 右欄) 字串清單)
     """
-    # 移除所有空格和標點符號
-    text = ''.join(e for e in text if e.isalnum())
-    
-    # 使用 MD5 生成雜湊值
-    hash_obj = hashlib.md5(text.encode('utf-8'))
-    hash_value = hash_obj.hexdigest()
-    
-    # 使用前4個字符生成2位數字（00-99）
-    numbers = ''.join([
-        str(int(hash_value[i:i+2], 16) % 10)
-        for i in range(0, 4, 2)
-    ])[:2]
-    
-    # 使用剩餘的雜湊值生成6位英文字母（A-Z）
-    letters = ''.join([
-        chr(65 + int(hash_value[i:i+2], 16) % 26)
-        for i in range(4, 16, 2)
-    ])[:6]
-    
-    # 組合編碼：2位數字 + 6位英文字母
-    return numbers + letters
-
-def process_menu_codes(file_path):
+    left_labels, left_uniques = pd.factorize(pd.Series(left, copy=False), use_na_sentinel=False)
+    right_labels, right_uniques = pd.factorize(pd.Series(right, copy=False), use_na_sentinel=False)
+    width = max(len(right_uniques), 1)
+    labels, combined = pd.factorize(left_labels.astype(np.int64) * width + right_labels)
+    left_names = [str(value) for value in left_uniques]
+    right_names = [str(value) for value in right_uniques]
+    pairs = [(left_names[value // width], right_names[value % width]) for value in combined.tolist()]
+    return labels, pairs
+
+def process_menu_codes(file_path, registry=None):
     """
     處理Excel文件並生成編號
+    registry 為菜牌編號索引，未提供時建立新的索引並查詢資料庫；
+    同一批的多個檔案需共用同一個索引，才能檢查檔案之間的編號衝突
     返回新文件路徑或錯誤訊息
     """
-    import pandas as pd
-    import os
-    
+    new_file_path, error, _ = _process_file(file_path, registry)
+    return new_file_path, error
+
+def _process_file(file_path, registry=None):
+    """處理Excel文件並生成編號，返回 (新文件路徑, 錯誤訊息, assign_codes 的結果)"""
     try:
         # 檢查文件是否存在
         if not os.path.exists(file_path):
-            return None, "文件不存在"
+            return None, "文件不存在", {}
             
         # 讀取Excel檔案
         df = pd.read_excel(file_path)
         
         if df.empty:
-            return None, "文件是空的"
+            return None, "文件是空的", {}
         
         # 尋找必要的欄位
         menu_name_col = None
@@ -73,19 +69,30 @@ def process_menu_codes(file_path):
                 restaurant_col = col
         
         if menu_name_col is None:
-            return None, "找不到'餐點名稱'欄位"
+            return None, "找不到'餐點名稱'欄位", {}
             
         if restaurant_col is None:
-            return None, "找不到'餐廳'欄位"
+            return None, "找不到'餐廳'欄位", {}
 
+        # 相同的 (餐廳, 餐點) 只處理一次：已登記的來源直接查表，新來源才計算編號並檢查衝突
+        labels, pairs = _factorize_pairs(df[restaurant_col], df[menu_name_col])
+        codes = assign_codes(pairs, registry)
+        table = np.array([codes[pair] for pair in pairs], dtype=object).reshape(len(pairs), 4)
+        
         # 生成餐點編號
-        df["餐點編號"] = df[menu_name_col].astype(str).apply(generate_menu_code)
+        df["餐點編號"] = table[labels, 1]
         
         # 生成餐廳編號
-        df["餐廳編號"] = df[restaurant_col].astype(str).apply(convert_to_code)
+        df["餐廳編號"] = table[labels, 0]
         
         # 組合完整編號
-        df["菜牌編號"] = df["餐廳編號"] + "-" + df["餐點編號"]
+        df["菜牌編號"] = table[labels, 2]
+        
+        # 標示重新編碼的列
+        df["編號衝突"] = table[labels, 3]
+        collisions = sum(1 for pair in pairs if codes[pair][3])
+        if collisions:
+            print(f"{os.path.basename(file_path)}：{collisions} 組餐廳與餐點的菜牌編號衝突，已重新編碼")
         
         # 生成新檔名
         file_dir = os.path.dirname(file_path)
@@ -95,9 +102,160 @@ def process_menu_codes(file_path):
         # 儲存新檔案
         df.to_excel(new_file_path, index=False)
         
-        return new_file_path, None
+        return new_file_path, None, codes
         
     except pd.errors.EmptyDataError:
-        return None, "文件是空的或格式不正確"
+        return None, "文件是空的或格式不正確", {}
     except Exception as e:
-        return None, f"處理文件時發生錯誤: {str(e)}" 
\ No newline at end of file
+        return None, f"處理文件時發生錯誤: {str(e)}", {}
+
+def _process_timed(file_path, registry=None):
+    """
+    處理單一檔案並計時，返回 (新檔案路徑, 錯誤訊息, 耗時秒數, [(菜牌編號, 來源)])
+    最後一項為檔案中每個來源分配到的編號，供父程序檢查檔案之間的衝突
+    """
+    start_time = time.perf_counter()
+    new_file_path, error, codes = _process_file(file_path, registry)
+    assigned = sorted({(code, normalize_source(*pair)) for pair, (_, _, code, _) in codes.items()})
+    return new_file_path, error, time.perf_counter() - start_time, assigned
+
+def _get_executor():
+    """取得共用的程序池"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # 使用 spawn 啟動工作程序，不繼承父程序連線池中的資料庫連線
+            context = multiprocessing.get_context('spawn')
+            _executor = ProcessPoolExecutor(max_workers=PROCESS_POOL_SIZE, mp_context=context)
+        return _executor
+
+def _discard_executor(executor):
+    """工作程序異常結束後程序池無法再使用，捨棄後下次重新建立"""
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+def _submit(executor, file_path):
+    """送出檔案給程序池處理，程序池無法使用時返回 None"""
+    try:
+        return executor.submit(_process_timed, file_path)
+    except (BrokenProcessPool, RuntimeError):
+        _discard_executor(executor)
+        return None
+
+def _worker_result(executor, future):
+    """取得工作程序的處理結果，無法取得時返回 None"""
+    if future is None:
+        return None
+    try:
+        return future.result()
+    except BrokenProcessPool:
+        _discard_executor(executor)
+        return None
+    except Exception:
+        return None
+
+def _iter_serial(file_paths, registry):
+    """在目前程序依序處理，所有檔案共用同一個編號索引，較晚的檔案不會使用較早檔案已分配給其他來源的編號"""
+    for file_path in file_paths:
+        yield (file_path, *_process_timed(file_path, registry)[:3])
+
+def iter_process_menu_codes(file_paths, workers=None):
+    """
+    處理多個檔案，依上傳順序產生 (原檔案路徑, 新檔案路徑, 錯誤訊息, 耗時秒數)
+    workers 為本批同時處理的檔案數，預設為 CPU 核心數；只有一個 CPU 或檔案少於 PARALLEL_MIN_FILES 時
+    直接在目前程序依序處理
+    平行處理時各工作程序只檢查自己檔案內與資料庫中的衝突，父程序再依上傳順序以同一個索引檢查檔案之間的衝突，
+    與較早檔案衝突的檔案在目前程序以該索引重新處理
+    """
+    file_paths = list(file_paths)
+    workers = min(workers or os.cpu_count() or 1, len(file_paths))
+    registry = CodeRegistry(normalize_source)
+    if workers <= 1 or len(file_paths) < PARALLEL_MIN_FILES:
+        yield from _iter_serial(file_paths, registry)
+        return
+
+    # 程序池跨請求共用，本批最多同時送出 workers 個檔案，取得一個結果後再送出下一個
+    executor = _get_executor()
+    queued = iter(file_paths)
+    pending = deque((file_path, _submit(executor, file_path)) for file_path in islice(queued, workers))
+    while pending:
+        file_path, future = pending.popleft()
+        next_path = next(queued, None)
+        if next_path is not None:
+            pending.append((next_path, _submit(executor, next_path)))
+
+        result = _worker_result(executor, future)
+        if result is None:
+            # 工作程序失敗或程序池無法使用時改在目前程序處理
+            yield (file_path, *_process_timed(file_path, registry)[:3])
+            continue
+
+        new_file_path, error, seconds, assigned = result
+        if not error:
+            if all(registry.is_free(code, source) for code, source in assigned):
+                for code, source in assigned:
+                    registry.register(code, source)
+            else:
+                # 與本批較早的檔案衝突，以共用的索引重新處理
+                new_file_path, error, rerun_seconds, _ = _process_timed(file_path, registry)
+                seconds += rerun_seconds
+        yield file_path, new_file_path, error, seconds
+
+def benchmark_menu_codes(row_count=200_000, restaurant_count=300, dishes_per_restaurant=40, repeat=3):
+    """
+    以模擬的菜單檔比較逐列 apply 與批次生成編號的處理速度
+    模擬實際的上傳：每家餐廳有固定的菜單，同一組餐廳與餐點在檔案中重複出現，之後的上傳也是同樣的名稱；
+    批次分別測試快取為空（第一次上傳）與快取已有資料（之後的上傳），不查詢資料庫，只檢查本批資料內的衝突
+    """
+    from .mod_menu_code import computed_codes
+
+    rng = np.random.default_rng(0)
+    dishes = ["紅燒牛肉麵", "宮保雞丁", "麻婆豆腐", "Caesar Salad", "炒青菜", "三杯雞", "滷肉飯", "酸辣湯"]
+    # 餐廳名稱以首字母各不相同的字組合，避免模擬資料本身產生大量編號衝突
+    initials = "安北川大鵝福港好金開老美南歐平青日上台王新永中"
+    restaurant_names = [f"{initials[i // len(initials) % len(initials)]}{initials[i % len(initials)]}餐廳"
+                        for i in range(restaurant_count)]
+    menus = [(restaurant, f"{dishes[j % len(dishes)]}{j // len(dishes) or ''}")
+             for restaurant in restaurant_names for j in range(dishes_per_restaurant)]
+    rows = [menus[i] for i in rng.integers(0, len(menus), row_count)]
+    df = pd.DataFrame(rows, columns=["餐廳", "餐點名稱"])
+
+    def by_apply(df):
+        # 原本的逐列做法，僅供比較
+        return (df["餐廳"].astype(str).apply(convert_to_code) + "-"
+                + df["餐點名稱"].astype(str).apply(generate_menu_code)).tolist()
+
+    def by_batch(df):
+        labels, pairs = _factorize_pairs(df["餐廳"], df["餐點名稱"])
+        codes = assign_codes(pairs, CodeRegistry(normalize_source, use_database=False))
+        table = np.array([codes[pair] for pair in pairs], dtype=object).reshape(len(pairs), 4)
+        return table[labels, 2].tolist(), table[labels, 3].tolist()
+
+    expected = by_apply(df)
+    computed_codes.cache_clear()
+    actual, notes = by_batch(df)
+    assert all(e == a for e, a, note in zip(expected, actual, notes) if not note), "批次結果與逐列結果不一致"
+    print(f"{len(menus)} 組餐廳與餐點，衝突重新編碼：{sum(1 for note in notes if note)} 筆")
+
+    results = {}
+    for name, func, setup in [('逐列 apply', by_apply, None),
+                              ('批次（空快取）', by_batch, computed_codes.cache_clear),
+                              ('批次（已快取）', by_batch, None)]:
+        timings = []
+        for _ in range(repeat):
+            if setup:
+                setup()
+            start_time = time.perf_counter()
+            func(df)
+            timings.append(time.perf_counter() - start_time)
+        best = min(timings)
+        results[name] = best
+        print(f"{name}: {row_count} 筆，最佳耗時 {best:.3f} 秒，每秒 {row_count / best:,.0f} 筆")
+    return results
+
+if __name__ == "__main__":
+    # python -m module.mod_number 執行編號生成效能測試
+    benchmark_menu_codes()
@@ -0,0 +1,126 @@
+"""
+拼音首字母查表
+預先計算 U+4E00–U+9FFF 每個漢字的拼音首字母，存成每字一個位元組的表（module/data/pinyin_initials.bin），
+第一次使用時才載入；多音字且各讀音首字母不同的字在表中為 0，
+遇到這些字或表外的非 ASCII 字元時改用 pypinyin，結果與 lazy_pinyin 逐字取首字母相同
+用法：
+python -m module.mod_pinyin --build            重新產生首字母表（升級 pypinyin 後執行）
+python -m module.mod_pinyin --verify [檔案]    與 pypinyin 比對，檔案為每行一個名稱，未指定時讀取資料庫中的餐廳名稱
+"""
+import os
+import re
+import sys
+
+TABLE_START = 0x4E00
+TABLE_END = 0x9FFF
+TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'pinyin_initials.bin')
+
+# 比對時讀取餐廳名稱的資料表
+VERIFY_TABLES = ['med_tpr', 'med_tpx', 'med_sun', 'menu_items']
+
+# lazy_pinyin 會把連續的非漢字視為一個詞，只取第一個字元
+_ASCII_RUN = re.compile(r'[\x00-\x7f]+')
+
+_translate_table = None
+
+def _first_char(match):
+    return match.group()[0]
+
+def _load_table():
+    """載入首字母表，轉為 str.translate 使用的 {字元碼: 首字母}，表中為 0 的字不放入"""
+    global _translate_table
+    if _translate_table is None:
+        with open(TABLE_PATH, 'rb') as f:
+            data = f.read()
+        _translate_table = {
+            TABLE_START + offset: chr(initial)
+            for offset, initial in enumerate(data)
+            if initial
+        }
+    return _translate_table
+
+def pypinyin_initials(text):
+    """以 pypinyin 取得每個詞的首字母（原本的做法）"""
+    from pypinyin import lazy_pinyin
+    return ''.join([word[0] for word in lazy_pinyin(text)])
+
+def pinyin_initials(text):
+    """
+    取得每個漢字的拼音首字母，連續的非漢字只取第一個字元
+    全部字元都能查表時不需載入 pypinyin
+    """
+    result = _ASCII_RUN.sub(_first_char, text).translate(_load_table())
+    if result.isascii():
+        return result
+    return pypinyin_initials(text)
+
+def build_table(path=TABLE_PATH):
+    """以 pypinyin 產生首字母表，各讀音首字母相同的字才記錄，返回記錄的字數"""
+    from pypinyin import pinyin, Style
+
+    data = bytearray(TABLE_END - TABLE_START + 1)
+    for offset in range(len(data)):
+        readings = pinyin(chr(TABLE_START + offset), style=Style.NORMAL, heteronym=True)[0]
+        initials = {reading[0] for reading in readings if reading}
+        if len(initials) == 1:
+            initial = initials.pop()
+            if initial.isascii() and initial.isalpha():
+                data[offset] = ord(initial)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(bytes(data))
+    return sum(1 for initial in data if initial)
+
+def load_verify_names(source=None):
+    """比對用的名稱：指定檔案時每行一個名稱，否則讀取資料庫中所有不重複的餐廳名稱"""
+    if source:
+        from module.mod_csv import read_text_auto
+        return [line.strip() for line in read_text_auto(source).splitlines() if line.strip()]
+
+    from module.mod_pool import get_pool
+    from module.mod_catalog import get_catalog
+    tables = get_catalog().existing_tables(VERIFY_TABLES)
+    if not tables:
+        return []
+    query = " UNION ".join(f"SELECT DISTINCT 餐廳名稱 FROM {table}" for table in tables)
+    with get_pool().connection() as connection:
+        with connection.cursor() as cursor:
+            cursor.execute(query)
+            return [row[0] for row in cursor.fetchall() if row[0]]
+
+def verify(names):
+    """
+    比對查表結果與 pypinyin，除了指定的名稱，也逐字檢查表中每個漢字
+    返回不一致的 [(名稱, 查表結果, pypinyin 結果)]
+    """
+    from module.mod_menu_code import clean_name
+
+    samples = [clean_name(str(name)) for name in names]
+    samples += [chr(code) for code in range(TABLE_START, TABLE_END + 1)]
+    mismatches = []
+    for text in samples:
+        expected = pypinyin_initials(text)
+        actual = pinyin_initials(text)
+        if actual != expected:
+            mismatches.append((text, actual, expected))
+    return mismatches
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if '--build' in args:
+        count = build_table()
+        print(f"已產生 {TABLE_PATH}，共 {count} 個漢字可直接查表")
+    elif '--verify' in args:
+        files = [arg for arg in args if not arg.startswith('--')]
+        names = load_verify_names(files[0] if files else None)
+        mismatches = verify(names)
+        print(f"已比對 {len(names)} 個名稱與 {TABLE_END - TABLE_START + 1} 個單字")
+        for text, actual, expected in mismatches[:50]:
+            print(f"  {text}：查表 {actual}，pypinyin {expected}")
+        if mismatches:
+            print(f"共 {len(mismatches)} 筆不一致")
+            sys.exit(1)
+        print("結果完全一致")
+    else:
+        print(__doc__)
@@ -0,0 +1,157 @@
+"""
+MySQL 連線池
+所有模組透過 get_pool() 借用連線，避免每次操作都重新建立 TCP 連線與驗證
+"""
+import threading
+import time
+from contextlib import contextmanager
+import pymysql
+from module.config_sql import DB_CONFIG, POOL_CONFIG
+
+class ConnectionPool:
+    def __init__(self, db_config, max_size=10, max_idle_seconds=300, checkout_timeout=30):
+        self.db_config = db_config
+        self.max_size = max_size
+        self.max_idle_seconds = max_idle_seconds
+        self.checkout_timeout = checkout_timeout
+
+        self._condition = threading.Condition()
+        self._idle = []  # (連線, 歸還時間)，後進先出
+        self._in_use = 0
+
+        # 連線池統計
+        self._stats = {
+            'created': 0,    # 新建立的連線數
+            'reused': 0,     # 重複使用的次數
+            'evicted': 0,    # 因閒置過久被關閉的連線數
+            'broken': 0,     # 健康檢查失敗被丟棄的連線數
+            'waits': 0,      # 連線池已滿需要等待的次數
+            'timeouts': 0    # 等待逾時的次數
+        }
+
+    def _evict_idle(self):
+        """移出閒置過久的連線，返回需要關閉的連線（需持有鎖）"""
+        now = time.monotonic()
+        expired = [conn for conn, returned_at in self._idle
+                   if now - returned_at > self.max_idle_seconds]
+        if expired:
+            self._idle = [(conn, returned_at) for conn, returned_at in self._idle
+                          if now - returned_at <= self.max_idle_seconds]
+            self._stats['evicted'] += len(expired)
+        return expired
+
+    @staticmethod
+    def _close_quietly(connections):
+        for conn in connections:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def acquire(self):
+        """借出一個連線，連線池已滿時等待其他連線歸還"""
+        deadline = time.monotonic() + self.checkout_timeout
+
+        while True:
+            conn = None
+            with self._condition:
+                expired = self._evict_idle()
+                while not self._idle and self._in_use >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise TimeoutError(f"等待資料庫連線逾時（連線池上限 {self.max_size}）")
+                    self._stats['waits'] += 1
+                    self._condition.wait(remaining)
+                    expired += self._evict_idle()
+
+                if self._idle:
+                    conn, _ = self._idle.pop()
+                self._in_use += 1
+            self._close_quietly(expired)
+
+            if conn is None:
+                return self._create_connection()
+
+            # 借出前的健康檢查
+            try:
+                conn.ping(reconnect=False)
+                with self._condition:
+                    self._stats['reused'] += 1
+                return conn
+            except Exception:
+                self._close_quietly([conn])
+                with self._condition:
+                    self._stats['broken'] += 1
+                    self._in_use -= 1
+                    self._condition.notify()
+
+    def _create_connection(self):
+        try:
+            conn = pymysql.connect(**self.db_config)
+        except Exception:
+            with self._condition:
+                self._in_use -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self._stats['created'] += 1
+        return conn
+
+    def release(self, conn):
+        """歸還連線，未提交的交易會先回滾"""
+        reusable = False
+        try:
+            if conn.open:
+                conn.rollback()
+                reusable = True
+        except Exception:
+            reusable = False
+
+        if not reusable:
+            self._close_quietly([conn])
+
+        with self._condition:
+            self._in_use -= 1
+            if reusable:
+                self._idle.append((conn, time.monotonic()))
+            expired = self._evict_idle()
+            self._condition.notify()
+        self._close_quietly(expired)
+
+    @contextmanager
+    def connection(self):
+        """以 with 語法借用連線，離開區塊時自動歸還"""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def stats(self):
+        """連線池統計資料"""
+        with self._condition:
+            stats = dict(self._stats)
+            stats['idle'] = len(self._idle)
+            stats['in_use'] = self._in_use
+            stats['max_size'] = self.max_size
+        return stats
+
+    def close_all(self):
+        """關閉所有閒置連線"""
+        with self._condition:
+            idle = [conn for conn, _ in self._idle]
+            self._idle = []
+        self._close_quietly(idle)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """取得全域共用的連線池"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DB_CONFIG, **POOL_CONFIG)
+    return _pool
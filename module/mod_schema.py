@@ -0,0 +1,289 @@
+"""
+資料庫結構遷移
+啟動時（或以 python -m module.mod_schema）執行一次，
+依 schema_version 資料表記錄的版本套用尚未執行的遷移
+"""
+from datetime import datetime
+from module.mod_pool import get_pool
+from module.mod_catalog import get_catalog
+from module.mod_first_seen import record_first_seen
+from module.mod_code_registry import register_codes
+from module.mod_menu_code import code_key
+
+# 存放菜牌資料的資料表
+MENU_TABLES = ['med_tpr', 'med_tpx', 'med_sun', 'menu_items']
+
+# 菜牌編號唯一索引名稱
+MENU_CODE_INDEX = 'uq_menu_code'
+
+# 菜牌資料表的查詢索引：(索引名稱, 欄位)
+# 菜牌編號的查詢（IN、JOIN、GROUP BY）由 uq_menu_code 處理；
+# 建檔日期範圍與餐廳的查詢改讀 menu_first_seen、restaurant_first_seen，菜牌資料表不需要對應的索引
+MENU_INDEXES = [
+    ('idx_location_item', ['據點', '餐點編號']),                  # 無英文菜單依據點與餐點編號去重
+    ('idx_english', ['英文名稱']),                                # 英文名稱 IS NULL OR = ''
+]
+
+# 版本 5 建立、但沒有查詢使用的索引，只增加寫入成本，由版本 7 移除
+UNUSED_INDEXES = ['idx_date_code', 'idx_restaurant_location_date']
+
+# 菜牌編號唯一索引因重複資料無法建立時的說明
+DUPLICATES_BLOCKED_MESSAGE = "請先在「資料庫功能」以刪除重複資料預覽（POST /remove_duplicates，dry_run 為 true）確認後刪除，刪除完成後會自動建立唯一索引"
+
+class MigrationBlocked(RuntimeError):
+    """遷移需要先處理資料才能套用，其他遷移仍可繼續，下次執行遷移時再重試"""
+
+# 遷移程序互斥鎖名稱，避免多個程序同時執行遷移
+MIGRATION_LOCK = 'menu_schema_migration'
+
+MENU_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS {table_name} (
+    序號 INT AUTO_INCREMENT PRIMARY KEY,
+    餐廳編號 VARCHAR(10) NOT NULL,
+    餐廳名稱 VARCHAR(100) NOT NULL,
+    餐點編號 VARCHAR(10) NOT NULL,
+    菜牌編號 VARCHAR(20) NOT NULL,
+    餐點名稱 VARCHAR(100) NOT NULL,
+    英文名稱 VARCHAR(100),
+    據點 VARCHAR(100) NOT NULL,
+    建檔日期 DATETIME NOT NULL
+) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci
+"""
+
+SCHEMA_VERSION_SQL = """
+CREATE TABLE IF NOT EXISTS schema_version (
+    版本 INT PRIMARY KEY,
+    說明 VARCHAR(100) NOT NULL,
+    套用日期 DATETIME NOT NULL
+) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci
+"""
+
+EXPORT_WATERMARK_SQL = """
+CREATE TABLE IF NOT EXISTS export_watermark (
+    匯出名稱 VARCHAR(50) NOT NULL,
+    資料表 VARCHAR(20) NOT NULL,
+    最後序號 INT NOT NULL,
+    最後建檔日期 DATETIME NULL,
+    更新日期 DATETIME NOT NULL,
+    PRIMARY KEY (匯出名稱, 資料表)
+) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci
+"""
+
+FIRST_SEEN_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS menu_first_seen (
+        資料表 VARCHAR(20) NOT NULL,
+        菜牌編號 VARCHAR(20) NOT NULL,
+        建檔日期 DATETIME NOT NULL,
+        序號 INT NOT NULL,
+        PRIMARY KEY (資料表, 菜牌編號),
+        INDEX idx_menu_first_seen_date (資料表, 建檔日期)
+    ) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS restaurant_first_seen (
+        資料表 VARCHAR(20) NOT NULL,
+        餐廳名稱 VARCHAR(100) NOT NULL,
+        據點 VARCHAR(100) NOT NULL,
+        建檔日期 DATETIME NOT NULL,
+        序號 INT NOT NULL,
+        PRIMARY KEY (資料表, 餐廳名稱, 據點),
+        INDEX idx_restaurant_first_seen_date (資料表, 建檔日期)
+    ) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci
+    """,
+]
+
+# 名稱欄位為計算編號用的名稱（code_key），使用不補空白的二進位排序，大小寫與前後空白不同即為不同名稱
+CODE_REGISTRY_SQL = """
+CREATE TABLE IF NOT EXISTS code_registry (
+    餐廳名稱 VARCHAR(100) COLLATE utf8mb4_0900_bin NOT NULL,
+    餐點名稱 VARCHAR(100) COLLATE utf8mb4_0900_bin NOT NULL,
+    餐廳編號 VARCHAR(10) NOT NULL,
+    餐點編號 VARCHAR(10) NOT NULL,
+    菜牌編號 VARCHAR(20) NOT NULL,
+    PRIMARY KEY (餐廳名稱, 餐點名稱),
+    INDEX idx_code_registry_code (菜牌編號)
+) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci
+"""
+
+def column_exists(cursor, table_name, column_name):
+    """檢查資料表是否有指定欄位"""
+    check_column_sql = """
+    SELECT COUNT(*)
+    FROM information_schema.columns
+    WHERE table_schema = DATABASE()
+    AND table_name = %s
+    AND column_name = %s
+    """
+    cursor.execute(check_column_sql, (table_name, column_name))
+    return cursor.fetchone()[0] > 0
+
+def create_menu_tables(cursor):
+    """建立菜牌資料表，舊資料表缺少據點欄位時補上"""
+    for table_name in MENU_TABLES:
+        cursor.execute(MENU_TABLE_SQL.format(table_name=table_name))
+        if not column_exists(cursor, table_name, '據點'):
+            cursor.execute(f"""
+            ALTER TABLE {table_name}
+            ADD COLUMN 據點 VARCHAR(100) NOT NULL DEFAULT ''
+            """)
+
+def index_exists(cursor, table_name, index_name):
+    """檢查資料表是否有指定索引"""
+    check_index_sql = """
+    SELECT COUNT(*)
+    FROM information_schema.statistics
+    WHERE table_schema = DATABASE()
+    AND table_name = %s
+    AND index_name = %s
+    """
+    cursor.execute(check_index_sql, (table_name, index_name))
+    return cursor.fetchone()[0] > 0
+
+def count_duplicate_menu_codes(cursor, table_name):
+    """資料表中重複的菜牌編號筆數（每個編號保留一筆之外的筆數）"""
+    cursor.execute(f"SELECT COUNT(*) - COUNT(DISTINCT 菜牌編號) FROM {table_name}")
+    return int(cursor.fetchone()[0] or 0)
+
+def add_unique_menu_code_index(cursor, table_name):
+    """為資料表的菜牌編號加上唯一索引，已存在則略過"""
+    if index_exists(cursor, table_name, MENU_CODE_INDEX):
+        return
+    cursor.execute(f"ALTER TABLE {table_name} ADD UNIQUE INDEX {MENU_CODE_INDEX} (菜牌編號)")
+
+def add_menu_code_indexes(cursor):
+    """
+    所有菜牌資料表的菜牌編號唯一索引
+    有重複的菜牌編號時不會自動刪除資料，以 MigrationBlocked 列出各資料表的重複筆數，
+    需先以「刪除重複資料」預覽並確認刪除
+    """
+    duplicates = {
+        table_name: count_duplicate_menu_codes(cursor, table_name)
+        for table_name in MENU_TABLES
+        if not index_exists(cursor, table_name, MENU_CODE_INDEX)
+    }
+    duplicates = {table_name: count for table_name, count in duplicates.items() if count}
+    if duplicates:
+        details = '、'.join(f"{table_name} {count} 筆" for table_name, count in duplicates.items())
+        raise MigrationBlocked(f"菜牌編號有重複資料（{details}），無法建立唯一索引。{DUPLICATES_BLOCKED_MESSAGE}")
+
+    for table_name in MENU_TABLES:
+        add_unique_menu_code_index(cursor, table_name)
+
+def create_export_watermark_table(cursor):
+    """記錄各匯出功能每個資料表最後匯出位置的資料表"""
+    cursor.execute(EXPORT_WATERMARK_SQL)
+
+def create_first_seen_tables(cursor):
+    """建立菜牌與餐廳首次出現記錄，並以現有資料回填"""
+    for create_sql in FIRST_SEEN_SQL:
+        cursor.execute(create_sql)
+    for table_name in MENU_TABLES:
+        record_first_seen(cursor, table_name)
+
+def add_workload_indexes(cursor):
+    """依查詢需求為菜牌資料表加上複合索引，已存在的索引略過"""
+    for table_name in MENU_TABLES:
+        # 多個索引在同一個 ALTER TABLE 中建立，資料表只需重建一次
+        missing = [
+            f"ADD INDEX {index_name} ({', '.join(columns)})"
+            for index_name, columns in MENU_INDEXES
+            if not index_exists(cursor, table_name, index_name)
+        ]
+        if missing:
+            cursor.execute(f"ALTER TABLE {table_name} {', '.join(missing)}")
+
+def drop_unused_indexes(cursor):
+    """移除沒有查詢使用的索引，不存在的索引略過"""
+    for table_name in MENU_TABLES:
+        existing = [index_name for index_name in UNUSED_INDEXES if index_exists(cursor, table_name, index_name)]
+        if existing:
+            cursor.execute(f"ALTER TABLE {table_name} {', '.join(f'DROP INDEX {name}' for name in existing)}")
+
+def create_code_registry_table(cursor):
+    """建立菜牌編號登記表，並以現有資料回填"""
+    cursor.execute(CODE_REGISTRY_SQL)
+    for table_name in MENU_TABLES:
+        registered = register_codes(cursor, table_name, code_key)
+        print(f"{table_name}: 已登記 {registered} 組餐廳與餐點的編號")
+
+# 遷移清單：(版本, 說明, 執行函數)，只能在尾端新增
+MIGRATIONS = [
+    (1, '建立菜牌資料表', create_menu_tables),
+    (2, '菜牌編號唯一索引', add_menu_code_indexes),
+    (3, '匯出位置記錄', create_export_watermark_table),
+    (4, '菜牌與餐廳首次出現記錄', create_first_seen_tables),
+    (5, '查詢用複合索引', add_workload_indexes),
+    (6, '菜牌編號登記表', create_code_registry_table),
+    (7, '移除未使用的索引', drop_unused_indexes),
+]
+
+def get_applied_versions(cursor):
+    """取得已套用的版本，被擋下的遷移不會記錄，因此版本可能不連續"""
+    cursor.execute("SELECT 版本 FROM schema_version")
+    return {row[0] for row in cursor.fetchall()}
+
+def menu_code_index_missing(cursor, table_name):
+    """資料表尚未建立菜牌編號唯一索引（遷移 2 因重複資料被擋下）"""
+    return not index_exists(cursor, table_name, MENU_CODE_INDEX)
+
+def run_migrations(connection=None):
+    """
+    套用所有尚未執行的遷移
+    遷移引發 MigrationBlocked 時略過該版本並繼續之後的遷移，下次執行時再重試
+    返回本次套用的版本清單
+    """
+    own_connection = connection is None
+    if own_connection:
+        connection = get_pool().acquire()
+    cursor = connection.cursor()
+
+    applied = []
+    try:
+        cursor.execute("SELECT GET_LOCK(%s, 60)", (MIGRATION_LOCK,))
+        if cursor.fetchone()[0] != 1:
+            raise RuntimeError("無法取得資料庫遷移鎖，可能有其他程序正在執行遷移")
+
+        try:
+            cursor.execute(SCHEMA_VERSION_SQL)
+            applied_versions = get_applied_versions(cursor)
+
+            for version, description, migrate in MIGRATIONS:
+                if version in applied_versions:
+                    continue
+
+                print(f"套用資料庫遷移 {version}：{description}")
+                try:
+                    migrate(cursor)
+                except MigrationBlocked as e:
+                    print(f"資料庫遷移 {version} 暫停：{str(e)}")
+                    continue
+                cursor.execute(
+                    "INSERT INTO schema_version (版本, 說明, 套用日期) VALUES (%s, %s, %s)",
+                    (version, description, datetime.now())
+                )
+                connection.commit()
+                applied.append(version)
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (MIGRATION_LOCK,))
+            cursor.fetchall()
+            # 遷移可能建立或修改了資料表，讓結構快取重新載入
+            if applied:
+                get_catalog().invalidate()
+
+        return applied
+
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+        if own_connection:
+            get_pool().release(connection)
+
+if __name__ == "__main__":
+    versions = run_migrations()
+    if versions:
+        print(f"已套用遷移版本：{', '.join(str(v) for v in versions)}")
+    else:
+        print("資料庫結構已是最新版本")
@@ -2,7 +2,7 @@ import tkinter as tk
 from tkinter import messagebox, filedialog, ttk
 import csv
 from datetime import datetime
-from .mod_sql import DatabaseUploader
+from .mod_lookup import MenuCodeLookup, SEARCH_COLUMNS
 
 def show_missing_codes(missing_codes):
     """
@@ -52,13 +52,12 @@ def search_menu_codes(menu_codes):
             messagebox.showwarning("警告", "請輸入菜牌編號")
             return
             
-        # 建立資料庫連接並搜尋
-        uploader = DatabaseUploader()
-        results = uploader.search_menu_codes(menu_codes)
+        # 分塊查詢所有資料表
+        lookup = MenuCodeLookup(menu_codes)
+        results = list(lookup.rows())
         
         # 檢查哪些編號沒有找到
-        found_codes = {row[5] for row in results}  # 現在菜牌編號是第6個欄位，因為第1個欄位是表名
-        missing_codes = set(menu_codes) - found_codes
+        missing_codes = set(lookup.missing_codes)
         
         if missing_codes:
             # 顯示找不到的編號
@@ -88,9 +87,8 @@ def search_menu_codes(menu_codes):
         # 寫入CSV檔案
         with open(file_path, 'w', newline='', encoding='utf-8-sig') as f:
             writer = csv.writer(f)
-            # 寫入標題，加入表名欄位
-            headers = ["資料表", "序號", "餐廳編號", "餐廳名稱", "餐點編號", "菜牌編號", "餐點名稱", "英文名稱", "建檔日期"]
-            writer.writerow(headers)
+            # 寫入標題，第一欄為表名
+            writer.writerow(SEARCH_COLUMNS)
             # 寫入資料
             for row in results:
                 writer.writerow(row)
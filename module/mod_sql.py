@@ -1,9 +1,18 @@
 import pandas as pd
 from datetime import datetime
 from tkinter import messagebox
-import pymysql
 import os
-from module.config_sql import DB_CONFIG
+import time
+from module.mod_pool import get_pool
+from module.mod_lookup import lookup_menu_codes
+from module.mod_first_seen import get_max_id, record_first_seen
+from module.mod_code_registry import register_codes
+from module.mod_menu_code import code_key
+from module.mod_schema import menu_code_index_missing, DUPLICATES_BLOCKED_MESSAGE
+
+# 寫入資料表的欄位順序
+INSERT_COLUMNS = ['餐廳編號', '餐廳名稱', '餐點編號', '菜牌編號',
+                  '餐點名稱', '英文名稱', '據點', '建檔日期']
 
 class DatabaseUploader:
     def __init__(self):
@@ -11,78 +20,135 @@ class DatabaseUploader:
 
     def connect_database(self):
         try:
-            self.connection = pymysql.connect(**DB_CONFIG)
+            # 從共用連線池借用連線
+            self.connection = get_pool().acquire()
             self.cursor = self.connection.cursor()
+            self.max_packet_size = None
         except Exception as e:
             messagebox.showerror("錯誤", f"資料庫連接失敗：\n{str(e)}")
             raise e
 
     def close_connection(self):
+        """關閉游標並將連線歸還連線池"""
         try:
-            if hasattr(self, 'cursor') and self.cursor:
+            if getattr(self, 'cursor', None):
                 self.cursor.close()
-            if hasattr(self, 'connection') and self.connection:
-                self.connection.close()
+                self.cursor = None
+            if getattr(self, 'connection', None):
+                connection = self.connection
+                self.connection = None
+                get_pool().release(connection)
         except Exception as e:
             print(f"關閉連接時發生錯誤：{str(e)}")
 
-    def search_menu_codes(self, menu_codes):
+    def ensure_connection(self):
+        """確保持有可用的連線，已斷線的連線會先歸還連線池"""
+        if getattr(self, 'connection', None) and self.connection.open:
+            return
+        self.close_connection()
+        self.connect_database()
+
+    def search_menu_codes(self, menu_codes, workers=1):
         """
         搜尋菜牌編號並返回結果
+        編號分塊後以 UNION ALL 一次查詢所有資料表，workers 大於1時以多個連線平行查詢
         """
         try:
-            if not hasattr(self, 'connection') or self.connection.open == False:
-                self.connect_database()
-                
-            # 需要搜尋的表格清單
-            tables = ['med_tpr', 'med_tpx', 'med_sun', 'menu_items']
-            
-            all_results = []
-            
-            # 從每個表格中搜尋菜牌編號
-            for table in tables:
-                # 檢查表格是否存在
-                check_table_sql = f"""
-                SELECT COUNT(*) 
-                FROM information_schema.tables 
-                WHERE table_schema = DATABASE() 
-                AND table_name = '{table}'
-                """
-                self.cursor.execute(check_table_sql)
-                if self.cursor.fetchone()[0] == 0:
-                    continue  # 表格不存在，跳過
-                
-                # 從該表格中搜尋菜牌編號
-                query = f"""
-                SELECT 序號, 餐廳編號, 餐廳名稱, 餐點編號, 菜牌編號, 餐點名稱, 英文名稱, 據點, 建檔日期
-                FROM {table}
-                WHERE 菜牌編號 IN (%s)
-                """
-                placeholders = ','.join(['%s'] * len(menu_codes))
-                if not placeholders:
-                    continue  # 沒有要搜尋的編號，跳過
-                
-                query = query % placeholders
-                
-                self.cursor.execute(query, menu_codes)
-                results = self.cursor.fetchall()
-                
-                # 將表格名稱添加到每一行結果中
-                table_results = [(table,) + row for row in results]
-                all_results.extend(table_results)
-            
-            return all_results
+            results, _ = lookup_menu_codes(menu_codes, workers=workers)
+            return results
             
         except Exception as e:
             messagebox.showerror("錯誤", f"搜尋菜牌編號時發生錯誤：\n{str(e)}")
             print("詳細錯誤：", str(e))
             return []
 
+    def get_max_packet_size(self):
+        """
+        取得伺服器的 max_allowed_packet，作為多列INSERT封包的大小上限
+        """
+        if not self.max_packet_size:
+            self.cursor.execute("SELECT @@max_allowed_packet")
+            # 保留一些空間給封包標頭
+            self.max_packet_size = max(int(self.cursor.fetchone()[0]) - 1024, 1024)
+        return self.max_packet_size
+
+    def build_insert_values(self, data_df, location_name=None):
+        """
+        將DataFrame整欄轉換為INSERT參數，不再逐列iterrows
+        location_name 為空時使用資料本身的據點，空白據點填入'其他'
+        """
+        columns = {}
+        for col in ['餐廳編號', '餐廳名稱', '餐點編號', '菜牌編號', '餐點名稱']:
+            columns[col] = data_df[col].astype(str).str.strip()
+
+        # 处理英文名称，确保即使为NaN或None也能正确处理
+        if '英文名稱' in data_df.columns:
+            eng_names = data_df['英文名稱']
+            columns['英文名稱'] = eng_names.astype(str).str.strip().where(eng_names.notna(), '')
+        else:
+            columns['英文名稱'] = pd.Series('', index=data_df.index)
+
+        if location_name:
+            columns['據點'] = pd.Series(location_name, index=data_df.index)
+        else:
+            locations = data_df['據點']
+            has_location = locations.notna() & (locations != '')
+            columns['據點'] = locations.astype(str).str.strip().where(has_location, '其他')
+
+        columns['建檔日期'] = data_df['建檔日期'].dt.to_pydatetime()
+
+        return list(zip(*(columns[col] for col in INSERT_COLUMNS)))
+
+    def bulk_insert(self, table_name, values):
+        """
+        以單一交易將整批資料寫入資料表
+        pymysql 會把 executemany 合併成多列INSERT，封包大小依 max_allowed_packet 切分
+        菜牌編號已存在的資料由唯一索引略過（ON DUPLICATE KEY UPDATE 不變更任何欄位），
+        其他錯誤（欄位過長、缺少必要欄位等）仍會使整批寫入失敗，不會像 INSERT IGNORE 一樣只變成警告；
+        新寫入的資料同時更新 menu_first_seen 與 restaurant_first_seen
+        返回寫入筆數、略過筆數與耗時（秒）
+        """
+        if not values:
+            return 0, 0, 0.0
+
+        # 沒有唯一索引時重複的菜牌編號無法略過，等刪除重複資料並完成遷移後才能上傳
+        if menu_code_index_missing(self.cursor, table_name):
+            raise RuntimeError(f"{table_name} 尚未建立菜牌編號唯一索引，無法略過重複的菜牌編號。{DUPLICATES_BLOCKED_MESSAGE}")
+
+        # 重複的菜牌編號不更新（影響筆數為 0），新寫入的資料影響筆數為 1
+        insert_sql = f"""
+        INSERT INTO {table_name} 
+        ({', '.join(INSERT_COLUMNS)})
+        VALUES ({', '.join(['%s'] * len(INSERT_COLUMNS))})
+        ON DUPLICATE KEY UPDATE 序號 = 序號
+        """
+
+        self.cursor.max_stmt_length = self.get_max_packet_size()
+
+        start_time = time.perf_counter()
+        try:
+            self.connection.begin()
+            max_id_before = get_max_id(self.cursor, table_name)
+            inserted = self.cursor.executemany(insert_sql, values)
+            # 同一交易內更新菜牌與餐廳的首次出現記錄與編號登記表
+            if inserted:
+                record_first_seen(self.cursor, table_name, max_id_before)
+                register_codes(self.cursor, table_name, code_key, max_id_before)
+            self.connection.commit()
+        except Exception:
+            self.connection.rollback()
+            raise
+        elapsed = time.perf_counter() - start_time
+
+        skipped = len(values) - inserted
+        rate = inserted / elapsed if elapsed > 0 else float(inserted)
+        print(f"{table_name}: 寫入 {inserted} 筆，略過 {skipped} 筆重複，耗時 {elapsed:.2f} 秒（{rate:.0f} 筆/秒）")
+        return inserted, skipped, elapsed
+
     def upload_file(self, file_path):
         try:
             # 確保資料庫連接是開啟的
-            if not hasattr(self, 'connection') or self.connection.open == False:
-                self.connect_database()
+            self.ensure_connection()
 
             # 讀取Excel檔案
             df = pd.read_excel(file_path)
@@ -109,72 +175,11 @@ class DatabaseUploader:
                 '聯發太陽廣場': 'med_sun'
             }
             
-            # 創建所有需要的表（如果不存在）
-            base_table_sql = """
-            CREATE TABLE IF NOT EXISTS {table_name} (
-                序號 INT AUTO_INCREMENT PRIMARY KEY,
-                餐廳編號 VARCHAR(10) NOT NULL,
-                餐廳名稱 VARCHAR(100) NOT NULL,
-                餐點編號 VARCHAR(10) NOT NULL,
-                菜牌編號 VARCHAR(20) NOT NULL,
-                餐點名稱 VARCHAR(100) NOT NULL,
-                英文名稱 VARCHAR(100),
-                據點 VARCHAR(100) NOT NULL,
-                建檔日期 DATETIME NOT NULL
-            ) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci
-            """
-            
-            for table_name in location_map.values():
-                create_table_sql = base_table_sql.format(table_name=table_name)
-                self.cursor.execute(create_table_sql)
-                
-                # 检查表是否已存在"据点"字段，如果不存在则添加
-                check_column_sql = f"""
-                SELECT COUNT(*) 
-                FROM information_schema.columns 
-                WHERE table_schema = DATABASE() 
-                AND table_name = '{table_name}'
-                AND column_name = '據點'
-                """
-                self.cursor.execute(check_column_sql)
-                if self.cursor.fetchone()[0] == 0:
-                    # 添加"据点"字段
-                    alter_table_sql = f"""
-                    ALTER TABLE {table_name}
-                    ADD COLUMN 據點 VARCHAR(100) NOT NULL DEFAULT ''
-                    """
-                    self.cursor.execute(alter_table_sql)
-            
-            # 同样为menu_items表检查并添加"据点"字段
-            check_menu_items_sql = """
-            SELECT COUNT(*) 
-            FROM information_schema.tables 
-            WHERE table_schema = DATABASE() 
-            AND table_name = 'menu_items'
-            """
-            self.cursor.execute(check_menu_items_sql)
-            if self.cursor.fetchone()[0] > 0:
-                # 表已存在，检查是否有"据点"字段
-                check_column_sql = """
-                SELECT COUNT(*) 
-                FROM information_schema.columns 
-                WHERE table_schema = DATABASE() 
-                AND table_name = 'menu_items'
-                AND column_name = '據點'
-                """
-                self.cursor.execute(check_column_sql)
-                if self.cursor.fetchone()[0] == 0:
-                    # 添加"据点"字段
-                    alter_table_sql = """
-                    ALTER TABLE menu_items
-                    ADD COLUMN 據點 VARCHAR(100) NOT NULL DEFAULT ''
-                    """
-                    self.cursor.execute(alter_table_sql)
-            
-            self.connection.commit()
+            # 資料表與索引已由 module.mod_schema 的遷移程序建立
             
             success_count = 0
             skipped_count = 0
+            total_elapsed = 0.0
             
             # 按據點處理數據
             # 確保據點欄位存在
@@ -197,120 +202,30 @@ class DatabaseUploader:
                 if location_df.empty:
                     continue
                 
-                # 檢查該表中現有的菜牌編號
-                check_sql = f"SELECT 菜牌編號 FROM {table_name}"
-                self.cursor.execute(check_sql)
-                existing_codes = {row[0] for row in self.cursor.fetchall()}
-                
-                # 檢查新數據中的菜牌編號是否有重複
-                new_codes = set(location_df['菜牌編號'].astype(str))
-                duplicate_codes = new_codes.intersection(existing_codes)
-                
-                if duplicate_codes:
-                    skipped_count += len(duplicate_codes)
-                    # 從數據框中移除重複的記錄
-                    location_df = location_df[~location_df['菜牌編號'].astype(str).isin(duplicate_codes)]
-                
-                if location_df.empty:
-                    continue
-                
-                # 準備插入語句
-                insert_sql = f"""
-                INSERT INTO {table_name} 
-                (餐廳編號, 餐廳名稱, 餐點編號, 菜牌編號, 
-                 餐點名稱, 英文名稱, 據點, 建檔日期)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                """
-                
-                # 批次處理資料
-                batch_size = 100
-                for i in range(0, len(location_df), batch_size):
-                    batch = location_df.iloc[i:i+batch_size]
-                    values = []
-                    for _, row in batch.iterrows():
-                        # 处理英文名称，确保即使为NaN或None也能正确处理
-                        eng_name = ''
-                        if '英文名稱' in df.columns:
-                            if pd.notna(row['英文名稱']):
-                                eng_name = str(row['英文名稱']).strip()
-                        
-                        values.append((
-                            str(row['餐廳編號']).strip(),
-                            str(row['餐廳名稱']).strip(),
-                            str(row['餐點編號']).strip(),
-                            str(row['菜牌編號']).strip(),
-                            str(row['餐點名稱']).strip(),
-                            eng_name,
-                            location_name,
-                            row['建檔日期']
-                        ))
-                    
-                    self.cursor.executemany(insert_sql, values)
-                    success_count += len(batch)
-                
-                self.connection.commit()
+                # 以單一交易批量寫入該據點資料表，已存在的菜牌編號由伺服器略過
+                inserted, skipped, elapsed = self.bulk_insert(
+                    table_name, self.build_insert_values(location_df, location_name)
+                )
+                success_count += inserted
+                skipped_count += skipped
+                total_elapsed += elapsed
             
             # 處理不屬於指定據點的資料
             other_df = df[~df['據點'].isin(location_map.keys())]
             
             if not other_df.empty:
-                # 為其他據點創建默認表
-                self.cursor.execute(base_table_sql.format(table_name='menu_items'))
-                self.connection.commit()
-                
-                # 檢查默認表中現有的菜牌編號
-                check_sql = "SELECT 菜牌編號 FROM menu_items"
-                self.cursor.execute(check_sql)
-                existing_codes = {row[0] for row in self.cursor.fetchall()}
-                
-                # 檢查新數據中的菜牌編號是否有重複
-                new_codes = set(other_df['菜牌編號'].astype(str))
-                duplicate_codes = new_codes.intersection(existing_codes)
-                
-                if duplicate_codes:
-                    skipped_count += len(duplicate_codes)
-                    # 從數據框中移除重複的記錄
-                    other_df = other_df[~other_df['菜牌編號'].astype(str).isin(duplicate_codes)]
-                
-                if not other_df.empty:
-                    # 準備插入語句
-                    insert_sql = """
-                    INSERT INTO menu_items 
-                    (餐廳編號, 餐廳名稱, 餐點編號, 菜牌編號, 
-                     餐點名稱, 英文名稱, 據點, 建檔日期)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                    """
-                    
-                    # 批次處理資料
-                    batch_size = 100
-                    for i in range(0, len(other_df), batch_size):
-                        batch = other_df.iloc[i:i+batch_size]
-                        values = []
-                        for _, row in batch.iterrows():
-                            # 处理英文名称，确保即使为NaN或None也能正确处理
-                            eng_name = ''
-                            if '英文名稱' in df.columns:
-                                if pd.notna(row['英文名稱']):
-                                    eng_name = str(row['英文名稱']).strip()
-                            
-                            values.append((
-                                str(row['餐廳編號']).strip(),
-                                str(row['餐廳名稱']).strip(),
-                                str(row['餐點編號']).strip(),
-                                str(row['菜牌編號']).strip(),
-                                str(row['餐點名稱']).strip(),
-                                eng_name,
-                                str(row['據點']).strip() if pd.notna(row['據點']) and row['據點'] != '' else '其他',
-                                row['建檔日期']
-                            ))
-                        
-                        self.cursor.executemany(insert_sql, values)
-                        success_count += len(batch)
-                    
-                    self.connection.commit()
+                # 以單一交易批量寫入默認表
+                inserted, skipped, elapsed = self.bulk_insert(
+                    'menu_items', self.build_insert_values(other_df)
+                )
+                success_count += inserted
+                skipped_count += skipped
+                total_elapsed += elapsed
             
             # 顯示處理結果
             result_message = f"成功上傳 {success_count} 筆資料！"
+            if success_count > 0 and total_elapsed > 0:
+                result_message += f"\n寫入速度：{success_count / total_elapsed:.0f} 筆/秒（{total_elapsed:.2f} 秒）"
             if skipped_count > 0:
                 result_message += f"\n已跳過 {skipped_count} 筆重複的菜牌編號。"
             
@@ -1,24 +1,27 @@
-import pandas as pd
-from tkinter import messagebox, filedialog
+import os
+import tkinter as tk
+from tkinter import ttk, messagebox, filedialog
 from datetime import datetime
 from .mod_sql import DatabaseUploader
+from .mod_dump import write_dump_csv, write_dump_xlsx
+from .mod_duplicates import iter_duplicate_report, preview_duplicates, remove_duplicates as remove_duplicate_rows
+from .mod_schema import run_migrations
 
 class DatabaseFunction:
     def __init__(self):
-        self.db = DatabaseUploader()
+        self._db = None
+
+    @property
+    def db(self):
+        """第一次使用時才向連線池借用連線"""
+        if self._db is None:
+            self._db = DatabaseUploader()
+        return self._db
 
     def check_duplicates(self):
-        """檢查資料庫中重複的菜牌編號"""
+        """檢查所有資料表中重複的菜牌編號（表內重複、跨表重複與餐點名稱不一致）"""
         try:
-            query = """
-            SELECT 菜牌編號, COUNT(*) as count
-            FROM menu_items
-            GROUP BY 菜牌編號
-            HAVING COUNT(*) > 1
-            ORDER BY count DESC
-            """
-            self.db.cursor.execute(query)
-            results = self.db.cursor.fetchall()
+            results = list(iter_duplicate_report(self.db.connection))
 
             if not results:
                 messagebox.showinfo("檢查結果", "資料庫中沒有重複的菜牌編號")
@@ -47,8 +50,12 @@ class DatabaseFunction:
             text_area.configure(yscrollcommand=scrollbar.set)
 
             # 插入結果
-            for code, count in results:
-                text_area.insert(tk.END, f"菜牌編號: {code} (重複 {count} 次)\n")
+            for code, count, _, tables, within_table, cross_table, name_mismatch, names in results:
+                flags = [label for label, flag in (("表內重複", within_table), ("跨表重複", cross_table),
+                                                   ("名稱不一致", name_mismatch)) if flag]
+                text_area.insert(tk.END, f"菜牌編號: {code} (重複 {count} 次，{tables}) {'、'.join(flags)}\n")
+                if name_mismatch:
+                    text_area.insert(tk.END, f"    餐點名稱: {names}\n")
 
             # 複製按鈕
             def copy_to_clipboard():
@@ -67,23 +74,9 @@ class DatabaseFunction:
     def remove_duplicates(self):
         """刪除資料庫中重複的菜牌編號"""
         try:
-            # 定義需要檢查的表格
-            tables = ['menu_items', 'med_tpr', 'med_tpx', 'med_sun']
-            all_duplicates = {}
-            
-            # 檢查每個表中的重複項
-            for table in tables:
-                check_query = f"""
-                SELECT 菜牌編號, COUNT(*) as count
-                FROM {table}
-                GROUP BY 菜牌編號
-                HAVING COUNT(*) > 1
-                """
-                self.db.cursor.execute(check_query)
-                duplicates = self.db.cursor.fetchall()
-                
-                if duplicates:
-                    all_duplicates[table] = len(duplicates)
+            # 預覽每個表中的重複項（不刪除資料）
+            preview = preview_duplicates(self.db.connection)
+            all_duplicates = {table: counts for table, counts in preview.items() if counts['codes']}
             
             if not all_duplicates:
                 messagebox.showinfo("提示", "所有表格中都沒有重複的菜牌編號")
@@ -91,83 +84,36 @@ class DatabaseFunction:
             
             # 構建提示訊息
             duplicate_msg = "發現以下重複的菜牌編號：\n"
-            for table, count in all_duplicates.items():
-                duplicate_msg += f"- {table}: {count} 個重複項\n"
+            for table, counts in all_duplicates.items():
+                duplicate_msg += f"- {table}: {counts['codes']} 個重複項（將刪除 {counts['rows']} 筆）\n"
             duplicate_msg += "\n是否要刪除重複項目？（將保留每個編號的最早建檔日期記錄）"
             
             # 詢問用戶是否要刪除
             if not messagebox.askyesno("確認", duplicate_msg):
                 return
             
-            # 執行刪除操作
-            for table in tables:
-                # 首先獲取每個菜牌編號最早的建檔日期記錄的ID
-                self.db.cursor.execute(f"""
-                CREATE TEMPORARY TABLE IF NOT EXISTS temp_earliest_records
-                SELECT MIN(序號) as 最早序號, 菜牌編號
-                FROM {table}
-                GROUP BY 菜牌編號
-                """)
-                
-                # 刪除不在最早記錄列表中的重複項目
-                delete_query = f"""
-                DELETE FROM {table}
-                WHERE 序號 NOT IN (
-                    SELECT 最早序號 FROM temp_earliest_records
-                )
-                AND 菜牌編號 IN (
-                    SELECT 菜牌編號 FROM (
-                        SELECT 菜牌編號
-                        FROM {table}
-                        GROUP BY 菜牌編號
-                        HAVING COUNT(*) > 1
-                    ) AS duplicates
-                )
-                """
-                self.db.cursor.execute(delete_query)
-                
-                # 清理臨時表
-                self.db.cursor.execute("DROP TEMPORARY TABLE IF EXISTS temp_earliest_records")
-            
-            # 提交更改
-            self.db.connection.commit()
+            # 分批刪除，每批一個短交易，進度輸出至主控台
+            deleted = remove_duplicate_rows(self.db.connection)
             
             # 再次檢查是否還有重複項
-            remaining_duplicates = {}
-            for table in tables:
-                check_query = f"""
-                SELECT 菜牌編號, COUNT(*) as count
-                FROM {table}
-                GROUP BY 菜牌編號
-                HAVING COUNT(*) > 1
-                """
-                self.db.cursor.execute(check_query)
-                duplicates = self.db.cursor.fetchall()
-                
-                if duplicates:
-                    remaining_duplicates[table] = len(duplicates)
-            
-            # 計算刪除後的情況
-            deleted_counts = {}
-            for table in tables:
-                self.db.cursor.execute(f"SELECT COUNT(*) FROM {table}")
-                count = self.db.cursor.fetchone()[0]
-                deleted_counts[table] = count
-            
-            # 構建成功訊息
+            remaining_duplicates = {
+                table: counts['codes']
+                for table, counts in preview_duplicates(self.db.connection).items()
+                if counts['codes']
+            }
+            
+            # 構建結果訊息
+            deleted_msg = "\n".join(f"- {table}: 刪除 {count} 筆記錄" for table, count in deleted.items())
             if remaining_duplicates:
                 warning_msg = "已嘗試刪除重複的菜牌編號，但以下表格中仍有重複項：\n"
                 for table, count in remaining_duplicates.items():
                     warning_msg += f"- {table}: 剩餘 {count} 個重複項\n"
-                warning_msg += "\n各表格當前記錄數：\n"
-                for table, count in deleted_counts.items():
-                    warning_msg += f"- {table}: {count} 筆記錄\n"
+                warning_msg += f"\n{deleted_msg}"
                 messagebox.showwarning("警告", warning_msg)
             else:
-                success_msg = "已成功刪除所有重複的菜牌編號。各表格當前記錄數：\n"
-                for table, count in deleted_counts.items():
-                    success_msg += f"- {table}: {count} 筆記錄\n"
-                messagebox.showinfo("成功", success_msg)
+                # 建立先前因重複資料而暫停的菜牌編號唯一索引
+                run_migrations(self.db.connection)
+                messagebox.showinfo("成功", f"已成功刪除所有重複的菜牌編號：\n{deleted_msg}")
 
         except Exception as e:
             messagebox.showerror("錯誤", f"刪除重複時發生錯誤：\n{str(e)}")
@@ -178,7 +124,7 @@ class DatabaseFunction:
             self.db.close_connection()
 
     def download_all(self):
-        """下載資料庫中所有菜牌資料"""
+        """下載資料庫中所有據點的菜牌資料（Excel 每個資料表一個工作表，或合併為單一CSV）"""
         try:
             # 取得當前日期時間作為檔名
             current_time = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -188,34 +134,24 @@ class DatabaseFunction:
             file_path = filedialog.asksaveasfilename(
                 defaultextension=".xlsx",
                 initialfile=default_filename,
-                filetypes=[("Excel files", "*.xlsx"), ("All files", "*.*")]
+                filetypes=[("Excel files", "*.xlsx"), ("CSV files", "*.csv"), ("All files", "*.*")]
             )
             
             if not file_path:
                 return
             
-            # 查詢所有資料
-            query = """
-            SELECT 序號, 餐廳編號, 餐廳名稱, 餐點編號, 菜牌編號, 餐點名稱, 英文名稱, 建檔日期
-            FROM menu_items
-            ORDER BY 序號
-            """
-            self.db.cursor.execute(query)
-            results = self.db.cursor.fetchall()
+            # 依序號分頁讀取所有資料表，邊讀邊寫
+            if file_path.lower().endswith('.csv'):
+                total = write_dump_csv(self.db.connection, file_path)
+            else:
+                total = sum(write_dump_xlsx(self.db.connection, file_path).values())
             
-            if not results:
+            if not total:
+                os.remove(file_path)
                 messagebox.showinfo("提示", "資料庫中沒有資料")
                 return
             
-            # 轉換為DataFrame
-            columns = ["序號", "餐廳編號", "餐廳名稱", "餐點編號", "菜牌編號", 
-                      "餐點名稱", "英文名稱", "建檔日期"]
-            df = pd.DataFrame(results, columns=columns)
-            
-            # 儲存為Excel
-            df.to_excel(file_path, index=False)
-            
-            messagebox.showinfo("成功", f"資料已成功下載至：\n{file_path}")
+            messagebox.showinfo("成功", f"共 {total} 筆資料已成功下載至：\n{file_path}")
 
         except Exception as e:
             messagebox.showerror("錯誤", f"下載資料時發生錯誤：\n{str(e)}")
@@ -2,140 +2,137 @@
 Web版本的功能函數
 將原有的tkinter相關功能改寫為Web版本
 """
-import pandas as pd
-import pymysql
 import os
+import io
+import csv
+import re
+import json
+import time
+import zipfile
 import tempfile
 from datetime import datetime
-from .config_sql import DB_CONFIG
+from .mod_pool import get_pool
+from .mod_lookup import MenuCodeLookup, SEARCH_COLUMNS
+from .mod_csv import read_csv_auto, read_text_auto
+from .mod_export import iter_csv, stream_query, STREAM_BATCH_ROWS
+from .mod3_no_english import (get_export_ranges, save_export_ranges, iter_no_english_rows,
+                              format_no_english_counts, NO_ENGLISH_COLUMNS)
+from .mod_duplicates import (preview_duplicates, iter_remove_duplicates, iter_duplicate_report,
+                             DUPLICATE_REPORT_COLUMNS)
+from .mod_dump import DUMP_FORMATS, iter_dump_csv, iter_dump_csv_gzip, write_dump_xlsx
+from .mod_number import iter_process_menu_codes
+from .mod_schema import run_migrations
+from .mod_menu_code import assign_codes
+from .mod_english import dedupe_english_rows, update_english_names, ENGLISH_TABLES
 
-def download_no_english_menus_web():
+# 網頁查詢菜牌編號時平行查詢的連線數
+SEARCH_WORKERS = 2
+
+# 菜牌編號 API 每次最多查詢的筆數
+MENU_CODE_API_MAX_ITEMS = 5000
+
+def lookup_menu_codes_web(pairs):
+    """
+    Web版本：取得 (餐廳名稱, 餐點名稱) 的菜牌編號，不使用 pandas
+    返回與輸入順序相同的 [{'restaurant', 'menu', 'restaurant_code', 'menu_code', 'code', 'collision'}]
+    """
+    codes = assign_codes(pairs)
+    results = []
+    for restaurant, menu in pairs:
+        restaurant_code, menu_code, code, collision = codes[(restaurant, menu)]
+        results.append({'restaurant': restaurant, 'menu': menu, 'restaurant_code': restaurant_code,
+                        'menu_code': menu_code, 'code': code, 'collision': collision})
+    return results
+
+# 批次產生菜牌編號的處理報告欄位
+MENU_CODE_REPORT_COLUMNS = ["原始檔案", "結果檔案", "耗時（秒）", "錯誤訊息"]
+
+def generate_menu_codes_web(uploads, zip_path, workers=None):
+    """
+    Web版本：平行產生多個檔案的菜牌編號並檢查檔案之間的衝突，結果依上傳順序寫入同一個ZIP
+    uploads 為 [(已儲存的檔案路徑, 原始檔名)]，ZIP 內另附處理報告CSV
+    返回 (每個檔案的處理結果清單, 總耗時秒數)，結果為 {'original', 'processed', 'seconds', 'error'}
+    """
+    original_names = dict(uploads)
+    upload_order = {file_path: index for index, (file_path, _) in enumerate(uploads)}
+    used_names = set()
+    results = []
+    start_time = time.perf_counter()
+
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for file_path, new_file_path, error, seconds in iter_process_menu_codes(original_names, workers):
+            original = original_names[file_path]
+            processed = None
+            if not error:
+                # 以原始檔名命名結果檔案，同名時加上序號
+                base_name = os.path.splitext(original)[0]
+                processed = f"{base_name}_with_codes.xlsx"
+                counter = 1
+                while processed in used_names:
+                    counter += 1
+                    processed = f"{base_name}_with_codes_{counter}.xlsx"
+                used_names.add(processed)
+                archive.write(new_file_path, processed)
+                os.remove(new_file_path)
+            results.append((upload_order[file_path], {'original': original, 'processed': processed,
+                                                      'seconds': round(seconds, 2), 'error': error}))
+
+        # 依上傳順序排列處理報告
+        results = [result for _, result in sorted(results, key=lambda item: item[0])]
+        report = io.StringIO()
+        writer = csv.writer(report)
+        writer.writerow(MENU_CODE_REPORT_COLUMNS)
+        for result in results:
+            writer.writerow([result['original'], result['processed'] or '', result['seconds'], result['error'] or ''])
+        archive.writestr("處理報告.csv", '\ufeff' + report.getvalue())
+
+    return results, round(time.perf_counter() - start_time, 2)
+
+def download_no_english_menus_web(delta=False):
     """
     Web版本：下載資料庫中所有沒有英文的菜單資料
-    返回檔案路徑而不是使用tkinter對話框
+    delta 為 True 時只下載上次匯出後新增的資料
+    返回 (檔名, ClosingStream)，沒有資料時返回 None
+    資料由不緩衝游標逐批讀出並直接送往瀏覽器，不產生暫存檔；增量匯出在全部送出後才更新匯出位置
+    呼叫端需在回應結束時呼叫 ClosingStream.close() 歸還連線（response.call_on_close）
     """
-    try:
-        # 連接到MySQL資料庫
-        connection = pymysql.connect(**DB_CONFIG)
-        cursor = connection.cursor()
-        
-        # 取得當前日期時間作為檔名
-        current_time = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"menu_no_english_{current_time}.csv"
-        
-        # 使用臨時目錄
-        temp_dir = tempfile.gettempdir()
-        file_path = os.path.join(temp_dir, filename)
-        
-        # 需要查詢的資料表
-        tables = ['med_sun', 'med_tpr', 'med_tpx']
-        
-        all_results = []
-        table_raw_counts = {}  # 紀錄每個表格的原始資料數量
-        table_unique_counts = {}  # 紀錄每個表格去重後的資料數量
-        
-        # 從每個資料表中獲取沒有英文名稱的菜單資料
-        for table in tables:
-            # 檢查表格是否存在
-            check_table_sql = f"""
-            SELECT COUNT(*) 
-            FROM information_schema.tables 
-            WHERE table_schema = DATABASE() 
-            AND table_name = '{table}'
-            """
-            cursor.execute(check_table_sql)
-            if cursor.fetchone()[0] == 0:
-                continue  # 表格不存在，跳過
-            
-            # 首先獲取原始資料數量
-            raw_count_query = f"""
-            SELECT COUNT(*)
-            FROM {table}
-            WHERE 英文名稱 IS NULL OR 英文名稱 = ''
-            """
-            cursor.execute(raw_count_query)
-            table_raw_counts[table] = cursor.fetchone()[0]
-            
-            # 從該表格中查詢沒有英文名稱的資料
-            query = f"""
-            SELECT 序號, 餐廳編號, 餐廳名稱, 據點, 餐點編號, 菜牌編號, 餐點名稱, 英文名稱, 建檔日期
-            FROM {table}
-            WHERE 英文名稱 IS NULL OR 英文名稱 = ''
-            ORDER BY 菜牌編號
-            """
-            
-            cursor.execute(query)
-            results = cursor.fetchall()
-            
-            # 將結果轉換為DataFrame進行據點內去重
-            columns = ["序號", "餐廳編號", "餐廳名稱", "據點", "餐點編號", "菜牌編號", 
-                     "餐點名稱", "英文名稱", "建檔日期"]
-            table_df = pd.DataFrame(results, columns=columns)
-            
-            # 記錄去重前的資料筆數
-            before_dedup = len(table_df)
-            
-            # 按據點和餐點編號去重，保留第一筆出現的資料
-            table_df = table_df.drop_duplicates(subset=['據點', '餐點編號'], keep='first')
-            
-            # 記錄去重後的資料筆數
-            after_dedup = len(table_df)
-            table_unique_counts[table] = after_dedup
-            
-            # 將表格名稱添加到每一行結果中
-            for _, row in table_df.iterrows():
-                # 將Series轉換為列表
-                row_list = row.tolist()
-                # 添加表格名稱
-                row_list.append(table)
-                # 將列表轉換為元組，並添加到結果列表中
-                all_results.append(tuple(row_list))
-        
-        if not all_results:
-            return None  # 沒有資料
-        
-        # 轉換為DataFrame
-        columns = ["序號", "餐廳編號", "餐廳名稱", "據點", "餐點編號", "菜牌編號", 
-                  "餐點名稱", "英文名稱", "建檔日期", "資料表"]
-        df = pd.DataFrame(all_results, columns=columns)
-        
-        # 按照菜牌編號排序
-        df = df.sort_values(by='菜牌編號')
-        
-        # 儲存為CSV，設定編碼為UTF-8以支援中文
-        df.to_csv(file_path, index=False, encoding='utf-8-sig')
-        
-        return file_path
+    counts = {}
+    ranges = {}
 
-    except Exception as e:
-        print(f"下載無英文菜單資料時發生錯誤：{str(e)}")
-        return None
-    finally:
-        # 關閉資料庫連接
-        if 'cursor' in locals() and cursor:
-            cursor.close()
-        if 'connection' in locals() and connection:
-            connection.close()
+    def produce(connection):
+        ranges.update(get_export_ranges(connection, delta))
+        return iter_no_english_rows(connection, counts, ranges)
+
+    def save_ranges(connection):
+        # 只有增量匯出會移動匯出位置，完整匯出不影響下次增量匯出的範圍
+        if delta:
+            save_export_ranges(connection, ranges)
+
+    def render(connection, rows):
+        yield from iter_csv(NO_ENGLISH_COLUMNS, rows)
+        save_ranges(connection)
+        total = sum(c['unique'] for c in counts.values())
+        print(f"無英文菜單資料筆數：\n{format_no_english_counts(counts)}\n總計：{total} 筆資料")
+
+    # 沒有資料也代表增量匯出已匯出到目前位置
+    content = stream_query(get_pool(), produce, render, on_empty=save_ranges)
+    if content is None:
+        return None  # 沒有資料
+
+    current_time = datetime.now().strftime("%Y%m%d_%H%M%S")
+    prefix = "menu_no_english_delta" if delta else "menu_no_english"
+    return f"{prefix}_{current_time}.csv", content
 
 def upload_english_names_web(file_path):
     """
     Web版本：上傳菜單英文名稱至資料庫功能
     """
     try:
-        # 嘗試不同的編碼讀取CSV檔案
-        encodings = ['utf-8-sig', 'utf-8', 'big5', 'cp950', 'gbk']
-        df = None
-        
-        for encoding in encodings:
-            try:
-                df = pd.read_csv(file_path, encoding=encoding)
-                break
-            except UnicodeDecodeError:
-                continue
-            except Exception as e:
-                print(f"嘗試使用 {encoding} 編碼讀取失敗: {str(e)}")
-        
-        if df is None:
+        # 自動判斷編碼後只解析一次
+        try:
+            df = read_csv_auto(file_path)
+        except UnicodeDecodeError as e:
+            print(f"無法判斷CSV檔案編碼: {str(e)}")
             return False
         
         # 檢查必要欄位
@@ -150,82 +147,24 @@ def upload_english_names_web(file_path):
         # 將空白字符串和NaN都視為空值
         df['英文名稱'] = df['英文名稱'].fillna('').str.strip()
         
-        # 找出重複的菜牌編號
-        duplicates = df[df.duplicated(subset=['菜牌編號', '資料表'], keep=False)]
-        if not duplicates.empty:
-            # 將重複記錄按 菜牌編號和資料表 分組
-            grouped = df.groupby(['菜牌編號', '資料表'])
-            
-            # 新的DataFrame，用於存放處理後的資料
-            new_df_rows = []
-            removed_count = 0
-            
-            for (menu_code, table_name), group in grouped:
-                if len(group) > 1:
-                    # 有重複的菜牌編號
-                    # 按英文名稱是否為空來排序，非空的排在前面
-                    sorted_group = group.sort_values(by='英文名稱', key=lambda x: x.str.len() > 0, ascending=False)
-                    # 只保留第一筆記錄（有英文名稱的）
-                    new_df_rows.append(sorted_group.iloc[0])
-                    removed_count += len(group) - 1
-                else:
-                    # 沒有重複的菜牌編號，直接保留
-                    new_df_rows.append(group.iloc[0])
-            
-            # 創建新的DataFrame
-            df = pd.DataFrame(new_df_rows)
-            
-            if removed_count > 0:
-                print(f"已移除 {removed_count} 筆重複的菜牌編號記錄（保留有英文名稱的記錄）")
-        
-        # 資料庫連接
-        connection = pymysql.connect(**DB_CONFIG)
-        cursor = connection.cursor()
-        
-        # 根據資料表分組
-        table_groups = df.groupby('資料表')
+        # 同一菜牌編號與資料表只保留一筆（優先保留有英文名稱的記錄）
+        df, removed_count = dedupe_english_rows(df)
+        if removed_count > 0:
+            print(f"已移除 {removed_count} 筆重複的菜牌編號記錄（保留有英文名稱的記錄）")
         
-        # 初始化計數器
-        total_records = 0
-        updated_records = 0
-        error_records = 0
+        # 確認資料表名稱是否有效
+        for table_name in sorted(set(df['資料表'].astype(str)) - set(ENGLISH_TABLES)):
+            print(f"無效的資料表名稱：{table_name}")
         
-        # 處理每個資料表
-        for table_name, group_df in table_groups:
-            # 確認資料表名稱是否有效
-            if table_name not in ['med_sun', 'med_tpr', 'med_tpx']:
-                print(f"無效的資料表名稱：{table_name}")
-                continue
-            
-            # 更新該資料表中的英文名稱
-            for _, row in group_df.iterrows():
-                menu_code = row['菜牌編號']
-                english_name = row['英文名稱']
-                
-                # 如果英文名稱為空，則跳過
-                if not english_name:
-                    print(f"警告：菜牌編號 {menu_code} 的英文名稱為空")
-                    continue
-                
-                # 檢查菜牌編號是否存在
-                check_sql = f"SELECT COUNT(*) FROM {table_name} WHERE 菜牌編號 = %s"
-                cursor.execute(check_sql, (menu_code,))
-                if cursor.fetchone()[0] == 0:
-                    print(f"警告：資料表 {table_name} 中找不到菜牌編號 {menu_code}")
-                    error_records += 1
-                    continue
-                
-                # 更新英文名稱
-                update_sql = f"UPDATE {table_name} SET 英文名稱 = %s WHERE 菜牌編號 = %s"
-                cursor.execute(update_sql, (english_name, menu_code))
-                updated_records += cursor.rowcount
-                
-            total_records += len(group_df)
+        # 從連線池借用資料庫連線，經暫存資料表一次更新各資料表
+        connection = get_pool().acquire()
+        stats = update_english_names(connection, df)
         
-        # 提交變更
-        connection.commit()
+        total_records = sum(table_stats['total'] for table_stats in stats.values())
+        updated_records = sum(table_stats['updated'] for table_stats in stats.values())
+        error_records = sum(table_stats['not_found'] for table_stats in stats.values())
         
-        print(f"英文名稱上傳完成：總計 {total_records} 筆資料，成功更新 {updated_records} 筆")
+        print(f"英文名稱上傳完成：總計 {total_records} 筆資料，成功更新 {updated_records} 筆，找不到 {error_records} 筆")
         
         return True
         
@@ -233,81 +172,93 @@ def upload_english_names_web(file_path):
         print(f"上傳英文名稱時發生錯誤：{str(e)}")
         return False
     finally:
-        # 關閉資料庫連接
-        if 'cursor' in locals() and cursor:
-            cursor.close()
+        # 歸還資料庫連線
         if 'connection' in locals() and connection:
-            connection.close()
+            get_pool().release(connection)
 
-def export_new_menus_web(date_range):
+def _export_new_records_web(date_range, export_workbook, file_prefix):
     """
-    Web版本：導出指定日期區間內的新菜牌
+    將各據點的新記錄寫入同一個工作簿（每個資料表一個工作表）
+    工作簿寫入匿名暫存檔，不在 export/ 產生檔案，回應送出後由 Flask 關閉並自動刪除
+    返回 (檔名, 檔案物件, 各資料表筆數)，沒有資料時返回 None
     """
+    output = tempfile.TemporaryFile()
     try:
-        from .mod4_new_menu_restaurant import MenuRestaurantExporter
-        
-        exporter = MenuRestaurantExporter()
-        
-        # 解析日期範圍
-        if '-' in date_range:
-            start_date, end_date = date_range.split('-')
-        else:
-            start_date = end_date = date_range
-        
-        # 生成檔案
-        current_time = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"new_menus_{date_range}_{current_time}.xlsx"
-        
-        # 使用臨時目錄
-        temp_dir = tempfile.gettempdir()
-        file_path = os.path.join(temp_dir, filename)
-        
-        # 調用導出功能（需要修改原函數以支援 Web 版本）
-        result = exporter.export_new_menus_web(start_date, end_date, file_path)
-        
-        if result:
-            return file_path
-        else:
-            return None
-            
-    except Exception as e:
-        print(f"導出新菜牌時發生錯誤：{str(e)}")
+        counts = export_workbook(date_range, output)
+    except Exception:
+        output.close()
+        raise
+
+    if not sum(counts.values()):
+        output.close()
         return None
 
+    output.seek(0)
+    current_time = datetime.now().strftime("%Y%m%d_%H%M%S")
+    filename = f"{file_prefix}_{date_range}_{current_time}.xlsx"
+    return filename, output, counts
+
+def export_new_menus_web(date_range):
+    """
+    Web版本：導出指定日期區間內的新菜牌
+    日期格式錯誤時拋出 ValueError
+    """
+    from .mod4_new_menu_restaurant import MenuRestaurantExporter
+    
+    exporter = MenuRestaurantExporter()
+    return _export_new_records_web(date_range, exporter.export_new_menus_workbook, "new_menus")
+
 def export_new_restaurants_web(date_range):
     """
     Web版本：導出指定日期區間內的新餐廳
+    日期格式錯誤時拋出 ValueError
+    """
+    from .mod4_new_menu_restaurant import MenuRestaurantExporter
+    
+    exporter = MenuRestaurantExporter()
+    return _export_new_records_web(date_range, exporter.export_new_restaurants_workbook, "new_restaurants")
+
+def preview_duplicates_web():
+    """
+    Web版本：預覽各資料表重複的菜牌編號，不刪除任何資料
+    返回 {資料表: {'codes': 重複的菜牌編號數, 'rows': 將被刪除的筆數}}
+    """
+    with get_pool().connection() as connection:
+        return preview_duplicates(connection)
+
+def iter_remove_duplicates_web():
+    """
+    Web版本：分批刪除重複的菜牌編號，以 NDJSON 逐行回報進度
+    每批一行 {'table', 'deleted', 'total'}，最後一行 {'done': true, 'deleted': {...}, 'migrated': [...]}
+    或 {'done': true, 'error': ...}；刪除完成後重新執行遷移，建立先前因重複資料而暫停的唯一索引
     """
+    connection = get_pool().acquire()
+    deleted = {}
     try:
-        from .mod4_new_menu_restaurant import MenuRestaurantExporter
-        
-        exporter = MenuRestaurantExporter()
-        
-        # 解析日期範圍
-        if '-' in date_range:
-            start_date, end_date = date_range.split('-')
-        else:
-            start_date = end_date = date_range
-        
-        # 生成檔案
-        current_time = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"new_restaurants_{date_range}_{current_time}.xlsx"
-        
-        # 使用臨時目錄
-        temp_dir = tempfile.gettempdir()
-        file_path = os.path.join(temp_dir, filename)
-        
-        # 調用導出功能（需要修改原函數以支援 Web 版本）
-        result = exporter.export_new_restaurants_web(start_date, end_date, file_path)
-        
-        if result:
-            return file_path
-        else:
-            return None
-            
+        for step in iter_remove_duplicates(connection):
+            deleted[step['table']] = step['deleted']
+            yield json.dumps(step, ensure_ascii=False) + "\n"
+        migrated = run_migrations(connection)
+        yield json.dumps({'done': True, 'deleted': deleted, 'migrated': migrated}, ensure_ascii=False) + "\n"
     except Exception as e:
-        print(f"導出新餐廳時發生錯誤：{str(e)}")
-        return None
+        print(f"刪除重複資料時發生錯誤：{str(e)}")
+        yield json.dumps({'done': True, 'deleted': deleted, 'error': str(e)}, ensure_ascii=False) + "\n"
+    finally:
+        get_pool().release(connection)
+
+def download_duplicate_report_web():
+    """
+    Web版本：跨資料表重複菜牌編號報表
+    返回 (檔名, ClosingStream)，沒有重複時返回 None
+    呼叫端需在回應結束時呼叫 ClosingStream.close() 歸還連線（response.call_on_close）
+    """
+    content = stream_query(get_pool(), iter_duplicate_report,
+                           lambda connection, rows: iter_csv(DUPLICATE_REPORT_COLUMNS, rows))
+    if content is None:
+        return None  # 沒有重複
+
+    current_time = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return f"menu_duplicates_{current_time}.csv", content
 
 def convert_csv_to_unicode_txt_web(file_paths):
     """
@@ -329,10 +280,9 @@ def convert_csv_to_unicode_txt_web(file_paths):
             new_filename = f"{name}_{current_time}_BOM.txt"
             new_file_path = os.path.join(temp_dir, new_filename)
             
-            # 讀取CSV並轉換
+            # 讀取CSV並轉換（自動判斷原始編碼）
             try:
-                with open(file_path, 'r', encoding='utf-8') as infile:
-                    content = infile.read()
+                content = read_text_auto(file_path)
                 
                 # 寫入帶BOM的UTF-8檔案
                 with open(new_file_path, 'w', encoding='utf-8-sig') as outfile:
@@ -354,34 +304,114 @@ def convert_csv_to_unicode_txt_web(file_paths):
         print(f"轉換CSV到TXT時發生錯誤：{str(e)}")
         return []
 
-def download_all_web():
+def download_all_web(fmt='xlsx'):
     """
-    Web版本：下載所有菜牌資料
+    Web版本：下載所有據點的菜牌資料
+    fmt 為 'csv'、'gz'（gzip壓縮的CSV）或 'xlsx'
+    返回 (檔名, 內容, MIME 類型)；CSV 的內容為串流產生器，Excel 為暫存檔案物件
     """
-    try:
-        from .mod_sql_function import DatabaseFunction
-        
-        db_function = DatabaseFunction()
-        
-        # 生成檔案
-        current_time = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"all_menu_data_{current_time}.xlsx"
-        
-        # 使用臨時目錄
-        temp_dir = tempfile.gettempdir()
-        file_path = os.path.join(temp_dir, filename)
-        
-        # 調用下載功能（需要修改原函數以支援 Web 版本）
-        result = db_function.download_all_web(file_path)
-        
-        if result:
-            return file_path
-        else:
-            return None
-            
-    except Exception as e:
-        print(f"下載所有菜牌資料時發生錯誤：{str(e)}")
-        return None
-    finally:
-        if 'db_function' in locals():
-            db_function.db.close_connection()
+    if fmt not in DUMP_FORMATS:
+        raise ValueError(f"不支援的格式：{fmt}")
+    extension, mimetype = DUMP_FORMATS[fmt]
+    current_time = datetime.now().strftime("%Y%m%d_%H%M%S")
+    filename = f"all_menu_data_{current_time}.{extension}"
+
+    if fmt == 'xlsx':
+        # Excel 需要完整寫完才能送出，寫入匿名暫存檔，送出後自動刪除
+        output = tempfile.TemporaryFile()
+        try:
+            with get_pool().connection() as connection:
+                write_dump_xlsx(connection, output)
+        except Exception:
+            output.close()
+            raise
+        output.seek(0)
+        return filename, output, mimetype
+
+    def generate():
+        # 串流期間借用連線，依序號分頁讀取，送完後歸還
+        with get_pool().connection() as connection:
+            if fmt == 'gz':
+                yield from iter_dump_csv_gzip(connection)
+            else:
+                yield from iter_dump_csv(connection)
+
+    return filename, generate(), mimetype
+
+def parse_menu_code_list(text):
+    """
+    解析貼上或上傳的菜牌編號清單
+    CSV 有「菜牌編號」標題時只取該欄，否則以換行、逗號、空白分隔
+    """
+    if not text:
+        return []
+
+    first_line = text.lstrip('\ufeff').split('\n', 1)[0]
+    if '菜牌編號' in first_line:
+        reader = csv.DictReader(io.StringIO(text.lstrip('\ufeff')))
+        return [row['菜牌編號'].strip() for row in reader if row.get('菜牌編號') and row['菜牌編號'].strip()]
+
+    return [code for code in re.split(r'[\s,，;；]+', text) if code]
+
+def _format_search_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return value
+
+def iter_menu_code_search_csv(menu_codes):
+    """
+    Web版本：以串流方式產生菜牌編號查詢結果CSV
+    欄位與桌面版相同，最後附上找不到的菜牌編號
+    """
+    lookup = MenuCodeLookup(menu_codes, workers=SEARCH_WORKERS)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    # BOM 讓 Excel 正確辨識 UTF-8
+    buffer.write('\ufeff')
+    writer.writerow(SEARCH_COLUMNS)
+
+    pending = 0
+    for row in lookup.rows():
+        writer.writerow([_format_search_value(value) for value in row])
+        pending += 1
+        if pending >= STREAM_BATCH_ROWS:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+            pending = 0
+
+    missing_codes = lookup.missing_codes
+    if missing_codes:
+        writer.writerow([])
+        writer.writerow([f"找不到的菜牌編號（{len(missing_codes)} 個）"])
+        for code in missing_codes:
+            writer.writerow([code])
+
+    yield buffer.getvalue()
+
+def iter_menu_code_search_json(menu_codes):
+    """
+    Web版本：以串流方式產生菜牌編號查詢結果JSON
+    格式：{"columns": [...], "rows": [...], "found_count": n, "missing_codes": [...]}
+    """
+    lookup = MenuCodeLookup(menu_codes, workers=SEARCH_WORKERS)
+
+    yield '{"columns": ' + json.dumps(SEARCH_COLUMNS, ensure_ascii=False) + ', "rows": ['
+
+    chunk = []
+    for row in lookup.rows():
+        row_json = json.dumps([_format_search_value(value) for value in row], ensure_ascii=False)
+        chunk.append(row_json if lookup.row_count == 1 else ',' + row_json)
+        if len(chunk) >= STREAM_BATCH_ROWS:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+    yield (
+        '], "found_count": ' + str(lookup.row_count)
+        + ', "missing_codes": ' + json.dumps(lookup.missing_codes, ensure_ascii=False) + '}'
+    )
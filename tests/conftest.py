@@ -0,0 +1,111 @@
+"""
+測試共用設定
+測試不需要 MySQL：資料庫連線以假物件取代
+"""
+import os
+import sys
+from contextlib import contextmanager
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+class FakeCursor:
+    """記錄執行過的 SQL，查詢結果由 handler(sql, params) 決定"""
+    def __init__(self, handler=None):
+        self.handler = handler or (lambda sql, params: [])
+        self.executed = []
+        self.rows = []
+        self.description = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def execute(self, sql, params=None):
+        self.executed.append((sql, params))
+        self.rows = list(self.handler(sql, params) or [])
+        return len(self.rows)
+
+    def executemany(self, sql, values):
+        values = list(values)
+        self.executed.append((sql, values))
+        return len(values)
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    def fetchmany(self, size):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, handler=None):
+        self.handler = handler
+        self.cursors = []
+        self.open = True
+
+    def cursor(self, *args):
+        cursor = FakeCursor(self.handler)
+        self.cursors.append(cursor)
+        return cursor
+
+    def begin(self):
+        pass
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class CountingPool:
+    """記錄借出中的連線數的連線池"""
+    def __init__(self, handler=None):
+        self.handler = handler
+        self.in_use = 0
+        self.acquired = 0
+        self.connections = []
+
+    def acquire(self):
+        self.in_use += 1
+        self.acquired += 1
+        connection = FakeConnection(self.handler)
+        self.connections.append(connection)
+        return connection
+
+    def executed(self):
+        """所有借出的連線執行過的 SQL"""
+        return [sql for connection in self.connections
+                for cursor in connection.cursors
+                for sql, _ in cursor.executed]
+
+    def release(self, connection):
+        self.in_use -= 1
+
+    @contextmanager
+    def connection(self):
+        connection = self.acquire()
+        try:
+            yield connection
+        finally:
+            self.release(connection)
+
+
+@pytest.fixture
+def fake_cursor():
+    return FakeCursor
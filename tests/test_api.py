@@ -0,0 +1,32 @@
+"""JSON API 的輸入檢查：格式不符時返回 400 與錯誤訊息，不會產生 500"""
+import pytest
+
+
+@pytest.fixture
+def client():
+    from app import app
+    return app.test_client()
+
+
+@pytest.mark.parametrize('payload', [['A', 'B'], 'ABC', 3, {'menu_codes': 5}, {'menu_codes': {'a': 1}}])
+def test_search_menu_codes_rejects_malformed_json(client, payload):
+    response = client.post('/api/search_menu_codes', json=payload)
+
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+    assert 'menu_codes' in response.get_json()['message']
+
+
+def test_search_menu_codes_requires_codes(client):
+    response = client.post('/api/search_menu_codes', json={'menu_codes': []})
+
+    assert response.status_code == 400
+    assert response.get_json()['message'] == '請提供菜牌編號'
+
+
+@pytest.mark.parametrize('payload', [[{'restaurant': '好吃店', 'menu': '牛肉麵'}], 'x', {'items': 'x'}])
+def test_menu_codes_rejects_malformed_json(client, payload):
+    response = client.post('/api/menu_codes', json=payload)
+
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
@@ -0,0 +1,65 @@
+"""刪除重複菜牌編號：同一交易內重新計算首次出現記錄與編號登記"""
+import pytest
+
+from conftest import FakeConnection
+from module import mod_duplicates
+from module.mod_code_registry import get_registry_cache
+from module.mod_menu_code import code_key
+
+
+class Catalog:
+    tables = {'med_tpr', 'menu_first_seen', 'restaurant_first_seen', 'code_registry'}
+
+    def existing_tables(self, table_names):
+        return [name for name in table_names if name in self.tables]
+
+    def table_exists(self, table_name):
+        return table_name in self.tables
+
+
+def database():
+    """med_tpr 中序號 2 與序號 1 的菜牌編號重複，序號 2 的餐點名稱不同"""
+    batches = [[(2, 'ABC-1', '餐廳', 'TPR', '舊名稱')]]
+
+    def handler(sql, params):
+        if '待刪除筆數' in sql:
+            return [('med_tpr', 1, 1)]
+        if 'JOIN med_tpr k' in sql:
+            return batches.pop(0) if batches else []
+        if sql.startswith('DELETE FROM med_tpr'):
+            return [None] * len(params)  # 刪除筆數
+        return []  # 已沒有同名的資料可重新登記
+    return handler
+
+
+@pytest.fixture
+def connection(monkeypatch):
+    monkeypatch.setattr(mod_duplicates, 'get_catalog', lambda: Catalog())
+    return FakeConnection(database())
+
+
+def executed(connection):
+    return [(sql, params) for cursor in connection.cursors for sql, params in cursor.executed]
+
+
+def test_remove_duplicates_refreshes_first_seen_and_registry(connection):
+    cache = get_registry_cache()
+    cache.put_many({code_key('餐廳', '舊名稱'): ('ABC', '1', 'ABC-1')})
+
+    assert mod_duplicates.remove_duplicates(connection, progress=None) == {'med_tpr': 1}
+
+    statements = executed(connection)
+    first_seen = [(sql, params) for sql, params in statements if 'first_seen' in sql]
+    assert ('DELETE FROM menu_first_seen WHERE 資料表 = %s AND 菜牌編號 IN (%s)', ['med_tpr', 'ABC-1']) in first_seen
+    assert any('INSERT INTO menu_first_seen' in sql and 'src.菜牌編號 IN (%s)' in sql for sql, _ in first_seen)
+    assert any('INSERT INTO restaurant_first_seen' in sql and params == ['med_tpr', '餐廳', 'TPR']
+               for sql, params in first_seen)
+
+    registry_deletes = [params for sql, params in statements if sql.startswith('DELETE FROM code_registry')]
+    assert registry_deletes == [list(code_key('餐廳', '舊名稱')) + ['ABC-1']]
+    assert cache.get_many([code_key('餐廳', '舊名稱')]) == {}
+
+
+def test_duplicate_batch_returns_names_for_refresh():
+    sql = mod_duplicates.build_duplicate_batch_sql('med_tpr')
+    assert 'SELECT DISTINCT d.序號, d.菜牌編號, d.餐廳名稱, d.據點, d.餐點名稱' in sql
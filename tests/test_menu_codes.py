@@ -0,0 +1,239 @@
+"""菜牌編號：批次產生的結果與逐列計算相同"""
+import pandas as pd
+import pytest
+
+from module.mod_code_registry import CodeRegistry, get_registry_cache, register_codes
+from module import mod_number
+from module.mod_menu_code import assign_codes, code_key
+from module.mod_number import (process_menu_codes, iter_process_menu_codes, convert_to_code, generate_menu_code,
+                               normalize_source)
+
+
+def offline_registry():
+    return CodeRegistry(normalize_source, use_database=False)
+
+
+def test_process_menu_codes_matches_per_row(tmp_path):
+    file_path = tmp_path / 'menu.xlsx'
+    pd.DataFrame({
+        '餐廳': ['好吃店', '好吃店', '海鮮樓', 'Good Food', '好吃店'],
+        '餐點名稱': ['牛肉麵', '炒飯', '牛肉麵', 'Caesar Salad', '牛肉麵'],
+    }).to_excel(file_path, index=False)
+
+    new_file_path, error = process_menu_codes(str(file_path), offline_registry())
+
+    assert error is None
+    df = pd.read_excel(new_file_path, keep_default_na=False)
+    assert df['餐廳編號'].tolist() == df['餐廳'].apply(convert_to_code).tolist()
+    assert df['餐點編號'].tolist() == df['餐點名稱'].apply(generate_menu_code).tolist()
+    assert df['菜牌編號'].tolist() == (df['餐廳編號'] + '-' + df['餐點編號']).tolist()
+    assert df['編號衝突'].tolist() == [''] * 5
+
+
+def test_code_functions_do_not_load_pandas():
+    # 資料庫遷移與編號計算不應載入 pandas
+    import subprocess
+    import sys
+    from conftest import ROOT
+    script = ("import sys, module.mod_menu_code, module.mod_schema; "
+              "print('pandas' in sys.modules, 'numpy' in sys.modules)")
+    result = subprocess.run([sys.executable, '-c', script], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+    assert result.stdout.split() == ['False', 'False']
+
+
+# 原本逐列計算編號的做法（lazy_pinyin），作為比對基準
+def baseline_code(restaurant_name, menu_name):
+    import hashlib
+    import re
+    from pypinyin import lazy_pinyin
+
+    name = re.sub(r'[^\w\s\u4e00-\u9fff]', '', restaurant_name)
+    if any('\u4e00' <= char <= '\u9fff' for char in name):
+        restaurant_code = ''.join([word[0] for word in lazy_pinyin(name)]).upper()[:5]
+    else:
+        restaurant_code = re.sub(r'\s+', '', name).upper()[:5]
+
+    hash_value = hashlib.md5(''.join(e for e in menu_name if e.isalnum()).encode('utf-8')).hexdigest()
+    numbers = ''.join([str(int(hash_value[i:i+2], 16) % 10) for i in range(0, 4, 2)])[:2]
+    letters = ''.join([chr(65 + int(hash_value[i:i+2], 16) % 26) for i in range(4, 16, 2)])[:6]
+    return f"{restaurant_code}-{numbers}{letters}"
+
+
+SPELLINGS = [('好吃店', '牛肉麵'), ('好 吃店', '牛肉麵'), ('好吃店!', '牛肉 麵'), ('Good Food', 'Caesar Salad')]
+
+
+@pytest.fixture
+def registry_cache():
+    cache = get_registry_cache()
+    cache.clear()
+    yield cache
+    cache.clear()
+
+
+def test_assign_codes_matches_baseline_for_each_spelling(registry_cache):
+    codes = assign_codes(SPELLINGS, offline_registry())
+
+    assert codes[('好吃店', '牛肉麵')][2] == 'HCD-20NOHKHU'
+    assert codes[('好 吃店', '牛肉麵')][2] == 'H CD-20NOHKHU'
+    for pair in SPELLINGS:
+        assert codes[pair][2] == baseline_code(*pair)
+        assert codes[pair][3] == ''
+
+
+def test_registered_codes_are_keyed_by_code_inputs(fake_cursor, registry_cache):
+    rows = [(i, restaurant, menu, *baseline_code(restaurant, menu).split('-'), baseline_code(restaurant, menu))
+            for i, (restaurant, menu) in enumerate(SPELLINGS, start=1)]
+    cursor = fake_cursor(lambda sql, params: rows if params[0] == 0 else [])
+
+    register_codes(cursor, 'med_tpr', code_key)
+
+    _, values = cursor.executed[-1]
+    registered = {(restaurant, menu): code for restaurant, menu, _, _, code in values}
+    assert registered[('好吃店', '牛肉麵')] == 'HCD-20NOHKHU'
+    assert registered[('好 吃店', '牛肉麵')] == 'H CD-20NOHKHU'
+
+    # 之後產生編號時由登記表（程序內快取）取得，結果仍與原本的做法相同
+    registry_cache.put_many({key: (*code.split('-'), code) for key, code in registered.items()})
+    codes = assign_codes(SPELLINGS, offline_registry())
+    for pair in SPELLINGS:
+        assert codes[pair][2] == baseline_code(*pair)
+
+
+def test_colliding_sources_are_rehashed(registry_cache):
+    # 海產店與好吃店的餐廳編號相同，同一道菜的菜牌編號會衝突
+    pairs = [('好吃店', '牛肉麵'), ('海產店', '牛肉麵')]
+    codes = assign_codes(pairs, offline_registry())
+
+    assert baseline_code(*pairs[0]) == baseline_code(*pairs[1])
+    assert len({codes[pair][2] for pair in pairs}) == 2
+    assert sum(1 for pair in pairs if codes[pair][3]) == 1
+
+
+def write_menu(path, rows):
+    pd.DataFrame(rows, columns=['餐廳', '餐點名稱']).to_excel(path, index=False)
+    return str(path)
+
+
+def read_codes(path):
+    df = pd.read_excel(path, keep_default_na=False)
+    return dict(zip(zip(df['餐廳'], df['餐點名稱']), zip(df['菜牌編號'], df['編號衝突'])))
+
+
+@pytest.fixture
+def offline(monkeypatch, registry_cache):
+    # 不連線資料庫，只檢查本批資料內的衝突
+    monkeypatch.setattr('module.mod_number.CodeRegistry',
+                        lambda normalize: CodeRegistry(normalize, use_database=False))
+
+
+def test_serial_batch_checks_collisions_across_files(tmp_path, offline):
+    first = write_menu(tmp_path / 'a.xlsx', [('好吃店', '牛肉麵')])
+    second = write_menu(tmp_path / 'b.xlsx', [('海產店', '牛肉麵')])
+
+    results = list(iter_process_menu_codes([first, second], workers=1))
+
+    assert [error for _, _, error, _ in results] == [None, None]
+    first_code, first_note = read_codes(results[0][1])[('好吃店', '牛肉麵')]
+    second_code, second_note = read_codes(results[1][1])[('海產店', '牛肉麵')]
+    assert first_code == 'HCD-20NOHKHU' and first_note == ''
+    assert second_code != first_code and second_note
+
+
+@pytest.fixture
+def executor_cleanup():
+    yield
+    if mod_number._executor is not None:
+        mod_number._discard_executor(mod_number._executor)
+
+
+def test_parallel_batch_checks_collisions_across_files(tmp_path, offline, executor_cleanup):
+    paths = [write_menu(tmp_path / 'a.xlsx', [('好吃店', '牛肉麵')]),
+             write_menu(tmp_path / 'b.xlsx', [('海產店', '牛肉麵')]),
+             write_menu(tmp_path / 'c.xlsx', [('Good Food', 'Caesar Salad')])]
+
+    results = list(iter_process_menu_codes(paths, workers=2))
+
+    assert [file_path for file_path, _, _, _ in results] == paths
+    assert [error for _, _, error, _ in results] == [None, None, None]
+    first_code, _ = read_codes(results[0][1])[('好吃店', '牛肉麵')]
+    second_code, second_note = read_codes(results[1][1])[('海產店', '牛肉麵')]
+    assert first_code == 'HCD-20NOHKHU'
+    assert second_code != first_code and second_note
+
+    # 檔案數不同的下一批沿用同一個程序池
+    executor = mod_number._get_executor()
+    paths.append(write_menu(tmp_path / 'd.xlsx', [('美味館', '炒飯')]))
+    results = list(iter_process_menu_codes(paths, workers=3))
+    assert [error for _, _, error, _ in results] == [None] * 4
+    assert mod_number._get_executor() is executor
+
+
+def test_small_batch_runs_without_process_pool(tmp_path, offline, monkeypatch):
+    def no_pool():
+        raise AssertionError('不應建立程序池')
+    monkeypatch.setattr(mod_number, '_get_executor', no_pool)
+    paths = [write_menu(tmp_path / 'a.xlsx', [('好吃店', '牛肉麵')]),
+             write_menu(tmp_path / 'b.xlsx', [('海產店', '牛肉麵')])]
+
+    results = list(iter_process_menu_codes(paths, workers=4))
+
+    assert [error for _, _, error, _ in results] == [None, None]
+
+
+@pytest.fixture
+def upload_folder(tmp_path, monkeypatch):
+    from app import app
+    monkeypatch.setitem(app.config, 'UPLOAD_FOLDER', str(tmp_path))
+    return tmp_path
+
+
+def test_menu_codes_zip_is_kept_for_retried_downloads(upload_folder):
+    from app import app
+    batch_id = 'a' * 32
+    zip_path = upload_folder / f'menu_codes_{batch_id}.zip'
+    zip_path.write_bytes(b'PK\x03\x04')
+    client = app.test_client()
+
+    response = client.get(f'/download_menu_codes/{batch_id}', buffered=False)
+    next(iter(response.response))
+    response.close()
+
+    response = client.get(f'/download_menu_codes/{batch_id}', headers={'Range': 'bytes=2-'})
+    assert response.status_code == 206
+    assert response.data == b'\x03\x04'
+
+    response = client.get(f'/download_menu_codes/{batch_id}')
+    assert response.data == b'PK\x03\x04'
+    assert zip_path.exists()
+
+
+def test_expired_menu_codes_zips_are_removed(upload_folder):
+    import os
+    import time
+    from app import remove_expired_menu_codes_zips, MENU_CODES_ZIP_TTL
+    expired = upload_folder / f"menu_codes_{'b' * 32}.zip"
+    recent = upload_folder / f"menu_codes_{'c' * 32}.zip"
+    for path in (expired, recent):
+        path.write_bytes(b'PK')
+    old = time.time() - MENU_CODES_ZIP_TTL - 60
+    os.utime(expired, (old, old))
+
+    remove_expired_menu_codes_zips()
+
+    assert not expired.exists()
+    assert recent.exists()
+
+
+def test_computed_codes_are_cached_across_batches(registry_cache):
+    from module.mod_menu_code import computed_codes
+    computed_codes.cache_clear()
+    pairs = [('好吃店', '牛肉麵'), ('好吃店!', '牛肉麵'), ('鼎泰豐', '小籠包')]
+
+    first = assign_codes(pairs, offline_registry())
+    second = assign_codes(pairs, offline_registry())
+
+    assert first == second
+    # 兩種寫法的 code_key 相同，第一批計算 2 次，第二批全部取自快取
+    assert computed_codes.cache_info().misses == 2
+    assert computed_codes.cache_info().hits == 2
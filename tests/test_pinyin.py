@@ -0,0 +1,46 @@
+"""拼音首字母表：查表結果與 pypinyin 相同，產生的編號與改用查表前一致"""
+import pytest
+
+from module.mod_menu_code import convert_to_code, generate_menu_code
+from module.mod_pinyin import verify
+
+# 歷史菜單中的餐廳名稱與改用查表前（逐字 lazy_pinyin）產生的餐廳編號
+RESTAURANT_CODES = {
+    '好吃店': 'HCD',
+    '好 吃店': 'H CD',
+    '海產店': 'HCD',
+    '鼎泰豐': 'DTF',
+    '麥當勞': 'MDL',
+    '八方雲集': 'BFYJ',
+    '重慶小麵': 'ZQXM',
+    '長春食堂': 'ZCST',
+    '銀行員工餐廳': 'YXYGC',
+    '樂樂廚房': 'LLCF',
+    'Good Food': 'GOODF',
+    'Café 台北': 'CTB',
+    '7-11 便利商店': '7BLSD',
+    '老王牛肉麵（信義店）': 'LWNRM',
+}
+
+MENU_CODES = {
+    '牛肉麵': '20NOHKHU',
+    '宮保雞丁': '62YTLMHO',
+    'Caesar Salad': '04SVAMMC',
+    '炒 飯!': '75GXSUZP',
+    '三杯雞': '23PWUVDZ',
+}
+
+
+def test_table_matches_pypinyin():
+    # 與 python -m module.mod_pinyin --verify 相同：比對範例名稱與表中每個漢字
+    assert verify(RESTAURANT_CODES) == []
+
+
+@pytest.mark.parametrize('name, code', RESTAURANT_CODES.items())
+def test_restaurant_codes_unchanged(name, code):
+    assert convert_to_code(name) == code
+
+
+@pytest.mark.parametrize('name, code', MENU_CODES.items())
+def test_menu_codes_unchanged(name, code):
+    assert generate_menu_code(name) == code
@@ -0,0 +1,76 @@
+import pytest
+
+from conftest import FakeConnection, FakeCursor
+from module import mod_schema
+
+
+def make_cursor(duplicates):
+    def handler(sql, params):
+        if 'information_schema.statistics' in sql:
+            return [(0,)]
+        if 'COUNT(DISTINCT 菜牌編號)' in sql:
+            table_name = sql.rsplit('FROM', 1)[1].strip()
+            return [(duplicates.get(table_name, 0),)]
+        return []
+    return FakeCursor(handler)
+
+
+def test_menu_code_index_fails_instead_of_deleting_duplicates():
+    cursor = make_cursor({'med_tpx': 3})
+
+    with pytest.raises(RuntimeError, match='med_tpx 3 筆'):
+        mod_schema.add_menu_code_indexes(cursor)
+
+    statements = [sql for sql, _ in cursor.executed]
+    assert not any('DELETE' in sql for sql in statements)
+    assert not any('ALTER TABLE' in sql for sql in statements)
+
+
+def test_menu_code_index_created_without_duplicates():
+    cursor = make_cursor({})
+
+    mod_schema.add_menu_code_indexes(cursor)
+
+    altered = [sql for sql, _ in cursor.executed if 'ALTER TABLE' in sql]
+    assert len(altered) == len(mod_schema.MENU_TABLES)
+    assert not any('DELETE' in sql for sql, _ in cursor.executed)
+
+
+def test_unused_indexes_dropped_only_where_present():
+    def handler(sql, params):
+        if 'information_schema.statistics' in sql:
+            table_name, index_name = params
+            return [(1 if table_name == 'med_tpr' else 0,)]
+        return []
+    cursor = FakeCursor(handler)
+
+    mod_schema.drop_unused_indexes(cursor)
+
+    altered = [sql for sql, _ in cursor.executed if 'ALTER TABLE' in sql]
+    assert altered == ['ALTER TABLE med_tpr DROP INDEX idx_date_code, DROP INDEX idx_restaurant_location_date']
+    assert not set(mod_schema.UNUSED_INDEXES) & {name for name, _ in mod_schema.MENU_INDEXES}
+
+
+def test_blocked_menu_code_index_does_not_stop_later_migrations(monkeypatch):
+    class Catalog:
+        def invalidate(self):
+            pass
+    monkeypatch.setattr(mod_schema, 'get_catalog', lambda: Catalog())
+
+    def handler(sql, params):
+        if 'GET_LOCK' in sql:
+            return [(1,)]
+        if 'information_schema' in sql:
+            return [(0,)]
+        if 'COUNT(DISTINCT 菜牌編號)' in sql:
+            return [(2,)]
+        return []
+    connection = FakeConnection(handler)
+
+    applied = mod_schema.run_migrations(connection)
+
+    versions = [version for version, _, _ in mod_schema.MIGRATIONS]
+    assert applied == [version for version in versions if version != 2]
+    recorded = [params[0] for cursor in connection.cursors for sql, params in cursor.executed
+                if 'INSERT INTO schema_version' in sql]
+    assert 2 not in recorded
@@ -0,0 +1,58 @@
+from datetime import datetime
+
+import pytest
+
+from conftest import FakeConnection, FakeCursor
+from module.mod_sql import DatabaseUploader
+
+
+class InsertCursor(FakeCursor):
+    """executemany 返回伺服器回報的影響筆數（重複的菜牌編號為 0）"""
+    def __init__(self, affected, has_unique_index=True):
+        super().__init__(self.respond)
+        self.affected = affected
+        self.has_unique_index = has_unique_index
+
+    def respond(self, sql, params):
+        if 'information_schema.statistics' in sql:
+            return [(int(self.has_unique_index),)]
+        if 'max_allowed_packet' in sql:
+            return [(1 << 20,)]
+        if 'MAX(序號)' in sql:
+            return [(0,)]
+        return []
+
+    def executemany(self, sql, values):
+        super().executemany(sql, values)
+        return self.affected if 'ON DUPLICATE KEY UPDATE' in sql else len(values)
+
+
+def make_uploader(affected, has_unique_index=True):
+    uploader = DatabaseUploader.__new__(DatabaseUploader)
+    uploader.connection = FakeConnection()
+    uploader.cursor = InsertCursor(affected, has_unique_index)
+    uploader.max_packet_size = None
+    return uploader
+
+
+def test_bulk_insert_rejects_bad_rows_and_reports_affected_rows(capsys):
+    row = ('ABC', '餐廳', '12ABCDEF', 'ABC-12ABCDEF', '餐點', '', 'TPR', datetime(2024, 1, 1))
+    uploader = make_uploader(affected=1)
+
+    inserted, skipped, _ = uploader.bulk_insert('menu_items', [row, row])
+
+    insert_sql = next(sql for sql, _ in uploader.cursor.executed if 'INSERT INTO menu_items' in sql)
+    assert 'INSERT IGNORE' not in insert_sql
+    assert 'ON DUPLICATE KEY UPDATE 序號 = 序號' in insert_sql
+    assert (inserted, skipped) == (1, 1)
+    assert '寫入 1 筆，略過 1 筆' in capsys.readouterr().out
+
+
+def test_bulk_insert_refuses_without_unique_index():
+    row = ('ABC', '餐廳', '12ABCDEF', 'ABC-12ABCDEF', '餐點', '', 'TPR', datetime(2024, 1, 1))
+    uploader = make_uploader(affected=1, has_unique_index=False)
+
+    with pytest.raises(RuntimeError, match='刪除重複資料'):
+        uploader.bulk_insert('menu_items', [row])
+
+    assert not any('INSERT INTO menu_items' in sql for sql, _ in uploader.cursor.executed)
@@ -0,0 +1,180 @@
+"""串流下載：不論回應是否讀完（HEAD 請求、中途斷線），借用的連線都要歸還"""
+from datetime import datetime
+
+import pytest
+
+from conftest import CountingPool
+from module import web_functions
+from module.mod3_no_english import NO_ENGLISH_COLUMNS
+
+
+def no_english_rows(row_count):
+    return [
+        (i, 'ABC', '餐廳', 'TPR', f'I{i}', f'ABC-{i}', '餐點', '', datetime(2024, 1, 1), 'med_tpr', row_count)
+        for i in range(1, row_count + 1)
+    ]
+
+
+def database(row_count):
+    """假的資料庫查詢結果：med_tpr 有 row_count 筆無英文資料"""
+    def handler(sql, params):
+        if 'MAX(序號)' in sql:
+            return [('med_tpr', row_count, datetime(2024, 1, 1))]
+        if 'export_watermark' in sql:
+            return []
+        if 'ROW_NUMBER' in sql:
+            return no_english_rows(row_count)
+        return []
+    return handler
+
+
+class Catalog:
+    def existing_tables(self, table_names):
+        return [name for name in table_names if name == 'med_tpr']
+
+    def table_exists(self, table_name):
+        return table_name == 'med_tpr'
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = CountingPool(database(3000))
+    monkeypatch.setattr(web_functions, 'get_pool', lambda: pool)
+    monkeypatch.setattr('module.mod3_no_english.get_catalog', lambda: Catalog())
+    return pool
+
+
+@pytest.fixture
+def client():
+    from app import app
+    return app.test_client()
+
+
+def test_head_no_english_releases_connection(pool, client):
+    response = client.head('/download_no_english')
+    response.close()
+
+    assert response.status_code == 200
+    assert pool.acquired == 1
+    assert pool.in_use == 0
+
+
+def test_aborted_no_english_stream_releases_connection(pool, client):
+    response = client.get('/download_no_english', buffered=False)
+    first_chunk = next(iter(response.response))
+    response.close()
+
+    assert first_chunk.decode('utf-8-sig').startswith(','.join(NO_ENGLISH_COLUMNS))
+    assert pool.in_use == 0
+
+
+def test_complete_no_english_stream_releases_connection(pool, client):
+    response = client.get('/download_no_english')
+
+    assert len(response.data.decode('utf-8-sig').splitlines()) == 3001
+    assert pool.in_use == 0
+
+
+def watermark_writes(sqls):
+    return [sql for sql in sqls if 'INSERT INTO export_watermark' in ' '.join(sql.split())]
+
+
+def test_full_export_keeps_watermark(pool, client):
+    response = client.get('/download_no_english')
+
+    assert response.data
+    assert response.status_code == 200
+    assert watermark_writes(pool.executed()) == []
+
+
+def test_delta_export_moves_watermark(pool, client):
+    response = client.get('/download_no_english?mode=delta')
+
+    assert response.data
+    assert response.status_code == 200
+    assert len(watermark_writes(pool.executed())) == 1
+
+
+def test_aborted_delta_export_keeps_watermark(pool, client):
+    response = client.get('/download_no_english?mode=delta', buffered=False)
+    next(iter(response.response))
+    response.close()
+
+    assert watermark_writes(pool.executed()) == []
+    assert pool.in_use == 0
+
+
+@pytest.mark.parametrize('delta, writes', [(False, 0), (True, 1)])
+def test_write_no_english_csv_watermark(monkeypatch, tmp_path, delta, writes):
+    from conftest import FakeConnection
+    from module.mod3_no_english import write_no_english_csv
+    monkeypatch.setattr('module.mod3_no_english.get_catalog', lambda: Catalog())
+    connection = FakeConnection(database(10))
+
+    write_no_english_csv(connection, str(tmp_path / 'out.csv'), delta=delta)
+
+    sqls = [sql for cursor in connection.cursors for sql, _ in cursor.executed]
+    assert len(watermark_writes(sqls)) == writes
+
+
+def duplicate_database(row_count):
+    """假的資料庫查詢結果：跨資料表重複報表有 row_count 筆"""
+    def handler(sql, params):
+        if 'GROUP_CONCAT' in sql:
+            return [(f'ABC-{i}', 2, 2, 'med_tpr, med_tpx', '', '是', '', '餐點') for i in range(row_count)]
+        return []
+    return handler
+
+
+class DuplicateCatalog:
+    def existing_tables(self, table_names):
+        return [name for name in table_names if name in ('med_tpr', 'med_tpx')]
+
+
+@pytest.fixture
+def duplicate_pool(monkeypatch):
+    pool = CountingPool(duplicate_database(3000))
+    monkeypatch.setattr(web_functions, 'get_pool', lambda: pool)
+    monkeypatch.setattr('module.mod_duplicates.get_catalog', lambda: DuplicateCatalog())
+    return pool
+
+
+def test_head_duplicate_report_releases_connection(duplicate_pool, client):
+    response = client.head('/duplicate_report')
+    response.close()
+
+    assert response.status_code == 200
+    assert duplicate_pool.acquired == 1
+    assert duplicate_pool.in_use == 0
+
+
+def test_aborted_duplicate_report_releases_connection(duplicate_pool, client):
+    response = client.get('/duplicate_report', buffered=False)
+    next(iter(response.response))
+    response.close()
+
+    assert duplicate_pool.in_use == 0
+
+
+def test_complete_duplicate_report_releases_connection(duplicate_pool, client):
+    response = client.get('/duplicate_report')
+
+    assert len(response.data.decode('utf-8-sig').splitlines()) == 3001
+    assert duplicate_pool.in_use == 0
+
+
+def test_stream_query_releases_connection_when_empty_or_failing():
+    from module.mod_export import stream_query
+
+    pool = CountingPool(lambda sql, params: [])
+    emptied = []
+    assert stream_query(pool, lambda connection: (row for row in []), None, on_empty=emptied.append) is None
+    assert len(emptied) == 1
+
+    def produce(connection):
+        raise RuntimeError('query failed')
+
+    with pytest.raises(RuntimeError):
+        stream_query(pool, produce, None)
+    assert pool.acquired == 2
+    assert pool.in_use == 0
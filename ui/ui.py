@@ -2,6 +2,8 @@ import tkinter as tk
 from tkinter import messagebox, filedialog, ttk
 import os
 from module.mod_number import process_menu_codes
+from module.mod_code_registry import CodeRegistry
+from module.mod_menu_code import normalize_source
 from module.mod_sql import DatabaseUploader
 from module.mod_difference import MenuDifferenceCalculator
 from module.mod_clean import clean_excel_file as clean_excel_file_original
@@ -12,6 +14,7 @@ from module.mod_dif_restairamt import RestaurantDifferenceCalculator
 from module.mod2_compare import compare_menu_codes
 from module.mod2_utf8 import convert_csv_to_unicode_txt
 from module.mod4_new_menu_restaurant import export_new_menus, export_new_restaurants
+from module.mod_schema import run_migrations
 
 class MenuCardUI:
     def __init__(self, root=None):
@@ -24,6 +27,14 @@ class MenuCardUI:
         self.root.geometry("400x600")  # 調整視窗大小
         self.entry_menu_code = None
         self.create_ui()
+        self.apply_migrations()
+
+    def apply_migrations(self):
+        """啟動時套用資料庫結構遷移"""
+        try:
+            run_migrations()
+        except Exception as e:
+            messagebox.showwarning("警告", f"資料庫遷移失敗：\n{str(e)}")
         
     def create_ui(self):
         # 創建主框架
@@ -193,8 +204,10 @@ class MenuCardUI:
             success_files = []
             error_files = []
             
+            # 同一批檔案共用編號索引，檢查檔案之間的編號衝突
+            registry = CodeRegistry(normalize_source)
             for file_path in file_paths:
-                new_file_path, error = process_menu_codes(file_path)
+                new_file_path, error = process_menu_codes(file_path, registry)
                 
                 if error:
                     error_files.append(f"{os.path.basename(file_path)}: {error}")